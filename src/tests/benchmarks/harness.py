@@ -0,0 +1,254 @@
+import gc
+import json
+import os
+import platform
+import pwd
+import statistics
+import threading
+import time
+import unittest
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import jwt
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+
+from tests.controllers.userauthenticationmethods.test_user_authentication import (
+    TestUserAuthentication,
+)
+from user_workspaces_server.models import Job, Workspace, WorkspaceFile
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BENCHMARKS_DIR, "baseline.json")
+RESULTS_PATH = os.environ.get(
+    "UWS_BENCHMARK_RESULTS", os.path.join(BENCHMARKS_DIR, "results.json")
+)
+# How much slower than the baseline a benchmark's median may get before it fails.
+REGRESSION_THRESHOLD = float(os.environ.get("UWS_BENCHMARK_THRESHOLD", 1.5))
+# Medians of fewer iterations move too much between runs to be compared against the threshold.
+MIN_ITERATIONS = 10
+
+# Workspace trees as (depth, subdirectories per directory, files per directory).
+TREE_SHAPES = {
+    "flat": (0, 0, 5000),
+    "wide": (1, 250, 20),
+    "deep": (40, 1, 25),
+    "bushy": (3, 8, 10),
+}
+
+results = {}
+
+
+def measure(func, iterations, cleanup=None):
+    latencies = []
+    for _ in range(iterations):
+        # Garbage left by earlier iterations is not collected on the measured one's time.
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+        if cleanup:
+            cleanup()
+
+    latencies.sort()
+    return {
+        "iterations": iterations,
+        "mean": statistics.mean(latencies),
+        "p50": statistics.median(latencies),
+        "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        "max": latencies[-1],
+        "throughput": iterations / sum(latencies),
+    }
+
+
+def load_baseline():
+    if not os.path.exists(BASELINE_PATH):
+        return {}
+    with open(BASELINE_PATH) as f:
+        return json.load(f)["benchmarks"]
+
+
+def write_results():
+    output = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": connection.vendor,
+            "datetime": datetime.now().isoformat(),
+        },
+        "benchmarks": dict(sorted(results.items())),
+    }
+    paths = [RESULTS_PATH]
+    if os.environ.get("UWS_BENCHMARK_UPDATE_BASELINE"):
+        paths.append(BASELINE_PATH)
+    for path in paths:
+        with open(path, "w") as f:
+            json.dump(output, f, indent=2)
+            f.write("\n")
+
+
+@unittest.skipUnless(os.environ.get("UWS_BENCHMARKS"), "Set UWS_BENCHMARKS=1 to run benchmarks.")
+class BenchmarkTestCase(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        write_results()
+
+    def benchmark(self, name, func, iterations=20, warmup=3, cleanup=None):
+        # The first calls warm up connections and caches and are not counted. cleanup runs after
+        # every call, outside of the timing, so that iterations start from the same state.
+        self.assertGreaterEqual(iterations, MIN_ITERATIONS, f"{name} has too few iterations.")
+        measure(func, warmup, cleanup)
+        result = measure(func, iterations, cleanup)
+        results[name] = result
+
+        baseline = load_baseline().get(name)
+        if baseline and result["p50"] > baseline["p50"] * REGRESSION_THRESHOLD:
+            self.fail(
+                f"{name} regressed: median {result['p50'] * 1000:.1f}ms, "
+                f"baseline {baseline['p50'] * 1000:.1f}ms"
+            )
+        return result
+
+
+class BenchmarkUserAuthentication(TestUserAuthentication):
+    # Maps every user to the user running the benchmarks, so ownership can really be set.
+    def get_external_user(self, external_user_info):
+        return {
+            "external_username": pwd.getpwuid(os.getuid()).pw_name,
+            "external_user_id": str(os.getuid()),
+            "external_user_uid": os.getuid(),
+            "external_user_gid": os.getgid(),
+            "external_user_details": {},
+        }
+
+
+def seed_users(count, prefix="bench"):
+    User.objects.bulk_create(
+        [User(username=f"{prefix}_{i}", email=f"{prefix}_{i}@test.com") for i in range(count)]
+    )
+    return list(User.objects.filter(username__startswith=f"{prefix}_").order_by("pk"))
+
+
+def seed_workspaces(users, per_user, files_per_workspace=0):
+    Workspace.objects.bulk_create(
+        [
+            Workspace(
+                user_id=user,
+                name=f"Workspace {i}",
+                description="Benchmark workspace",
+                file_path=f"{user.username}/{i}",
+                datetime_created=datetime.now(),
+                workspace_details={"request_workspace_details": {"files": [], "symlinks": []}},
+                status=Workspace.Status.IDLE,
+            )
+            for user in users
+            for i in range(per_user)
+        ],
+        batch_size=1000,
+    )
+    workspaces = list(Workspace.objects.filter(user_id__in=users).order_by("pk"))
+    WorkspaceFile.objects.bulk_create(
+        [
+            WorkspaceFile(workspace_id=workspace, name=f"/data/file_{i}.txt")
+            for workspace in workspaces
+            for i in range(files_per_workspace)
+        ],
+        batch_size=1000,
+    )
+    return workspaces
+
+
+def seed_jobs(workspaces, per_workspace, status=Job.Status.RUNNING):
+    Job.objects.bulk_create(
+        [
+            Job(
+                user_id_id=workspace.user_id_id,
+                workspace_id=workspace,
+                job_type="test_job",
+                datetime_created=datetime.now(),
+                job_details={"metrics": {}, "request_job_details": {}, "current_job_details": {}},
+                resource_name="SlurmAPIResource",
+                status=status,
+                resource_job_id=workspace.pk * per_workspace + i,
+                core_hours=0,
+                resource_options={},
+            )
+            for workspace in workspaces
+            for i in range(per_workspace)
+        ],
+        batch_size=1000,
+    )
+    return list(Job.objects.filter(workspace_id__in=workspaces).order_by("pk"))
+
+
+def make_tree(root, depth, subdirs, files, file_size=1024):
+    os.makedirs(root, exist_ok=True)
+    for i in range(files):
+        with open(os.path.join(root, f"file_{i}.txt"), "wb") as f:
+            f.write(b"x" * file_size)
+    if depth:
+        for i in range(subdirs):
+            make_tree(os.path.join(root, f"dir_{i}"), depth - 1, subdirs, files, file_size)
+
+
+class StubSlurmHandler(BaseHTTPRequestHandler):
+    # Answers the slurmrestd proxy endpoints used by SlurmAPIResource with canned responses.
+    protocol_version = "HTTP/1.1"
+    job_counter = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, body, status=200):
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def get_job(self, job_id):
+        now = int(time.time())
+        return {
+            "job_id": job_id,
+            "job_state": ["RUNNING"],
+            "start_time": {"number": now - 60},
+            "end_time": {"number": now + 3600},
+            "cpus": {"number": 4},
+            "memory_per_node": {"number": 1024},
+            "nodes": "node1",
+            "job_resources": {"allocated_cpus": 4},
+        }
+
+    def do_GET(self):
+        if self.path.startswith("/getSlurmToken/"):
+            token = jwt.encode({"exp": int(time.time()) + 3600}, "stub")
+            self.send_json({"slurm_token": token})
+        elif self.path.startswith("/jobControl/"):
+            job_ids = self.path.rstrip("/").split("/")[-1].split(",")
+            self.send_json({"errors": [], "jobs": [self.get_job(int(i)) for i in job_ids]})
+        else:
+            self.send_json({"errors": ["Not found."]}, status=404)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        StubSlurmHandler.job_counter += 1
+        self.send_json({"errors": [], "job_id": StubSlurmHandler.job_counter})
+
+    def do_DELETE(self):
+        self.send_json({"errors": []})
+
+
+class StubSlurmServer:
+    def __enter__(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubSlurmHandler)
+        self.root_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
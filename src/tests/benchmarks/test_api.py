@@ -0,0 +1,76 @@
+from datetime import datetime
+
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from tests.benchmarks.harness import (
+    BenchmarkTestCase,
+    seed_jobs,
+    seed_users,
+    seed_workspaces,
+)
+from user_workspaces_server.models import SharedWorkspaceMapping, Workspace
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class APIBenchmarks(BenchmarkTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # A busy user among thousands of others, so the queries are measured against tables
+        # of a realistic size rather than only the user's own rows.
+        [cls.user] = seed_users(1, prefix="heavy")
+        users = seed_users(2000)
+        seed_jobs(seed_workspaces(users, 5), 1, status="complete")
+
+        workspaces = seed_workspaces([cls.user], 500, files_per_workspace=50)
+        seed_jobs(workspaces, 3)
+
+        # Shares both ways between the user and the first 200 other users.
+        shared_workspaces = []
+        for original_workspace, user in zip(workspaces, users[:200]):
+            shared_workspaces.append(
+                (original_workspace, Workspace(user_id=user, **cls.get_workspace_fields()))
+            )
+        for user in users[200:400]:
+            original_workspace = Workspace.objects.filter(user_id=user).first()
+            shared_workspaces.append(
+                (original_workspace, Workspace(user_id=cls.user, **cls.get_workspace_fields()))
+            )
+        Workspace.objects.bulk_create([workspace for _, workspace in shared_workspaces])
+        SharedWorkspaceMapping.objects.bulk_create(
+            [
+                SharedWorkspaceMapping(
+                    original_workspace_id=original_workspace,
+                    shared_workspace_id=shared_workspace,
+                    datetime_share_created=datetime.now(),
+                )
+                for original_workspace, shared_workspace in shared_workspaces
+            ]
+        )
+
+    @staticmethod
+    def get_workspace_fields():
+        return {
+            "name": "Shared Workspace",
+            "datetime_created": datetime.now(),
+            "workspace_details": {"request_workspace_details": {"files": [], "symlinks": []}},
+            "status": Workspace.Status.INITIALIZING,
+        }
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_workspace_view_get(self):
+        self.benchmark("WorkspaceView.get", lambda: self.get(reverse("workspaces")))
+
+    def test_job_view_get(self):
+        self.benchmark("JobView.get", lambda: self.get(reverse("jobs")))
+
+    def test_shared_workspace_view_get(self):
+        self.benchmark("SharedWorkspaceView.get", lambda: self.get(reverse("shared_workspaces")))
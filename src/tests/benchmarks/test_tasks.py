@@ -0,0 +1,198 @@
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from unittest import mock
+
+from django.apps import apps
+from django.test import override_settings
+
+from tests.benchmarks.harness import (
+    TREE_SHAPES,
+    BenchmarkTestCase,
+    BenchmarkUserAuthentication,
+    StubSlurmServer,
+    make_tree,
+    seed_jobs,
+    seed_users,
+    seed_workspaces,
+)
+from user_workspaces_server import tasks
+from user_workspaces_server.controllers.resources.local_resource import LocalResource
+from user_workspaces_server.controllers.resources.slurm_api_resource import (
+    SlurmAPIResource,
+)
+from user_workspaces_server.controllers.storagemethods.local_file_system_storage import (
+    LocalFileSystemStorage,
+)
+from user_workspaces_server.models import Job, SharedWorkspaceMapping, Workspace
+
+
+class ControllerBenchmarkTestCase(BenchmarkTestCase):
+    def setUp(self):
+        app_config = apps.get_app_config("user_workspaces_server")
+        for name in ["main_storage", "main_resource"]:
+            self.addCleanup(setattr, app_config, name, getattr(app_config, name))
+
+        self.user_authentication = BenchmarkUserAuthentication(config={"connection_details": {}})
+
+        # Follow-up tasks and the share email (its template is deployment specific) are not
+        # part of what is measured.
+        for name in ["async_task", "async_update_workspace", "render_to_string"]:
+            patcher = mock.patch.object(tasks, name)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class StorageBenchmarks(ControllerBenchmarkTestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.root_dir = tempfile.mkdtemp()
+        for shape, tree in TREE_SHAPES.items():
+            make_tree(os.path.join(cls.root_dir, "bench", shape), *tree)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.root_dir)
+
+    @classmethod
+    def setUpTestData(cls):
+        [cls.user] = seed_users(1)
+        cls.workspaces = {}
+        for shape in TREE_SHAPES:
+            cls.workspaces[shape] = Workspace.objects.create(
+                user_id=cls.user,
+                name=shape,
+                file_path=f"bench/{shape}",
+                datetime_created=datetime.now(),
+                workspace_details={"request_workspace_details": {"files": [], "symlinks": []}},
+            )
+
+    def setUp(self):
+        super().setUp()
+        self.storage = LocalFileSystemStorage(
+            config={"root_dir": self.root_dir},
+            storage_user_authentication=self.user_authentication,
+        )
+        apps.get_app_config("user_workspaces_server").main_storage = self.storage
+        self.owner_mapping = self.user_authentication.has_permission(self.user)
+
+    def test_get_dir_size(self):
+        for shape in TREE_SHAPES:
+            self.benchmark(
+                f"get_dir_size[{shape}]",
+                lambda: self.storage.get_dir_size(f"bench/{shape}"),
+            )
+
+    def test_set_ownership(self):
+        for shape in TREE_SHAPES:
+            self.benchmark(
+                f"set_ownership[{shape}]",
+                lambda: self.storage.set_ownership(
+                    f"bench/{shape}", self.owner_mapping, recursive=True
+                ),
+                iterations=10,
+            )
+
+    def test_update_workspace(self):
+        for shape, workspace in self.workspaces.items():
+            self.benchmark(
+                f"update_workspace[{shape}]",
+                lambda: tasks.update_workspace(workspace.pk, full_rescan=True),
+                iterations=10,
+            )
+            self.benchmark(
+                f"update_workspace[{shape},incremental]",
+                lambda: tasks.update_workspace(workspace.pk),
+            )
+
+    def test_initialize_shared_workspace(self):
+        shared_workspaces = []
+
+        def share(original_workspace):
+            shared_workspace = Workspace.objects.create(
+                user_id=self.user,
+                name="Shared",
+                datetime_created=datetime.now(),
+                workspace_details={"request_workspace_details": {"files": [], "symlinks": []}},
+                status=Workspace.Status.INITIALIZING,
+            )
+            shared_workspaces.append(shared_workspace)
+            mapping = SharedWorkspaceMapping.objects.create(
+                original_workspace_id=original_workspace, shared_workspace_id=shared_workspace
+            )
+            tasks.initialize_shared_workspace(mapping.pk)
+
+        def delete_shares():
+            # Clones would otherwise pile up on disk and slow down later iterations.
+            for shared_workspace in shared_workspaces:
+                shared_workspace.refresh_from_db()
+                shutil.rmtree(os.path.join(self.root_dir, shared_workspace.file_path))
+                shared_workspace.delete()
+            shared_workspaces.clear()
+
+        for shape, workspace in self.workspaces.items():
+            self.benchmark(
+                f"initialize_shared_workspace[{shape}]",
+                lambda: share(workspace),
+                iterations=10,
+                cleanup=delete_shares,
+            )
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class ResourceBenchmarks(ControllerBenchmarkTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        users = seed_users(50, prefix="slurm")
+        cls.slurm_jobs = seed_jobs(seed_workspaces(users, 2), 5)
+
+        users = seed_users(20, prefix="local")
+        cls.local_jobs = seed_jobs(seed_workspaces(users, 1), 5)
+        # Every local job points at this process, which is always running.
+        Job.objects.filter(pk__in=[job.pk for job in cls.local_jobs]).update(
+            resource_job_id=os.getpid()
+        )
+
+    def update_jobs(self, jobs):
+        tasks.update_jobs(
+            list(
+                Job.objects.filter(pk__in=[job.pk for job in jobs]).select_related(
+                    "user_id", "workspace_id__user_id"
+                )
+            )
+        )
+
+    def test_update_jobs_slurm(self):
+        with StubSlurmServer() as slurm:
+            apps.get_app_config("user_workspaces_server").main_resource = SlurmAPIResource(
+                config={
+                    "connection_details": {
+                        "root_url": slurm.root_url,
+                        "api_token": "benchmark",
+                        "token_lifespan": "3600",
+                    }
+                },
+                resource_storage=None,
+                resource_user_authentication=self.user_authentication,
+            )
+            self.benchmark(
+                f"update_jobs[slurm,{len(self.slurm_jobs)}]",
+                lambda: self.update_jobs(self.slurm_jobs),
+                iterations=10,
+            )
+
+    def test_update_jobs_local(self):
+        apps.get_app_config("user_workspaces_server").main_resource = LocalResource(
+            config={"connection_details": {}},
+            resource_storage=None,
+            resource_user_authentication=self.user_authentication,
+        )
+        self.benchmark(
+            f"update_jobs[local,{len(self.local_jobs)}]",
+            lambda: self.update_jobs(self.local_jobs),
+            iterations=10,
+        )
@@ -38,5 +38,29 @@ class TestStorage(AbstractStorage):
     def create_file(self, path, file):
         pass
 
+    def create_upload_file(self, path, file_name, upload_id):
+        pass
+
+    def write_upload_chunk(self, path, file_name, upload_id, offset, stream):
+        return offset + len(stream.read())
+
+    def complete_upload_file(self, path, file_name, upload_id, owner_mapping):
+        pass
+
+    def delete_upload_file(self, path, file_name, upload_id):
+        pass
+
+    def get_download_path(self, path, file_name):
+        return file_name
+
+    def get_download_redirect(self, download_path):
+        return None
+
+    def stream_file(self, download_path, start=0, end=None):
+        return iter([])
+
+    def stream_archive(self, download_path, archive_format="tar"):
+        return iter([])
+
     def health_check(self):
         pass
@@ -0,0 +1,44 @@
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from user_workspaces_server.management.commands.explain_queries import (
+    SEQUENTIAL_SCAN_PATTERNS,
+)
+
+
+class ExplainQueriesCommandTests(TestCase):
+    def test_hot_queries_are_indexed(self):
+        out = StringIO()
+        call_command("explain_queries", seed_users=200, stdout=out)
+
+        results = dict(line.split(": ", 1) for line in out.getvalue().splitlines())
+        # SQLite cannot tell how rare active jobs are, see SEQUENTIAL_SCAN_PATTERNS.
+        results.pop("active jobs due a status update")
+        self.assertEqual(set(results.values()), {"indexed"})
+        # The seeded data is rolled back.
+        self.assertFalse(User.objects.filter(username__startswith="explain_").exists())
+
+    def test_fail_on_sequential_scan(self):
+        with self.assertRaises(CommandError):
+            call_command(
+                "explain_queries", seed_users=200, fail_on_sequential_scan=True, stdout=StringIO()
+            )
+
+    def test_sequential_scan_patterns(self):
+        self.assertEqual(
+            SEQUENTIAL_SCAN_PATTERNS["postgresql"].findall(
+                "Seq Scan on user_workspaces_server_job  (cost=0.00..1.01 rows=1 width=1)"
+            ),
+            ["user_workspaces_server_job"],
+        )
+        self.assertEqual(
+            SEQUENTIAL_SCAN_PATTERNS["sqlite"].findall(
+                "2 0 0 SCAN user_workspaces_server_job\n"
+                "3 0 0 SCAN user_workspaces_server_job USING INDEX job_active_status_update_idx"
+            ),
+            ["user_workspaces_server_job"],
+        )
@@ -0,0 +1,329 @@
+import io
+import os
+import tarfile
+import tempfile
+import zipfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from user_workspaces_server.controllers.storagemethods.local_file_system_storage import (
+    LocalFileSystemStorage,
+)
+from user_workspaces_server.exceptions import WorkspaceClientException
+from user_workspaces_server.models import ExternalUserMapping
+
+
+class LocalFileSystemStorageTestCase(SimpleTestCase):
+    def setUp(self):
+        self.root_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root_dir.cleanup)
+        self.storage = LocalFileSystemStorage(
+            config={"root_dir": self.root_dir.name}, storage_user_authentication=None
+        )
+        self.workspace_path = "test/1"
+        os.makedirs(self.full_path(""))
+
+    def full_path(self, relative_path):
+        return os.path.join(self.root_dir.name, self.workspace_path, relative_path)
+
+    def write_file(self, relative_path, size):
+        os.makedirs(os.path.dirname(self.full_path(relative_path)), exist_ok=True)
+        with open(self.full_path(relative_path), "wb") as f:
+            f.write(b"x" * size)
+
+
+class ScanDirTests(LocalFileSystemStorageTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write_file("a.txt", 10)
+        self.write_file("data/b.txt", 20)
+        self.write_file(".hidden/c.txt", 30)
+        os.symlink(self.full_path("a.txt"), self.full_path("data/link"))
+
+    def names(self, entries):
+        return sorted(entry["name"] for entry in entries)
+
+    def test_scan_lists_files_and_symlinks_and_size(self):
+        details = self.storage.scan_dir(self.workspace_path)
+
+        self.assertEqual(self.names(details["files"]), ["/a.txt", "/data/b.txt"])
+        self.assertEqual(self.names(details["symlinks"]), ["/data/link"])
+        self.assertEqual(details["size"], 60)
+
+    def test_rescan_only_lists_changed_directories(self):
+        self.storage.scan_dir(self.workspace_path)
+        self.write_file("data/d.txt", 5)
+
+        with mock.patch.object(
+            self.storage, "read_dir_entries", wraps=self.storage.read_dir_entries
+        ) as read_dir_entries:
+            details = self.storage.scan_dir(self.workspace_path)
+
+        read_dir_entries.assert_called_once()
+        self.assertEqual(self.names(details["files"]), ["/a.txt", "/data/b.txt", "/data/d.txt"])
+        self.assertEqual(details["size"], 65)
+
+    def test_rescan_picks_up_in_place_changes(self):
+        self.storage.scan_dir(self.workspace_path)
+        with open(self.full_path("a.txt"), "ab") as f:
+            f.write(b"x" * 5)
+        with open(self.full_path(".hidden/c.txt"), "wb") as f:
+            f.write(b"x" * 10)
+
+        with mock.patch.object(self.storage, "read_dir_entries") as read_dir_entries:
+            details = self.storage.scan_dir(self.workspace_path)
+
+        read_dir_entries.assert_not_called()
+        self.assertEqual(details["size"], 45)
+        self.assertEqual(self.storage.scan_dir(self.workspace_path, full_rescan=True)["size"], 45)
+
+
+class WorkspaceTreeTestCase(LocalFileSystemStorageTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write_file("a.txt", 10)
+        self.write_file("data/b.txt", 20)
+        self.write_file("venv/lib/c.py", 30)
+        os.symlink(self.full_path("data"), self.full_path("data_link"))
+        self.storage.storage_user_authentication = mock.Mock(
+            get_external_user=mock.Mock(
+                return_value={
+                    "external_username": "test",
+                    "external_user_uid": os.getuid() + 1,
+                    "external_user_gid": os.getgid(),
+                }
+            )
+        )
+
+
+class WalkDirTests(WorkspaceTreeTestCase):
+    def test_get_dir_size_skips_symlinks(self):
+        self.assertEqual(self.storage.get_dir_size(self.workspace_path), 60)
+        self.assertEqual(self.storage.get_dir_size(os.path.join(self.workspace_path, "a.txt")), 10)
+
+    def test_get_dir_tree_can_be_pruned(self):
+        walked = []
+        for dirpath, dirnames, filenames, dirfd in self.storage.get_dir_tree(self.workspace_path):
+            walked.append(os.path.relpath(dirpath, self.full_path("")))
+            dirnames[:] = [dirname for dirname in dirnames if dirname != "venv"]
+            if dirpath == self.full_path(""):
+                self.assertEqual(sorted(filenames), ["a.txt", "data_link"])
+
+        self.assertEqual(sorted(walked), [".", "data"])
+
+    def set_ownership(self, side_effect=None):
+        with mock.patch("os.chown", side_effect=side_effect) as chown, mock.patch("os.fchown"):
+            self.storage.set_ownership(self.workspace_path, ExternalUserMapping(), recursive=True)
+        return chown
+
+    def test_set_ownership_skips_venv_and_symlink_targets(self):
+        for ownership_workers in [1, 4]:
+            self.storage.ownership_workers = ownership_workers
+            chown = self.set_ownership()
+
+            chowned = sorted(call.args[0] for call in chown.call_args_list)
+            self.assertEqual(chowned, ["a.txt", "b.txt", "data", "data_link"])
+            for call in chown.call_args_list:
+                self.assertFalse(call.kwargs["follow_symlinks"])
+
+    def test_set_ownership_continues_past_entries_that_fail(self):
+        def chown(name, uid, gid, dir_fd=None, follow_symlinks=True):
+            if name == "a.txt":
+                raise FileNotFoundError(name)
+
+        for ownership_workers in [1, 4]:
+            self.storage.ownership_workers = ownership_workers
+            with self.assertLogs(
+                "user_workspaces_server.controllers.storagemethods.local_file_system_storage",
+                "WARNING",
+            ) as logs:
+                chown = self.set_ownership(side_effect=chown)
+
+            chowned = sorted(call.args[0] for call in chown.call_args_list)
+            self.assertEqual(chowned, ["a.txt", "b.txt", "data", "data_link"])
+            self.assertIn("a.txt", logs.output[0])
+
+    def test_parallel_set_ownership_opens_subdirectories_relative_to_parent(self):
+        self.storage.ownership_workers = 4
+        with mock.patch("os.open", wraps=os.open) as open_:
+            self.set_ownership()
+
+        [root_call, *subdir_calls] = open_.call_args_list
+        self.assertEqual(root_call.args[0], os.path.join(self.root_dir.name, self.workspace_path))
+        self.assertEqual([call.args[0] for call in subdir_calls], ["data"])
+        self.assertIsNotNone(subdir_calls[0].kwargs["dir_fd"])
+
+    def test_set_ownership_skips_entries_with_matching_owner(self):
+        self.storage.storage_user_authentication.get_external_user.return_value[
+            "external_user_uid"
+        ] = os.getuid()
+
+        chown = self.set_ownership()
+
+        chown.assert_not_called()
+
+
+class CloneDirTests(WorkspaceTreeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write_file(".hidden", 5)
+        os.chmod(self.full_path("data/b.txt"), 0o444)
+        self.storage.clone_chunk_size = 4
+
+    def clone(self):
+        progress = []
+        with mock.patch("os.chown"), mock.patch("os.fchown"):
+            self.storage.clone_dir(
+                self.workspace_path,
+                "test/2",
+                ExternalUserMapping(),
+                progress_callback=lambda copied, total: progress.append((copied, total)),
+            )
+        return progress
+
+    def clone_path(self, relative_path):
+        return os.path.join(self.root_dir.name, "test/2", relative_path)
+
+    def test_clone_copies_contents_in_chunks(self):
+        progress = self.clone()
+
+        with open(self.clone_path("venv/lib/c.py"), "rb") as f:
+            self.assertEqual(f.read(), b"x" * 30)
+        self.assertFalse(os.path.exists(self.clone_path(".hidden")))
+        self.assertEqual(os.readlink(self.clone_path("data_link")), self.full_path("data"))
+        self.assertEqual(progress[-1], (60, 60))
+        self.assertGreater(len(progress), 3)
+        self.assertNotEqual(
+            os.stat(self.full_path("data/b.txt")).st_ino,
+            os.stat(self.clone_path("data/b.txt")).st_ino,
+        )
+
+    def test_clone_to_many_destinations(self):
+        progress = []
+        with mock.patch("os.chown"), mock.patch("os.fchown"), mock.patch.object(
+            self.storage, "walk_dir", wraps=self.storage.walk_dir
+        ) as walk_dir:
+            self.storage.clone_dir_many(
+                self.workspace_path,
+                [("test/2", ExternalUserMapping()), ("test/3", ExternalUserMapping())],
+                progress_callback=lambda copied, total: progress.append((copied, total)),
+            )
+
+        walk_dir.assert_called_once()
+        for dest_path in ["test/2", "test/3"]:
+            dest = os.path.join(self.root_dir.name, dest_path)
+            with open(os.path.join(dest, "venv/lib/c.py"), "rb") as f:
+                self.assertEqual(f.read(), b"x" * 30)
+            self.assertFalse(os.path.exists(os.path.join(dest, ".hidden")))
+            self.assertEqual(os.readlink(os.path.join(dest, "data_link")), self.full_path("data"))
+        self.assertEqual(progress[-1], (120, 120))
+
+    def test_set_ownership_on_clone_leaves_original_files_alone(self):
+        self.clone()
+        source_inodes = {
+            os.stat(self.full_path(name)).st_ino: os.stat(self.full_path(name)).st_uid
+            for name in ["a.txt", "data/b.txt", "venv/lib/c.py"]
+        }
+
+        chowned_inodes = []
+
+        def chown(name, uid, gid, dir_fd=None, follow_symlinks=True):
+            chowned_inodes.append(os.stat(name, dir_fd=dir_fd, follow_symlinks=False).st_ino)
+
+        with mock.patch("os.chown", side_effect=chown), mock.patch("os.fchown"):
+            self.storage.set_ownership("test/2", ExternalUserMapping(), recursive=True)
+
+        self.assertTrue(chowned_inodes)
+        self.assertFalse(set(chowned_inodes) & set(source_inodes))
+        for name in ["a.txt", "data/b.txt", "venv/lib/c.py"]:
+            source_stat = os.stat(self.full_path(name))
+            self.assertEqual(source_stat.st_uid, source_inodes[source_stat.st_ino])
+
+
+class UploadFileTests(WorkspaceTreeTestCase):
+    def test_chunks_are_written_in_place_and_moved_on_completion(self):
+        self.storage.create_upload_file(self.workspace_path, "new/file.txt", 1)
+        end = self.storage.write_upload_chunk(
+            self.workspace_path, "new/file.txt", 1, 0, io.BytesIO(b"hello ")
+        )
+        end = self.storage.write_upload_chunk(
+            self.workspace_path, "new/file.txt", 1, end, io.BytesIO(b"world")
+        )
+        self.assertEqual(end, 11)
+        self.assertFalse(os.path.exists(self.full_path("new/file.txt")))
+
+        with mock.patch("os.chown") as chown:
+            self.storage.complete_upload_file(
+                self.workspace_path, "new/file.txt", 1, ExternalUserMapping()
+            )
+
+        with open(self.full_path("new/file.txt"), "rb") as f:
+            self.assertEqual(f.read(), b"hello world")
+        self.assertEqual(
+            [call.args[0] for call in chown.call_args_list],
+            [os.path.realpath(self.full_path(name)) for name in ["new/file.txt", "new"]],
+        )
+
+    def test_upload_cannot_leave_workspace(self):
+        os.makedirs(os.path.join(self.root_dir.name, "test/2"))
+        os.symlink(os.path.join(self.root_dir.name, "test/2"), self.full_path("other_link"))
+        for file_name in ["../2/file.txt", "other_link/file.txt", ""]:
+            with self.assertRaises(WorkspaceClientException):
+                self.storage.create_upload_file(self.workspace_path, file_name, 1)
+
+        # A directory swapped for a symlink while the upload is in progress.
+        self.storage.create_upload_file(self.workspace_path, "new/file.txt", 2)
+        os.rename(self.full_path("new"), self.full_path("old"))
+        os.symlink(os.path.join(self.root_dir.name, "test/2"), self.full_path("new"))
+        with self.assertRaises(WorkspaceClientException):
+            self.storage.complete_upload_file(
+                self.workspace_path, "new/file.txt", 2, ExternalUserMapping()
+            )
+        self.assertEqual(os.listdir(os.path.join(self.root_dir.name, "test/2")), [])
+
+
+class DownloadTests(WorkspaceTreeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write_file(".hidden", 5)
+
+    def test_download_path_cannot_leave_workspace(self):
+        os.symlink("/etc", self.full_path("etc_link"))
+        for file_name in ["../2", "etc_link/passwd"]:
+            with self.assertRaises(WorkspaceClientException):
+                self.storage.get_download_path(self.workspace_path, file_name)
+
+    def test_download_redirect_is_quoted(self):
+        self.storage.x_accel_redirect_prefix = "/protected/"
+        self.write_file("data/a b#1.txt", 5)
+        download_path = self.storage.get_download_path(self.workspace_path, "data/a b#1.txt")
+        self.assertEqual(
+            self.storage.get_download_redirect(download_path),
+            f"/protected/{self.workspace_path}/data/a%20b%231.txt",
+        )
+
+    def test_stream_file_range(self):
+        download_path = self.storage.get_download_path(self.workspace_path, "/data/b.txt")
+        self.assertEqual(b"".join(self.storage.stream_file(download_path, 5, 9)), b"x" * 5)
+
+    def test_stream_tar(self):
+        download_path = self.storage.get_download_path(self.workspace_path, "")
+        archive = io.BytesIO(b"".join(self.storage.stream_archive(download_path, "tar")))
+
+        with tarfile.open(fileobj=archive) as tar:
+            self.assertEqual(
+                sorted(tar.getnames()),
+                ["1", "1/a.txt", "1/data", "1/data/b.txt", "1/data_link", "1/venv", "1/venv/lib"]
+                + ["1/venv/lib/c.py"],
+            )
+            self.assertEqual(tar.extractfile("1/data/b.txt").read(), b"x" * 20)
+            self.assertTrue(tar.getmember("1/data_link").issym())
+
+    def test_stream_zip(self):
+        download_path = self.storage.get_download_path(self.workspace_path, "data")
+        archive = io.BytesIO(b"".join(self.storage.stream_archive(download_path, "zip")))
+
+        with zipfile.ZipFile(archive) as zip_file:
+            self.assertEqual(sorted(zip_file.namelist()), ["data/", "data/b.txt"])
+            self.assertEqual(zip_file.read("data/b.txt"), b"x" * 20)
@@ -0,0 +1,568 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from unittest import mock
+
+import jwt
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+
+from tests.controllers.resources.test_resource import TestResource
+from tests.controllers.storagemethods.test_storage import TestStorage
+from tests.controllers.userauthenticationmethods.test_user_authentication import (
+    TestUserAuthentication,
+)
+from user_workspaces_server import passthrough_routes, tasks, utils
+from user_workspaces_server.controllers.resources.slurm_api_resource import (
+    SlurmAPIResource,
+)
+from user_workspaces_server.models import (
+    Job,
+    JobMetric,
+    Workspace,
+    WorkspaceFile,
+    WorkspaceUpload,
+)
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class JobStatusTaskTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("test_tasks", email="test_tasks@test.com")
+        cls.workspace = Workspace.objects.create(
+            user_id=cls.user,
+            name="Test Name",
+            description="Test Description",
+            datetime_created=datetime.now(),
+            workspace_details={
+                "request_workspace_details": {"files": [], "symlinks": []},
+                "current_workspace_details": {"files": [], "symlinks": []},
+            },
+            file_path="test/1",
+            status=Workspace.Status.ACTIVE,
+        )
+
+    def setUp(self):
+        test_user_auth = TestUserAuthentication(config={"connection_details": {}})
+        test_storage = TestStorage(
+            config={"root_dir": ".", "connection_details": {}},
+            storage_user_authentication=test_user_auth,
+        )
+        self.resource = TestResource(
+            config={"passthrough_domain": "127.0.0.1:8000", "connection_details": {}},
+            resource_storage=test_storage,
+            resource_user_authentication=test_user_auth,
+        )
+        apps.get_app_config("user_workspaces_server").main_storage = test_storage
+        apps.get_app_config("user_workspaces_server").main_resource = self.resource
+
+    def create_job(self, status=Job.Status.RUNNING):
+        return Job.objects.create(
+            user_id=self.user,
+            workspace_id=self.workspace,
+            job_type="test_job",
+            datetime_created=datetime.now(),
+            job_details={"metrics": {}, "request_job_details": {}, "current_job_details": {}},
+            resource_name="TestResource",
+            status=status,
+            resource_job_id=1,
+            core_hours=0,
+            resource_options={},
+        )
+
+
+class UpdateJobsTests(JobStatusTaskTestCase):
+    def test_update_jobs_queries_resource_once(self):
+        jobs = [self.create_job(), self.create_job(Job.Status.PENDING)]
+
+        with mock.patch.object(
+            self.resource, "get_resource_jobs", wraps=self.resource.get_resource_jobs
+        ) as get_resource_jobs:
+            tasks.update_jobs(jobs)
+
+        get_resource_jobs.assert_called_once()
+        for job in jobs:
+            job.refresh_from_db()
+            self.assertEqual(job.status, Job.Status.COMPLETE)
+
+        self.workspace.refresh_from_db()
+        self.assertEqual(self.workspace.status, Workspace.Status.IDLE)
+
+    def test_update_jobs_skips_jobs_finished_elsewhere(self):
+        job = self.create_job()
+        Job.objects.filter(pk=job.pk).update(status=Job.Status.FAILED)
+
+        tasks.update_jobs([job])
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertIsNone(job.datetime_end)
+
+    def test_update_job_statuses_only_polls_active_jobs(self):
+        active_job = self.create_job()
+        self.create_job(Job.Status.COMPLETE)
+
+        with mock.patch.object(tasks, "update_jobs") as update_jobs:
+            tasks.update_job_statuses()
+
+        self.assertEqual(update_jobs.call_args.args[0], [active_job])
+
+    def test_update_job_statuses_skips_jobs_not_due(self):
+        due_job = self.create_job()
+        waiting_job = self.create_job()
+        waiting_job.datetime_next_status_update = timezone.now() + timedelta(minutes=5)
+        waiting_job.save()
+
+        with mock.patch.object(tasks, "update_jobs") as update_jobs:
+            tasks.update_job_statuses()
+
+        self.assertEqual(update_jobs.call_args.args[0], [due_job])
+
+    def test_poller_cycles_start_poll_interval_apart(self):
+        self.resource.config["job_status_poll_interval"] = 0.2
+        stop_event = threading.Event()
+        starts = []
+
+        def update_job_statuses():
+            starts.append(time.monotonic())
+            time.sleep(0.05)
+            if len(starts) == 3:
+                stop_event.set()
+
+        with mock.patch.object(tasks, "update_job_statuses", side_effect=update_job_statuses):
+            poller = threading.Thread(target=tasks.poll_job_statuses, args=(stop_event,))
+            poller.start()
+            poller.join(timeout=5)
+
+        self.assertFalse(poller.is_alive())
+        self.assertEqual(len(starts), 3)
+        for previous, current in zip(starts, starts[1:]):
+            self.assertGreaterEqual(current - previous, 0.2)
+            self.assertLess(current - previous, 0.5)
+
+    def test_poller_survives_a_failed_cycle(self):
+        self.resource.config["job_status_poll_interval"] = 0
+        stop_event = threading.Event()
+
+        def update_job_statuses():
+            if update.call_count == 2:
+                stop_event.set()
+            raise RuntimeError("Resource unavailable")
+
+        with mock.patch.object(
+            tasks, "update_job_statuses", side_effect=update_job_statuses
+        ) as update, self.assertLogs("user_workspaces_server.tasks", "ERROR"):
+            poller = threading.Thread(target=tasks.poll_job_statuses, args=(stop_event,))
+            poller.start()
+            poller.join(timeout=5)
+
+        self.assertEqual(update.call_count, 2)
+
+    def test_update_jobs_clears_schedule_for_finished_jobs(self):
+        job = self.create_job()
+
+        tasks.update_jobs([job])
+
+        job.refresh_from_db()
+        self.assertIsNone(job.datetime_next_status_update)
+
+
+class JobStatusBroadcastTests(JobStatusTaskTestCase):
+    def poll(self, job, status, current_job_details=None):
+        resource_job = {"status": status, "current_job_details": current_job_details or {}}
+        with mock.patch.object(
+            self.resource, "get_resource_jobs", return_value={job.pk: resource_job}
+        ), mock.patch.object(tasks, "broadcast_job_status") as broadcast_job_status:
+            tasks.update_jobs([job])
+        return [call.args[1] for call in broadcast_job_status.call_args_list]
+
+    def test_only_changes_are_broadcast(self):
+        job = self.create_job(Job.Status.PENDING)
+        job.job_details["current_job_details"] = {"message": "Queued.", "node": "node1"}
+        job.save()
+
+        patches = self.poll(job, Job.Status.RUNNING, {"message": "Starting."})
+        self.assertEqual(
+            patches,
+            [{"status": Job.Status.RUNNING, "current_job_details": {"message": "Starting."}}],
+        )
+
+        self.assertEqual(self.poll(job, Job.Status.RUNNING, {"message": "Starting."}), [])
+
+    def test_slurm_time_left_does_not_broadcast_every_poll(self):
+        resource = SlurmAPIResource(
+            config={"connection_details": {}},
+            resource_storage=None,
+            resource_user_authentication=mock.Mock(),
+        )
+        job = self.create_job()
+        job.job_details["current_job_details"] = {}
+        job.save()
+
+        patches = []
+        for now in [1000.0, 1007.5]:
+            with mock.patch("time.time", return_value=now):
+                resource_job = resource.parse_resource_job(
+                    job, {"job_state": ["RUNNING"], "end_time": {"number": 4600}}
+                )
+            patches.append(self.poll(job, Job.Status.RUNNING, resource_job["current_job_details"]))
+
+        self.assertEqual(patches, [[{"current_job_details": {"time_left": 3600}}], []])
+
+    def test_broadcast_interval_spaces_polls(self):
+        self.resource.config["job_status_broadcast_interval"] = 60
+        job = self.create_job(Job.Status.PENDING)
+
+        self.poll(job, Job.Status.PENDING, {"message": "Queued."})
+        job.refresh_from_db()
+        self.assertGreater(job.datetime_next_status_update, timezone.now() + timedelta(seconds=55))
+
+    def test_merge_patch(self):
+        self.assertEqual(
+            utils.get_merge_patch(
+                {"a": 1, "b": {"c": 1, "d": 2}, "e": 3}, {"a": 1, "b": {"c": 2, "d": 2}, "f": 4}
+            ),
+            {"b": {"c": 2}, "e": None, "f": 4},
+        )
+
+
+class JobMetricTests(JobStatusTaskTestCase):
+    def test_poll_records_metrics_sample(self):
+        job = self.create_job()
+        resource_job = {
+            "status": Job.Status.RUNNING,
+            "metrics": {"cpu_time": 1.5, "memory": 1024, "time_left": None, "other": 1},
+        }
+        with mock.patch.object(
+            self.resource, "get_resource_jobs", return_value={job.pk: resource_job}
+        ):
+            tasks.update_jobs([job])
+
+        sample = JobMetric.objects.get(job_id=job)
+        self.assertEqual((sample.cpu_time, sample.memory, sample.time_left), (1.5, 1024, None))
+
+    def test_poll_without_metrics_records_nothing(self):
+        tasks.update_jobs([self.create_job()])
+        self.assertFalse(JobMetric.objects.exists())
+
+    def test_slurm_metrics_are_parsed(self):
+        resource = SlurmAPIResource(
+            config={"connection_details": {}},
+            resource_storage=None,
+            resource_user_authentication=mock.Mock(),
+        )
+        metrics = resource.parse_resource_job_metrics(
+            {"cpus": {"set": True, "number": 4}, "memory_per_node": 2, "nodes": "node1"}, 60
+        )
+        self.assertEqual(
+            metrics, {"cpus": 4, "memory": 2 * 1024 * 1024, "time_left": 60, "node": "node1"}
+        )
+
+
+class PassthroughRouteTests(JobStatusTaskTestCase):
+    def setUp(self):
+        super().setUp()
+        passthrough_routes.routes.clear()
+        self.addCleanup(passthrough_routes.routes.clear)
+
+    def poll(self, job, status, current_job_details=None):
+        resource_job = {"status": status, "current_job_details": current_job_details or {}}
+        with mock.patch.object(
+            self.resource, "get_resource_jobs", return_value={job.pk: resource_job}
+        ):
+            tasks.update_jobs([job])
+
+    def test_route_is_set_when_proxy_details_appear(self):
+        job = self.create_job()
+
+        self.poll(job, Job.Status.RUNNING)
+        self.assertNotIn(job.pk, passthrough_routes.routes)
+
+        proxy_details = {"proxy_details": {"hostname": "node1", "port": 8888}}
+        with mock.patch.object(passthrough_routes, "publish_route") as publish_route:
+            self.poll(job, Job.Status.RUNNING, proxy_details)
+
+        route = passthrough_routes.Route("node1", 8888, self.user.pk)
+        self.assertEqual(passthrough_routes.routes[job.pk], (route, None))
+        publish_route.assert_called_once_with(job.pk, route)
+
+    def test_route_is_removed_when_job_finishes(self):
+        job = self.create_job()
+        self.poll(job, Job.Status.RUNNING, {"proxy_details": {"hostname": "node1", "port": 8888}})
+
+        self.poll(job, Job.Status.COMPLETE)
+        self.assertNotIn(job.pk, passthrough_routes.routes)
+
+
+class SetWorkspaceOwnershipTests(JobStatusTaskTestCase):
+    def test_initializing_workspace_becomes_idle(self):
+        self.workspace.status = Workspace.Status.INITIALIZING
+        self.workspace.save()
+
+        with mock.patch.object(
+            apps.get_app_config("user_workspaces_server").main_storage, "set_ownership"
+        ) as set_ownership:
+            tasks.set_workspace_ownership(self.workspace.pk)
+
+        set_ownership.assert_called_once()
+        self.workspace.refresh_from_db()
+        self.assertEqual(self.workspace.status, Workspace.Status.IDLE)
+
+    def test_active_workspace_keeps_its_status(self):
+        tasks.set_workspace_ownership(self.workspace.pk)
+
+        self.workspace.refresh_from_db()
+        self.assertEqual(self.workspace.status, Workspace.Status.ACTIVE)
+
+
+class CleanupUploadsTests(JobStatusTaskTestCase):
+    def create_upload(self, age, status=WorkspaceUpload.Status.IN_PROGRESS):
+        return WorkspaceUpload.objects.create(
+            user_id=self.user,
+            workspace_id=self.workspace,
+            file_name=f"{age}.txt",
+            datetime_created=timezone.now() - timedelta(days=7),
+            datetime_last_modified=timezone.now() - timedelta(seconds=age),
+            status=status,
+        )
+
+    def test_only_expired_uploads_are_removed(self):
+        expired = self.create_upload(86400 * 2)
+        recent = self.create_upload(60)
+        complete = self.create_upload(86400 * 2, WorkspaceUpload.Status.COMPLETE)
+
+        with mock.patch.object(
+            apps.get_app_config("user_workspaces_server").main_storage, "delete_upload_file"
+        ) as delete_upload_file:
+            tasks.cleanup_uploads()
+
+        delete_upload_file.assert_called_once_with("test/1", expired.file_name, expired.pk)
+        self.assertEqual(
+            set(WorkspaceUpload.objects.values_list("pk", flat=True)), {recent.pk, complete.pk}
+        )
+
+
+class WorkspaceStatusBroadcastTests(JobStatusTaskTestCase):
+    def test_update_workspace_broadcasts_scan_progress(self):
+        main_storage = apps.get_app_config("user_workspaces_server").main_storage
+        with mock.patch.object(
+            main_storage,
+            "scan_dir",
+            return_value={"files": [{"name": "/a"}], "symlinks": [], "size": 10},
+        ), mock.patch.object(tasks, "broadcast_workspace_status") as broadcast_workspace_status:
+            tasks.update_workspace(self.workspace.pk)
+
+        self.assertEqual(
+            [call.args[1:] for call in broadcast_workspace_status.call_args_list],
+            [
+                ("workspace_progress", {"task": "scan", "state": "started"}),
+                ("workspace_progress", {"task": "scan", "state": "complete", "files_scanned": 1}),
+                ("workspace_status_patch", {"disk_space": 10}),
+            ],
+        )
+
+    def test_finished_job_broadcasts_idle_workspace(self):
+        job = self.create_job(Job.Status.COMPLETE)
+        with mock.patch.object(tasks, "broadcast_workspace_status") as broadcast_workspace_status:
+            tasks.finish_job(job)
+
+        broadcast_workspace_status.assert_called_once_with(
+            self.workspace.pk, "workspace_status_patch", {"status": Workspace.Status.IDLE}
+        )
+
+
+class WorkspaceFileTests(JobStatusTaskTestCase):
+    def scan(self, files, symlinks=()):
+        tasks.update_workspace_files(
+            self.workspace,
+            {
+                "files": [{"name": name} for name in files],
+                "symlinks": [{"name": name} for name in symlinks],
+            },
+        )
+        return dict(
+            WorkspaceFile.objects.filter(workspace_id=self.workspace).values_list(
+                "name", "file_type"
+            )
+        )
+
+    def test_only_changes_are_written(self):
+        self.scan(["/a", "/b"], ["/link"])
+        unchanged = WorkspaceFile.objects.get(workspace_id=self.workspace, name="/a")
+
+        self.assertEqual(
+            self.scan(["/a", "/c"], ["/b"]),
+            {"/a": "file", "/c": "file", "/b": "symlink"},
+        )
+        self.assertTrue(WorkspaceFile.objects.filter(pk=unchanged.pk).exists())
+
+    def test_changed_type_is_updated_in_place(self):
+        self.scan(["/a", "/b"])
+        retyped = WorkspaceFile.objects.get(workspace_id=self.workspace, name="/b")
+
+        self.assertEqual(self.scan(["/a"], ["/b"]), {"/a": "file", "/b": "symlink"})
+        self.assertEqual(
+            WorkspaceFile.objects.get(pk=retyped.pk).file_type, WorkspaceFile.FileType.SYMLINK
+        )
+
+    def test_overlapping_scans_do_not_conflict(self):
+        bulk_create = WorkspaceFile.objects.bulk_create
+
+        def overlapping_bulk_create(objs, **kwargs):
+            # Another scan added the same file after this one listed the existing ones.
+            WorkspaceFile.objects.create(workspace_id=self.workspace, name="/a")
+            return bulk_create(objs, **kwargs)
+
+        with mock.patch.object(
+            WorkspaceFile.objects, "bulk_create", side_effect=overlapping_bulk_create
+        ):
+            self.assertEqual(self.scan(["/a", "/b"]), {"/a": "file", "/b": "file"})
+
+    def test_update_workspace_leaves_workspace_details_alone(self):
+        main_storage = apps.get_app_config("user_workspaces_server").main_storage
+        with mock.patch.object(
+            main_storage,
+            "scan_dir",
+            return_value={"files": [{"name": "/a"}], "symlinks": [], "size": 10},
+        ), mock.patch.object(tasks, "broadcast_workspace_status"):
+            tasks.update_workspace(self.workspace.pk)
+
+        self.workspace.refresh_from_db()
+        self.assertEqual(self.workspace.disk_space, 10)
+        self.assertEqual(
+            self.workspace.workspace_details["current_workspace_details"],
+            {"files": [], "symlinks": []},
+        )
+        self.assertEqual(self.scan(["/a"]), {"/a": "file"})
+
+
+class MapConcurrentlyTests(SimpleTestCase):
+    def test_calls_run_concurrently_in_order(self):
+        # Only passes if all three calls are waiting at the same time.
+        barrier = threading.Barrier(3, timeout=5)
+
+        def call(item):
+            barrier.wait()
+            return item * 2
+
+        self.assertEqual(utils.map_concurrently(call, [1, 2, 3]), [2, 4, 6])
+
+    def test_calls_inside_a_transaction_run_in_this_thread(self):
+        threads = []
+        with mock.patch.object(utils.connection, "in_atomic_block", True):
+            utils.map_concurrently(lambda item: threads.append(threading.get_ident()), [1, 2])
+
+        self.assertEqual(threads, [threading.get_ident()] * 2)
+
+
+class MapConcurrentlyDatabaseTests(TransactionTestCase):
+    def test_threads_query_and_close_their_connections(self):
+        users = [User.objects.create_user(f"map_{i}") for i in range(4)]
+        closed_in = []
+        close_all = utils.connections.close_all
+
+        def record_close_all():
+            closed_in.append(threading.get_ident())
+            close_all()
+
+        with mock.patch.object(utils.connections, "close_all", side_effect=record_close_all):
+            usernames = utils.map_concurrently(
+                lambda user: User.objects.get(pk=user.pk).username, users, max_workers=2
+            )
+
+        self.assertEqual(usernames, [user.username for user in users])
+        self.assertEqual(len(closed_in), len(users))
+        self.assertNotIn(threading.get_ident(), closed_in)
+
+
+class StatusPollDelayTests(JobStatusTaskTestCase):
+    def test_running_job_without_connection_polls_quickly(self):
+        job = self.create_job()
+        job.datetime_start = timezone.now() - timedelta(minutes=2)
+        self.assertEqual(self.resource.get_status_poll_delay(job), 5)
+
+    def test_running_job_with_connection_backs_off(self):
+        job = self.create_job()
+        job.datetime_start = timezone.now() - timedelta(minutes=2)
+        job.job_details["current_job_details"]["connection_details"] = {"url_path": ""}
+        self.assertAlmostEqual(self.resource.get_status_poll_delay(job), 120, delta=1)
+
+    def test_pending_job_backoff_is_capped(self):
+        job = self.create_job(Job.Status.PENDING)
+        job.datetime_created = timezone.now() - timedelta(hours=2)
+        self.assertEqual(self.resource.get_status_poll_delay(job), 300)
+
+    def test_finished_job_is_not_polled(self):
+        job = self.create_job(Job.Status.COMPLETE)
+        self.assertIsNone(self.resource.get_status_poll_delay(job))
+
+
+class SlurmTokenCacheTests(TestCase):
+    def setUp(self):
+        self.resource = SlurmAPIResource(
+            config={"connection_details": {"root_url": "http://slurm"}},
+            resource_storage=None,
+            resource_user_authentication=mock.Mock(),
+        )
+        self.external_user = mock.Mock(user_id_id=1)
+
+    def make_token(self, lifetime):
+        return jwt.encode({"exp": int(time.time()) + lifetime}, "secret")
+
+    def test_cached_token_skips_lookup(self):
+        token = self.make_token(3600)
+        with mock.patch.object(self.resource, "load_user_token", return_value=token) as load:
+            self.assertEqual(self.resource.get_user_token(self.external_user), token)
+            self.assertEqual(self.resource.get_user_token(self.external_user), token)
+
+        load.assert_called_once()
+
+    def test_token_near_expiry_is_refreshed_in_background(self):
+        token = self.make_token(60)
+        with mock.patch.object(
+            self.resource, "load_user_token", return_value=token
+        ), mock.patch.object(self.resource, "refresh_user_token_async") as refresh:
+            self.assertEqual(self.resource.get_user_token(self.external_user), token)
+
+        refresh.assert_called_once_with(self.external_user)
+
+    def test_refresh_margin_is_capped_by_token_lifespan(self):
+        resource = SlurmAPIResource(
+            config={"connection_details": {"token_lifespan": "120"}},
+            resource_storage=None,
+            resource_user_authentication=mock.Mock(),
+        )
+        self.assertEqual(resource.token_refresh_margin, 60)
+
+        token = self.make_token(100)
+        with mock.patch.object(resource, "load_user_token", return_value=token), mock.patch.object(
+            resource, "refresh_user_token_async"
+        ) as refresh:
+            resource.get_user_token(self.external_user)
+
+        refresh.assert_not_called()
+
+    def test_credentials_check_permission_every_time(self):
+        user = mock.Mock(pk=1)
+        has_permission = self.resource.resource_user_authentication.has_permission
+        has_permission.return_value = self.external_user
+        token = self.make_token(3600)
+        with mock.patch.object(self.resource, "load_user_token", return_value=token) as load:
+            for _ in range(2):
+                self.assertEqual(
+                    self.resource.get_user_credentials(user), (self.external_user, token)
+                )
+
+            load.assert_called_once()
+            self.assertEqual(has_permission.call_count, 2)
+
+            # Revoked permission takes effect before the cached token expires.
+            has_permission.return_value = False
+            with self.assertRaises(APIException):
+                self.resource.get_user_credentials(user)
+
+        self.assertNotIn(user.pk, self.resource.user_tokens)
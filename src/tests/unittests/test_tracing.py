@@ -0,0 +1,107 @@
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django_q.tasks import async_task
+from rest_framework.test import APITestCase
+
+from user_workspaces_server import tracing
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_SPAN_ID = "00f067aa0ba902b7"
+
+
+class TracingTestCase:
+    def setUp(self):
+        super().setUp()
+        self.spans = []
+        tracing.exporter = None
+        self.addCleanup(setattr, tracing, "exporter", None)
+        patcher = mock.patch.object(tracing.SpanExporter, "export", autospec=True)
+        patcher.start().side_effect = lambda exporter, span: self.spans.append(span)
+        self.addCleanup(patcher.stop)
+
+    def get_spans(self, name):
+        return [span for span in self.spans if span.name == name]
+
+
+@override_settings(
+    TRACING={"exporter": "file", "file_path": os.devnull},
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+)
+class RequestTracingTests(TracingTestCase, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("test_tracing", email="test_tracing@test.com")
+
+    def test_request_continues_traceparent(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(
+            reverse("jobs"), HTTP_TRACEPARENT=f"00-{TRACE_ID}-{PARENT_SPAN_ID}-01"
+        )
+        self.assertEqual(response.status_code, 200)
+
+        [request_span] = self.get_spans("GET JobView")
+        self.assertEqual(request_span.trace_id, TRACE_ID)
+        self.assertEqual(request_span.parent_id, PARENT_SPAN_ID)
+        self.assertEqual(request_span.attributes["http.status_code"], 200)
+
+        query_spans = self.get_spans("db.query")
+        self.assertTrue(query_spans)
+        for query_span in query_spans:
+            self.assertEqual(query_span.parent_id, request_span.span_id)
+
+    def test_invalid_traceparent_starts_new_trace(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.get(reverse("jobs"), HTTP_TRACEPARENT="invalid")
+
+        [request_span] = self.get_spans("GET JobView")
+        self.assertNotEqual(request_span.trace_id, TRACE_ID)
+        self.assertIsNone(request_span.parent_id)
+
+
+@override_settings(TRACING={"exporter": "file", "file_path": os.devnull})
+class TaskTracingTests(TracingTestCase, TestCase):
+    def test_task_continues_enqueuing_trace(self):
+        with tracing.span("enqueue") as enqueue_span:
+            async_task("math.floor", 1.5, sync=True)
+            # The task's context does not leak into the caller's.
+            self.assertEqual(
+                tracing.current_span_context.get(), (enqueue_span.trace_id, enqueue_span.span_id)
+            )
+
+        [task_span] = self.get_spans("task math.floor")
+        self.assertEqual(task_span.trace_id, enqueue_span.trace_id)
+        self.assertEqual(task_span.parent_id, enqueue_span.span_id)
+        self.assertEqual(task_span.status, "ok")
+
+    def test_tracing_disabled(self):
+        with override_settings(TRACING={}):
+            with tracing.span("disabled"):
+                self.assertIsNone(tracing.get_traceparent())
+
+        self.assertEqual(self.spans, [])
+
+
+class SpanExporterTests(TestCase):
+    def test_file_and_otlp_formats(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, "traces.jsonl")
+            exporter = tracing.SpanExporter({"exporter": "file", "file_path": file_path})
+            span = tracing.Span("test", {"job.id": 1}, TRACE_ID, PARENT_SPAN_ID)
+            span.end_time = span.start_time + 1
+            exporter.write([span])
+
+            with open(file_path) as f:
+                [exported] = [json.loads(line) for line in f]
+
+        self.assertEqual(exported["trace_id"], TRACE_ID)
+        self.assertEqual(exported["parent_span_id"], PARENT_SPAN_ID)
+        self.assertEqual(exported["attributes"], {"job.id": 1})
+        self.assertEqual(
+            span.to_otlp()["attributes"], [{"key": "job.id", "value": {"intValue": "1"}}]
+        )
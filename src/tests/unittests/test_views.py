@@ -1,9 +1,19 @@
 import json
-from datetime import datetime
-
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from unittest import mock
+
+import httpx
+from asgiref.sync import async_to_sync
 from django.apps import apps
 from django.contrib.auth.models import Group, User
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.authtoken.models import Token
 from rest_framework.test import APITestCase
@@ -13,9 +23,19 @@ from tests.controllers.storagemethods.test_storage import TestStorage
 from tests.controllers.userauthenticationmethods.test_user_authentication import (
     TestUserAuthentication,
 )
-from user_workspaces_server.models import Job, SharedWorkspaceMapping, Workspace
+from user_workspaces_server import passthrough_routes
+from user_workspaces_server.models import (
+    Job,
+    JobMetric,
+    SharedWorkspaceMapping,
+    Workspace,
+    WorkspaceFile,
+    WorkspaceUpload,
+)
+from user_workspaces_server.views import passthrough_view
 
 
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
 class UserWorkspacesAPITestCase(APITestCase):
     @classmethod
     def setUpTestData(cls):
@@ -132,6 +152,49 @@ class StatusAPITests(UserWorkspacesAPITestCase):
         self.assertContains(response, "build")
 
 
+@override_settings(METRICS={"token": "scraper_token", "allowed_ips": ["10.0.0.1"]})
+class MetricsAPITests(UserWorkspacesAPITestCase):
+    metrics_url = reverse("metrics")
+
+    def get_metrics(self, **extra):
+        return self.client.get(
+            self.metrics_url, HTTP_AUTHORIZATION="Bearer scraper_token", **extra
+        )
+
+    def test_unauthenticated_metrics_are_rejected(self):
+        response = self.client.get(self.metrics_url)
+        self.assertValidResponse(response, status.HTTP_403_FORBIDDEN, success=False)
+
+        response = self.client.get(self.metrics_url, HTTP_AUTHORIZATION="Bearer wrong_token")
+        self.assertValidResponse(response, status.HTTP_403_FORBIDDEN, success=False)
+
+    def test_allowed_ip_needs_no_token(self):
+        response = self.client.get(self.metrics_url, REMOTE_ADDR="10.0.0.1")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_get_metrics(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.get(reverse("status"))
+
+        response = self.get_metrics()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertContains(response, 'uws_workspaces{status="idle"} 0.0')
+        self.assertContains(response, 'uws_jobs{status="running"} 0.0')
+        self.assertContains(
+            response,
+            'uws_http_request_duration_seconds_count{method="GET",put_type="",status="200",'
+            'view="StatusView"}',
+        )
+
+    def test_unknown_put_type_is_not_a_label(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.put(reverse("workspaces_put_type", args=[9999, "random_put_type"]))
+
+        response = self.get_metrics()
+        self.assertNotContains(response, "random_put_type")
+        self.assertContains(response, 'put_type="other"')
+
+
 class UserAPITests(UserWorkspacesAPITestCase):
     users_url = reverse("users")
 
@@ -231,6 +294,108 @@ class WorkspaceGETAPITests(WorkspaceAPITestCase):
         response = self.client.get(self.workspaces_url)
         self.assertValidResponse(response, status.HTTP_200_OK, success=True)
 
+    def test_workspaces_get_paginated(self):
+        # Same creation time, so the id has to break the tie.
+        datetime_created = timezone.now()
+        for workspace_id in range(2, 6):
+            Workspace.objects.create(
+                user_id=self.user,
+                name=f"Test Name {workspace_id}",
+                datetime_created=datetime_created,
+                workspace_details={},
+            )
+        self.client.force_authenticate(user=self.user)
+
+        workspace_ids = []
+        params = {"limit": 2, "ordering": "-datetime_created", "fields": "name"}
+        for _ in range(3):
+            response = self.client.get(self.workspaces_url, params)
+            self.assertValidResponse(response, status.HTTP_200_OK, success=True)
+            data = json.loads(response.content)["data"]
+            self.assertEqual(set(data["workspaces"][0].keys()), {"id", "name"})
+            workspace_ids += [workspace["id"] for workspace in data["workspaces"]]
+            params["cursor"] = data["next_cursor"]
+
+        self.assertIsNone(params["cursor"])
+        self.assertEqual(
+            workspace_ids,
+            list(
+                Workspace.objects.filter(user_id=self.user)
+                .order_by("-datetime_created", "-id")
+                .values_list("id", flat=True)
+            ),
+        )
+
+    def test_workspaces_get_invalid_pagination(self):
+        self.client.force_authenticate(user=self.user)
+        for params in [
+            {"fields": "file_path"},
+            {"limit": 0},
+            {"limit": 1, "ordering": "name"},
+            {"cursor": "invalid"},
+        ]:
+            response = self.client.get(self.workspaces_url, params)
+            self.assertValidResponse(response, status.HTTP_400_BAD_REQUEST, success=False)
+
+    def test_workspace_get_current_workspace_details(self):
+        WorkspaceFile.objects.bulk_create(
+            [
+                WorkspaceFile(workspace_id=self.workspace, name="/a.txt"),
+                WorkspaceFile(
+                    workspace_id=self.workspace,
+                    name="/data",
+                    file_type=WorkspaceFile.FileType.SYMLINK,
+                ),
+            ]
+        )
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse("workspaces_with_id", args=[self.workspace.id]))
+        [workspace] = json.loads(response.content)["data"]["workspaces"]
+        self.assertEqual(
+            workspace["workspace_details"]["current_workspace_details"],
+            {"files": [{"name": "/a.txt"}], "symlinks": [{"name": "/data"}]},
+        )
+
+    def test_workspace_get_non_dict_workspace_details(self):
+        self.workspace.workspace_details = []
+        self.workspace.save()
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse("workspaces_with_id", args=[self.workspace.id]))
+        self.assertValidResponse(response, status.HTTP_200_OK, success=True)
+        [workspace] = json.loads(response.content)["data"]["workspaces"]
+        self.assertEqual(workspace["workspace_details"], [])
+
+    def test_workspace_files_get(self):
+        WorkspaceFile.objects.bulk_create(
+            [WorkspaceFile(workspace_id=self.workspace, name=f"/{i}.txt") for i in range(5)]
+            + [
+                WorkspaceFile(
+                    workspace_id=self.workspace,
+                    name="/data",
+                    file_type=WorkspaceFile.FileType.SYMLINK,
+                )
+            ]
+        )
+        self.client.force_authenticate(user=self.user)
+        url = reverse("workspaces_put_type", args=[self.workspace.id, "files"])
+
+        names = []
+        params = {"limit": 2, "ordering": "-name", "file_type": "file"}
+        for _ in range(3):
+            response = self.client.get(url, params)
+            self.assertValidResponse(response, status.HTTP_200_OK, success=True)
+            data = json.loads(response.content)["data"]
+            names += [file["name"] for file in data["files"]]
+            params["cursor"] = data["next_cursor"]
+
+        self.assertIsNone(params["cursor"])
+        self.assertEqual(names, [f"/{i}.txt" for i in reversed(range(5))])
+
+    def test_workspace_files_not_found_get(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse("workspaces_put_type", args=[9999, "files"]))
+        self.assertValidResponse(response, status.HTTP_404_NOT_FOUND, success=False)
+
 
 class WorkspacePOSTAPITests(WorkspaceAPITestCase):
     def test_unauthenticated(self):
@@ -777,6 +942,162 @@ class WorkspacePUTAPITests(WorkspaceAPITestCase):
         )
 
 
+class WorkspaceDownloadAPITests(WorkspaceAPITestCase):
+    def setUp(self):
+        test_file = tempfile.NamedTemporaryFile()
+        test_file.write(b"0123456789")
+        test_file.flush()
+        self.addCleanup(test_file.close)
+        self.download_url = (
+            f"{reverse('workspaces_put_type', args=[self.workspace.id, 'download'])}"
+            f"?path={test_file.name}"
+        )
+
+    def test_workspace_download_get(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.download_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Length"], "10")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+
+    def test_workspace_download_file_name_is_encoded(self):
+        test_file = tempfile.NamedTemporaryFile(prefix='report "final" \u00e9')
+        self.addCleanup(test_file.close)
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(
+            reverse("workspaces_put_type", args=[self.workspace.id, "download"]),
+            {"path": test_file.name},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(
+            response["Content-Disposition"].startswith(
+                "attachment; filename*=utf-8''report%20%22final%22%20%C3%A9"
+            )
+        )
+
+    def test_workspace_download_range_get(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.download_url, HTTP_RANGE="bytes=2-5")
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response["Content-Range"], "bytes 2-5/10")
+        self.assertEqual(response["Content-Length"], "4")
+
+    def test_workspace_download_unsatisfiable_range_get(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.download_url, HTTP_RANGE="bytes=20-")
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+
+    def test_workspace_invalid_get_type_get(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(
+            reverse("workspaces_put_type", args=[self.workspace.id, "invalid"])
+        )
+        self.assertValidResponse(
+            response,
+            status.HTTP_400_BAD_REQUEST,
+            success=False,
+            message="Invalid GET type passed.",
+        )
+
+
+class WorkspaceUploadAPITests(WorkspaceAPITestCase):
+    def initiate_upload(self, size=None):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(
+            reverse("workspace_uploads", args=[self.workspace.id]),
+            {"name": "/data/test_file.txt", "size": size},
+            format="json",
+        )
+        self.assertValidResponse(response, status.HTTP_200_OK, success=True)
+        return json.loads(response.content)["data"]["upload"]
+
+    def put_chunk(self, upload, data, offset=None, **extra):
+        url = reverse("workspace_uploads_with_id", args=[self.workspace.id, upload["id"]])
+        if offset is not None:
+            url = f"{url}?offset={offset}"
+        return self.client.put(url, data, content_type="application/octet-stream", **extra)
+
+    def test_upload_chunk_without_content_length(self):
+        upload = self.initiate_upload()
+        response = self.put_chunk(upload, b"chunk", CONTENT_LENGTH="")
+        self.assertValidResponse(response, status.HTTP_411_LENGTH_REQUIRED, success=False)
+        self.assertEqual(WorkspaceUpload.objects.get(pk=upload["id"]).bytes_received, 0)
+
+    def test_upload_chunk_with_invalid_content_length(self):
+        upload = self.initiate_upload()
+        response = self.put_chunk(upload, b"chunk", CONTENT_LENGTH="five")
+        self.assertValidResponse(response, status.HTTP_400_BAD_REQUEST, success=False)
+
+    def test_upload_invalid_file_name_post(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(
+            reverse("workspace_uploads", args=[self.workspace.id]),
+            {"name": "../test_file.txt"},
+            format="json",
+        )
+        self.assertValidResponse(
+            response,
+            status.HTTP_400_BAD_REQUEST,
+            success=False,
+            message="File name cannot contain double dots.",
+        )
+
+    def test_upload_chunks_and_complete(self):
+        upload = self.initiate_upload(size=10)
+        self.assertEqual(upload["file_name"], "data/test_file.txt")
+
+        self.assertValidResponse(self.put_chunk(upload, b"x" * 6), status.HTTP_200_OK, True)
+        # Resending the last chunk is allowed
+        self.assertValidResponse(self.put_chunk(upload, b"x" * 4, 2), status.HTTP_200_OK, True)
+        response = self.put_chunk(upload, b"x" * 4)
+        self.assertValidResponse(response, status.HTTP_200_OK, success=True)
+        self.assertEqual(json.loads(response.content)["data"]["upload"]["bytes_received"], 10)
+
+        response = self.client.put(
+            reverse(
+                "workspace_uploads_put_type", args=[self.workspace.id, upload["id"], "complete"]
+            )
+        )
+        self.assertValidResponse(
+            response, status.HTTP_200_OK, success=True, message="Successful upload."
+        )
+        self.assertEqual(json.loads(response.content)["data"]["upload"]["status"], "complete")
+
+    def test_upload_chunk_gap_put(self):
+        upload = self.initiate_upload()
+        response = self.put_chunk(upload, b"x" * 4, 2)
+        self.assertValidResponse(response, status.HTTP_400_BAD_REQUEST, success=False)
+
+    def test_upload_chunk_past_declared_size_put(self):
+        upload = self.initiate_upload(size=4)
+        with mock.patch.object(
+            apps.get_app_config("user_workspaces_server").main_storage, "write_upload_chunk"
+        ) as write_upload_chunk:
+            response = self.put_chunk(upload, b"x" * 6)
+
+        self.assertValidResponse(response, status.HTTP_400_BAD_REQUEST, success=False)
+        write_upload_chunk.assert_not_called()
+
+    def test_upload_incomplete_complete_put(self):
+        upload = self.initiate_upload(size=10)
+        self.put_chunk(upload, b"x" * 4)
+        response = self.client.put(
+            reverse(
+                "workspace_uploads_put_type", args=[self.workspace.id, upload["id"], "complete"]
+            )
+        )
+        self.assertValidResponse(response, status.HTTP_400_BAD_REQUEST, success=False)
+
+    def test_upload_get(self):
+        upload = self.initiate_upload()
+        self.put_chunk(upload, b"x" * 4)
+        response = self.client.get(
+            reverse("workspace_uploads_with_id", args=[self.workspace.id, upload["id"]])
+        )
+        self.assertValidResponse(response, status.HTTP_200_OK, success=True)
+        self.assertEqual(json.loads(response.content)["data"]["uploads"][0]["bytes_received"], 4)
+
+
 class WorkspaceDELETEAPITests(WorkspaceAPITestCase):
     def test_workspace_not_found_delete(self):
         self.client.force_authenticate(user=self.user)
@@ -895,6 +1216,71 @@ class JobGETAPITests(JobAPITestCase):
         response = self.client.get(self.jobs_url)
         self.assertValidResponse(response, status.HTTP_200_OK, success=True)
 
+    def test_jobs_get_paginated(self):
+        job = Job.objects.get(pk=self.job.pk)
+        job.pk = None
+        job.save()
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.get(self.jobs_url, {"limit": 1, "fields": "status"})
+        data = json.loads(response.content)["data"]
+        self.assertEqual(data["jobs"], [{"id": self.job.id, "status": self.job.status}])
+
+        response = self.client.get(self.jobs_url, {"limit": 1, "cursor": data["next_cursor"]})
+        data = json.loads(response.content)["data"]
+        self.assertEqual([job["id"] for job in data["jobs"]], [job.id])
+        self.assertIn("job_details", data["jobs"][0])
+        self.assertIsNone(data["next_cursor"])
+
+
+class JobMetricsAPITests(JobAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        start = timezone.now().replace(minute=0, second=0, microsecond=0)
+        for minutes, memory in [(0, 100), (0, 300), (1, 500), (61, 700)]:
+            JobMetric.objects.create(
+                job_id=cls.job,
+                datetime_created=start + timedelta(minutes=minutes, seconds=1),
+                cpu_time=minutes,
+                memory=memory,
+            )
+
+    def test_job_metrics_get(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse("jobs_put_type", args=[self.job.id, "metrics"]))
+        self.assertValidResponse(response, status.HTTP_200_OK, success=True)
+        metrics = json.loads(response.content)["data"]["metrics"]
+        self.assertEqual([bucket["samples"] for bucket in metrics], [2, 1, 1])
+        self.assertEqual(metrics[0]["memory_mean"], 200)
+        self.assertEqual(metrics[0]["memory_max"], 300)
+
+    def test_job_metrics_interval_get(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(
+            reverse("jobs_put_type", args=[self.job.id, "metrics"]), {"interval": "hour"}
+        )
+        metrics = json.loads(response.content)["data"]["metrics"]
+        self.assertEqual([bucket["samples"] for bucket in metrics], [3, 1])
+        self.assertEqual(metrics[0]["cpu_time_max"], 1)
+
+    def test_job_metrics_invalid_interval_get(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(
+            reverse("jobs_put_type", args=[self.job.id, "metrics"]), {"interval": "second"}
+        )
+        self.assertValidResponse(response, status.HTTP_400_BAD_REQUEST, success=False)
+
+    def test_job_metrics_not_found_get(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse("jobs_put_type", args=[9999, "metrics"]))
+        self.assertValidResponse(
+            response,
+            status.HTTP_404_NOT_FOUND,
+            success=False,
+            message="Job 9999 not found for user.",
+        )
+
 
 class JobPUTAPITests(JobAPITestCase):
     def test_workspace_not_found_put(self):
@@ -947,6 +1333,136 @@ class JobPUTAPITests(JobAPITestCase):
         )
 
 
+class PassthroughAPITests(JobAPITestCase):
+    def setUp(self):
+        passthrough_routes.routes.clear()
+        self.addCleanup(passthrough_routes.routes.clear)
+        self.job.job_details["current_job_details"]["proxy_details"] = {
+            "hostname": "node1",
+            "port": 8888,
+        }
+        self.job.save()
+
+        async def handler(request):
+            async def body():
+                yield f"{request.method} {request.url.path} {request.content.decode()}".encode()
+
+            # Streamed, like a real upstream, so the raw bytes are not read ahead of the view.
+            return httpx.Response(
+                200,
+                headers={"X-Upstream": "node1", "Set-Cookie": "session=1; Path=/"},
+                content=body(),
+            )
+
+        self.mock_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        patcher = mock.patch.object(passthrough_view, "http_client", self.mock_client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.force_login(self.user)
+
+    @contextmanager
+    def capture_job_queries(self):
+        # Authentication looks up the session and user on every request, route lookups the job.
+        job_queries = []
+        with CaptureQueriesContext(connection) as context:
+            yield job_queries
+        job_queries.extend(
+            query for query in context.captured_queries if Job._meta.db_table in query["sql"]
+        )
+
+    @async_to_sync
+    async def read_content(self, response):
+        return b"".join([chunk async for chunk in response.streaming_content])
+
+    def test_passthrough_unknown_job(self):
+        response = self.client.get(reverse("passthrough", args=["node1", 9999]))
+        self.assertValidResponse(response, status.HTTP_404_NOT_FOUND, success=False)
+
+    def test_passthrough_requires_authentication(self):
+        self.client.logout()
+        response = self.client.get(reverse("passthrough", args=["node1", self.job.id]))
+        self.assertValidResponse(response, status.HTTP_403_FORBIDDEN, success=False)
+
+    def test_passthrough_accepts_token(self):
+        self.client.logout()
+        token = Token.objects.create(user=self.user)
+        response = self.client.get(
+            reverse("passthrough", args=["node1", self.job.id]),
+            HTTP_UWS_AUTHORIZATION=f"Token {token.key}",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_passthrough_other_users_job(self):
+        other_user = User.objects.create_user("test_passthrough", email="test_pt@test.com")
+        self.client.force_login(other_user)
+        response = self.client.get(reverse("passthrough", args=["node1", self.job.id]))
+        self.assertValidResponse(response, status.HTTP_403_FORBIDDEN, success=False)
+
+    def test_passthrough_host_mismatch(self):
+        response = self.client.get(reverse("passthrough", args=["node2", self.job.id]))
+        self.assertValidResponse(response, status.HTTP_404_NOT_FOUND, success=False)
+
+    def test_passthrough_get(self):
+        response = self.client.get(
+            reverse("passthrough_remainder", args=["node1", self.job.id, "lab/tree"])
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["X-Upstream"], "node1")
+        self.assertEqual(response.cookies["session"].value, "1")
+        self.assertEqual(
+            self.read_content(response),
+            f"GET /passthrough/node1/{self.job.id}/lab/tree ".encode(),
+        )
+
+    def test_passthrough_route_is_cached(self):
+        url = reverse("passthrough", args=["node1", self.job.id])
+        self.client.get(url)
+        with self.capture_job_queries() as job_queries:
+            response = self.client.get(url)
+        self.assertEqual(job_queries, [])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_passthrough_unknown_job_is_cached(self):
+        url = reverse("passthrough", args=["node1", 9999])
+        self.client.get(url)
+        with self.capture_job_queries() as job_queries:
+            response = self.client.get(url)
+        self.assertEqual(job_queries, [])
+        self.assertValidResponse(response, status.HTTP_404_NOT_FOUND, success=False)
+
+        # Only briefly, unlike found routes.
+        passthrough_routes.routes[9999] = (None, time.monotonic() - 1)
+        with self.capture_job_queries() as job_queries:
+            self.client.get(url)
+        self.assertEqual(len(job_queries), 1)
+
+    def test_passthrough_finished_job(self):
+        self.job.status = Job.Status.COMPLETE
+        self.job.save()
+        response = self.client.get(reverse("passthrough", args=["node1", self.job.id]))
+        self.assertValidResponse(response, status.HTTP_404_NOT_FOUND, success=False)
+
+    def test_passthrough_post_streams_body(self):
+        response = self.client.post(
+            reverse("passthrough_remainder", args=["node1", self.job.id, "api"]),
+            data="payload",
+            content_type="text/plain",
+        )
+        self.assertEqual(
+            self.read_content(response),
+            f"POST /passthrough/node1/{self.job.id}/api payload".encode(),
+        )
+
+    def test_passthrough_upstream_unreachable(self):
+        def handler(request):
+            raise httpx.ConnectError("Connection refused", request=request)
+
+        self.mock_client._transport = httpx.MockTransport(handler)
+        response = self.client.get(reverse("passthrough", args=["node1", self.job.id]))
+        self.assertValidResponse(response, status.HTTP_502_BAD_GATEWAY, success=False)
+        self.assertNotIn(self.job.id, passthrough_routes.routes)
+
+
 class JobTypeAPITestCase(UserWorkspacesAPITestCase):
     job_types_url = reverse("job_types")
 
@@ -1025,6 +1541,39 @@ class SharedWorkspaceGETAPITests(SharedWorkspaceAPITestCase):
         response = self.client.get(f"{self.shared_workspaces_url}?is_accepted=True")
         self.assertValidResponse(response, status.HTTP_200_OK, success=True)
 
+    def test_shared_workspaces_get_query_count(self):
+        # Shares both ways with other users, which all have to be serialized.
+        for i in range(10):
+            user = User.objects.create_user(f"test_share_{i}", email=f"test_share_{i}@test.com")
+            for original_user, shared_user in [(self.user, user), (user, self.user)]:
+                SharedWorkspaceMapping.objects.create(
+                    original_workspace_id=Workspace.objects.create(
+                        user_id=original_user,
+                        datetime_created=datetime.now(),
+                        workspace_details={},
+                    ),
+                    shared_workspace_id=Workspace.objects.create(
+                        user_id=shared_user,
+                        datetime_created=datetime.now(),
+                        workspace_details={},
+                    ),
+                )
+
+        self.client.force_authenticate(user=self.user)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.shared_workspaces_url)
+
+        data = json.loads(response.content)["data"]
+        self.assertEqual(len(data["original_workspaces"]), 11)
+        self.assertEqual(len(data["shared_workspaces"]), 10)
+        self.assertEqual(
+            {
+                mapping["original_workspace_id"]["user_id"]["username"]
+                for mapping in data["shared_workspaces"]
+            },
+            {f"test_share_{i}" for i in range(10)},
+        )
+
 
 class SharedWorkspacePOSTAPITests(SharedWorkspaceAPITestCase):
     def test_unauthenticated(self):
@@ -1110,6 +1659,37 @@ class SharedWorkspacePOSTAPITests(SharedWorkspaceAPITestCase):
         self.assertValidResponse(response, status.HTTP_200_OK, success=True, message="Successful.")
         # TODO: Check body
 
+    def test_multiple_users_post(self):
+        users = [self.user_2] + [
+            User.objects.create_user(f"test_share_{i}", email=f"test_share_{i}@test.com")
+            for i in range(3)
+        ]
+        self.client.force_authenticate(user=self.user)
+        body = {
+            "shared_user_ids": [user.pk for user in users],
+            "original_workspace_id": self.original_workspace.pk,
+        }
+        with mock.patch(
+            "user_workspaces_server.views.shared_workspace_view.async_task"
+        ) as async_task:
+            response = self.client.post(self.shared_workspaces_url, body)
+        self.assertValidResponse(response, status.HTTP_200_OK, success=True, message="Successful.")
+
+        mappings = SharedWorkspaceMapping.objects.filter(
+            original_workspace_id=self.original_workspace,
+            shared_workspace_id__user_id__in=users,
+        ).exclude(pk=self.shared_workspace_mapping.pk)
+        self.assertEqual(len(mappings), 4)
+        # One task initializes every shared workspace.
+        async_task.assert_called_once_with(
+            "user_workspaces_server.tasks.initialize_shared_workspaces",
+            sorted(mapping.pk for mapping in mappings),
+            cluster="long",
+        )
+        self.assertEqual(
+            len(json.loads(response.content)["data"]["shared_workspaces"]), len(users)
+        )
+
 
 class SharedWorkspacePUTAPITests(SharedWorkspaceAPITestCase):
     def test_shared_workspace_not_found_put(self):
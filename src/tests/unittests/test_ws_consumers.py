@@ -0,0 +1,270 @@
+from datetime import datetime
+from unittest import mock
+
+import websockets
+from asgiref.sync import sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser, User
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+from user_workspaces_server import passthrough_routes, tasks
+from user_workspaces_server.auth import TokenAuthMiddleware
+from user_workspaces_server.models import Job, Workspace
+from user_workspaces_server.urls import ws_urlpatterns
+from user_workspaces_server.ws_consumers import UserStatusConsumer
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class PassthroughConsumerTests(SimpleTestCase):
+    job_id = 1
+
+    def setUp(self):
+        passthrough_routes.routes.clear()
+        self.addCleanup(passthrough_routes.routes.clear)
+        self.upstream_headers = []
+
+    async def echo(self, websocket, path):
+        self.upstream_headers.append(websocket.request_headers)
+        async for message in websocket:
+            if message == "close":
+                await websocket.close(code=4001)
+            else:
+                await websocket.send(message)
+
+    def get_communicator(self, hostname, port, user=None):
+        passthrough_routes.routes[self.job_id] = (
+            passthrough_routes.Route(hostname, port, 1),
+            None,
+        )
+        communicator = WebsocketCommunicator(
+            URLRouter(ws_urlpatterns),
+            f"/passthrough/127.0.0.1/{self.job_id}/api/kernels/1/channels",
+            headers=[(b"cookie", b"session=1")],
+        )
+        communicator.scope["user"] = user or mock.Mock(pk=1, is_authenticated=True)
+        return communicator
+
+    async def test_frames_are_relayed(self):
+        async with websockets.serve(self.echo, "127.0.0.1", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            communicator = self.get_communicator("127.0.0.1", port)
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+
+            await communicator.send_to(text_data="hello")
+            self.assertEqual(await communicator.receive_from(), "hello")
+
+            await communicator.send_to(bytes_data=b"\x00\x01")
+            response = await communicator.receive_output()
+            self.assertEqual(response["bytes"], b"\x00\x01")
+
+            await communicator.disconnect()
+
+        self.assertEqual(self.upstream_headers[0]["Cookie"], "session=1")
+
+    async def test_upstream_close_code_is_propagated(self):
+        async with websockets.serve(self.echo, "127.0.0.1", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            communicator = self.get_communicator("127.0.0.1", port)
+            await communicator.connect()
+
+            await communicator.send_to(text_data="close")
+            response = await communicator.receive_output()
+            self.assertEqual(response, {"type": "websocket.close", "code": 4001})
+
+            await communicator.disconnect()
+
+    async def test_host_mismatch_is_rejected(self):
+        communicator = self.get_communicator("node1", 8888)
+        connected, _ = await communicator.connect()
+        self.assertFalse(connected)
+
+    async def test_anonymous_user_is_rejected(self):
+        communicator = self.get_communicator("127.0.0.1", 8888, AnonymousUser())
+        connected, code = await communicator.connect()
+        self.assertFalse(connected)
+        self.assertEqual(code, 4403)
+
+    async def test_other_users_job_is_rejected(self):
+        communicator = self.get_communicator(
+            "127.0.0.1", 8888, mock.Mock(pk=2, is_authenticated=True)
+        )
+        connected, code = await communicator.connect()
+        self.assertFalse(connected)
+        self.assertEqual(code, 4403)
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class StatusConsumerTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("test_ws", email="test_ws@test.com")
+        cls.token = Token.objects.create(user=cls.user)
+        cls.workspace = Workspace.objects.create(
+            user_id=cls.user,
+            name="Test Name",
+            datetime_created=datetime.now(),
+            workspace_details={},
+            file_path="test_ws/1",
+            status=Workspace.Status.IDLE,
+        )
+        cls.job = cls.create_job()
+
+    @classmethod
+    def create_job(cls):
+        return Job.objects.create(
+            user_id=cls.user,
+            job_type="test_job",
+            datetime_created=datetime.now(),
+            job_details={
+                "metrics": {},
+                "request_job_details": {},
+                "current_job_details": {"message": "Queued."},
+            },
+            resource_name="TestResource",
+            status=Job.Status.PENDING,
+            resource_job_id=1,
+            core_hours=0,
+            resource_options={},
+        )
+
+
+class JobStatusConsumerTests(StatusConsumerTestCase):
+    def get_communicator(self, token, job_id):
+        return WebsocketCommunicator(
+            TokenAuthMiddleware(URLRouter(ws_urlpatterns)), f"/jobs/{job_id}/?token={token}"
+        )
+
+    async def test_snapshot_then_patches(self):
+        communicator = self.get_communicator(self.token.key, self.job.pk)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        self.assertEqual(
+            await communicator.receive_json_from(),
+            {
+                "type": "job_status_snapshot",
+                "job_id": self.job.pk,
+                "data": {"status": "pending", "current_job_details": {"message": "Queued."}},
+            },
+        )
+
+        await sync_to_async(tasks.broadcast_job_status)(self.job, {"status": "running"})
+        self.assertEqual(
+            await communicator.receive_json_from(),
+            {"type": "job_status_patch", "job_id": self.job.pk, "data": {"status": "running"}},
+        )
+
+        await communicator.disconnect()
+
+    async def test_unauthenticated_is_rejected(self):
+        connected, _ = await self.get_communicator("invalid", self.job.pk).connect()
+        self.assertFalse(connected)
+
+    async def test_other_users_job_is_rejected(self):
+        other_user = await User.objects.acreate(username="test_ws_2", email="test_ws_2@test.com")
+        other_token = await Token.objects.acreate(user=other_user)
+        communicator = self.get_communicator(other_token.key, self.job.pk)
+        connected, _ = await communicator.connect()
+        self.assertFalse(connected)
+
+    async def test_finished_job_snapshot_has_no_connection_details(self):
+        job = await sync_to_async(self.create_job)()
+        job.status = Job.Status.COMPLETE
+        job.job_details["current_job_details"]["connection_details"] = {"url_path": "?token=a"}
+        await job.asave()
+
+        communicator = self.get_communicator(self.token.key, job.pk)
+        await communicator.connect()
+        snapshot = await communicator.receive_json_from()
+        self.assertEqual(snapshot["data"]["current_job_details"], {"message": "Queued."})
+        await communicator.disconnect()
+
+
+@mock.patch.object(UserStatusConsumer, "batch_interval", 0.1)
+class UserStatusConsumerTests(StatusConsumerTestCase):
+    def get_communicator(self, token):
+        return WebsocketCommunicator(
+            TokenAuthMiddleware(URLRouter(ws_urlpatterns)), f"/jobs/?token={token}"
+        )
+
+    async def test_invalid_token_is_rejected(self):
+        connected, _ = await self.get_communicator("invalid").connect()
+        self.assertFalse(connected)
+
+    async def test_active_jobs_and_workspaces_are_subscribed(self):
+        communicator = self.get_communicator(self.token.key)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        batch = await communicator.receive_json_from()
+        self.assertEqual(
+            [message["type"] for message in batch["messages"]],
+            ["job_status_snapshot", "workspace_status_snapshot"],
+        )
+        self.assertEqual(batch["messages"][1]["data"], {"status": "idle", "disk_space": 0})
+
+        await sync_to_async(tasks.broadcast_job_status)(self.job, {"status": "running"})
+        batch = await communicator.receive_json_from()
+        self.assertEqual(
+            batch["messages"],
+            [{"type": "job_status_patch", "job_id": self.job.pk, "data": {"status": "running"}}],
+        )
+
+        await communicator.disconnect()
+
+    async def test_subscribe_and_unsubscribe(self):
+        communicator = self.get_communicator(self.token.key)
+        await communicator.connect()
+        await communicator.receive_json_from()
+
+        await communicator.send_json_to({"action": "unsubscribe", "job_id": self.job.pk})
+        await communicator.send_json_to({"action": "subscribe", "job_id": 9999})
+        self.assertEqual(
+            await communicator.receive_json_from(),
+            {"type": "error", "message": "No job 9999 found for user."},
+        )
+
+        # Jobs started after connecting are subscribed to through the user's group.
+        job = await sync_to_async(self.create_job)()
+        await sync_to_async(tasks.subscribe_user_status)(self.user.pk, "job", job.pk)
+        batch = await communicator.receive_json_from()
+        self.assertEqual(batch["messages"][0]["job_id"], job.pk)
+
+        await sync_to_async(tasks.broadcast_job_status)(self.job, {"status": "running"})
+        self.assertTrue(await communicator.receive_nothing())
+
+        await communicator.disconnect()
+
+
+class WorkspaceStatusConsumerTests(StatusConsumerTestCase):
+    def get_communicator(self, token, workspace_id):
+        return WebsocketCommunicator(
+            TokenAuthMiddleware(URLRouter(ws_urlpatterns)),
+            f"/workspaces/{workspace_id}/?token={token}",
+        )
+
+    async def test_snapshot_then_progress(self):
+        communicator = self.get_communicator(self.token.key, self.workspace.pk)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        snapshot = await communicator.receive_json_from()
+        self.assertEqual(snapshot["type"], "workspace_status_snapshot")
+
+        progress = {"task": "clone", "state": "running", "bytes_copied": 1, "bytes_total": 2}
+        await sync_to_async(tasks.broadcast_workspace_status)(
+            self.workspace.pk, "workspace_progress", progress
+        )
+        self.assertEqual(
+            await communicator.receive_json_from(),
+            {"type": "workspace_progress", "workspace_id": self.workspace.pk, "data": progress},
+        )
+
+        await communicator.disconnect()
+
+    async def test_unknown_workspace_is_rejected(self):
+        connected, _ = await self.get_communicator(self.token.key, 9999).connect()
+        self.assertFalse(connected)
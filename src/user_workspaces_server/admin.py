@@ -8,7 +8,10 @@ admin.site.register(
         models.ExternalUserMapping,
         models.UserQuota,
         models.Workspace,
+        models.WorkspaceFile,
         models.Job,
+        models.JobMetric,
         models.SharedWorkspaceMapping,
+        models.WorkspaceUpload,
     ]
 )
@@ -2,8 +2,9 @@ import os
 
 from django.apps import AppConfig
 from django.conf import settings
+from django.db.backends.signals import connection_created
 
-from . import utils
+from . import metrics, tracing, utils
 
 
 class UserWorkspacesServerConfig(AppConfig):
@@ -71,20 +72,35 @@ class UserWorkspacesServerConfig(AppConfig):
 
         self.main_resource = self.available_resources[settings.UWS_CONFIG["main_resource"]]
 
+        from django_q.signals import post_execute, pre_enqueue, pre_execute
+
+        connection_created.connect(tracing.install_query_tracing)
+        # Tasks can run synchronously in any process, so these are connected everywhere.
+        pre_enqueue.connect(tracing.inject_task_context)
+        pre_execute.connect(tracing.start_task_span)
+        post_execute.connect(tracing.finish_task_span)
+
         if os.environ.get("SUBCOMMAND", None) != "qcluster":
             return
 
         from django_q import brokers
-        from django_q.tasks import async_task
+        from django_q.conf import Conf
+        from django_q.models import Schedule
 
-        from . import models
+        post_execute.connect(metrics.observe_task)
 
         broker = brokers.get_broker()
         broker.purge_queue()
-        active_jobs = models.Job.objects.filter(status__in=["pending", "running"]).all()
-        for active_job in active_jobs:
-            async_task(
-                "user_workspaces_server.tasks.update_job_status",
-                active_job.id,
-                hook="user_workspaces_server.tasks.queue_job_update",
+
+        # A single poller on the main cluster handles every active job.
+        if Conf.CLUSTER_NAME == Conf.PREFIX:
+            from user_workspaces_server.tasks import start_job_status_poller
+
+            start_job_status_poller()
+            Schedule.objects.update_or_create(
+                name="cleanup_uploads",
+                defaults={
+                    "func": "user_workspaces_server.tasks.cleanup_uploads",
+                    "schedule_type": Schedule.HOURLY,
+                },
             )
@@ -1,5 +1,9 @@
 import logging
+from urllib import parse
 
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
 from rest_framework import authentication
 from rest_framework.authtoken.models import Token
 from rest_framework.exceptions import AuthenticationFailed
@@ -28,3 +32,40 @@ class UserWorkspacesTokenAuthentication(authentication.TokenAuthentication):
             raise AuthenticationFailed("Invalid token provided.")
 
         return valid_token.user, None
+
+
+async def aget_request_user(request):
+    # For plain async Django views, which DRF's authentication doesn't cover. Browsers reach
+    # them with a session, other clients with the same UWS-Authorization header as the API.
+    user = await request.auser()
+    if user.is_authenticated:
+        return user
+
+    try:
+        identifier, token = request.META.get("HTTP_UWS_AUTHORIZATION", "").split(" ")
+    except ValueError:
+        return user
+
+    try:
+        return (await Token.objects.select_related("user").aget(key=token)).user
+    except Token.DoesNotExist:
+        logger.warning("Invalid token provided.")
+        return user
+
+
+class TokenAuthMiddleware(BaseMiddleware):
+    # Browsers can't set headers on websockets, so the token is passed as ?token=<token>.
+    async def __call__(self, scope, receive, send):
+        token = parse.parse_qs(scope.get("query_string", b"").decode("UTF-8")).get("token")
+        if token:
+            scope = dict(scope)
+            scope["user"] = await self.get_user(token[0])
+        return await super().__call__(scope, receive, send)
+
+    @database_sync_to_async
+    def get_user(self, token):
+        try:
+            return Token.objects.select_related("user").get(key=token).user
+        except Token.DoesNotExist:
+            logger.warning("Invalid websocket token provided.")
+            return AnonymousUser()
@@ -6,7 +6,7 @@ from urllib import parse
 from django.apps import apps
 from django.template import loader
 
-from user_workspaces_server import models
+from user_workspaces_server import models, tracing
 from user_workspaces_server.controllers.jobtypes.abstract_job import AbstractJob
 
 logger = logging.getLogger(__name__)
@@ -22,8 +22,9 @@ class JupyterLabJob(AbstractJob):
         template_config.update(self.config)
         template_config.update(template_params)
 
-        template = loader.get_template(f"script_templates/{self.script_template_name}")
-        script = template.render(template_config)
+        with tracing.span("template.render", {"template": self.script_template_name}):
+            template = loader.get_template(f"script_templates/{self.script_template_name}")
+            script = template.render(template_config)
 
         return script
 
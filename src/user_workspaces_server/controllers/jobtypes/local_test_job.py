@@ -1,5 +1,6 @@
 from django.template import loader
 
+from user_workspaces_server import tracing
 from user_workspaces_server.controllers.jobtypes.abstract_job import AbstractJob
 
 
@@ -9,8 +10,9 @@ class LocalTestJob(AbstractJob):
         self.script_template_name = "local_test_template.sh"
 
     def get_script(self, template_params=None):
-        template = loader.get_template(f"script_templates/{self.script_template_name}")
-        script = template.render({"job_id": self.job_details["id"]})
+        with tracing.span("template.render", {"template": self.script_template_name}):
+            template = loader.get_template(f"script_templates/{self.script_template_name}")
+            script = template.render({"job_id": self.job_details["id"]})
 
         return script
 
@@ -4,11 +4,10 @@ from datetime import datetime, timedelta, timezone
 from urllib import parse
 
 import jwt
-import requests as http_r
 from django.apps import apps
 from django.template import loader
 
-from user_workspaces_server import models
+from user_workspaces_server import models, tracing
 from user_workspaces_server.controllers.jobtypes.abstract_job import AbstractJob
 
 logger = logging.getLogger(__name__)
@@ -36,8 +35,9 @@ class YACJob(AbstractJob):
         template_config.update(self.config)
         template_config.update(template_params)
 
-        template = loader.get_template(f"script_templates/{self.script_template_name}")
-        script = template.render(template_config)
+        with tracing.span("template.render", {"template": self.script_template_name}):
+            template = loader.get_template(f"script_templates/{self.script_template_name}")
+            script = template.render(template_config)
 
         return script
 
@@ -89,7 +89,7 @@ class YACJob(AbstractJob):
         )
 
         # TODO: We need to turn off this verify False flag.
-        if http_r.get(url_domain, verify=False).status_code != 200:
+        if resource.http_session.get(url_domain, verify=False).status_code != 200:
             logger.warning("Webserver not ready yet.")
             return {"current_job_details": {"message": "Webserver not ready."}}
 
@@ -1,8 +1,8 @@
 import logging
 from abc import ABC, abstractmethod
+from datetime import datetime
 
-import requests as http_r
-
+from user_workspaces_server import utils
 from user_workspaces_server.controllers.jobtypes.abstract_job import AbstractJob
 from user_workspaces_server.exceptions import ValidationException
 from user_workspaces_server.models import Job, Workspace
@@ -18,6 +18,7 @@ class AbstractResource(ABC):
         self.resource_user_authentication = resource_user_authentication
         self.passthrough_domain = config.get("passthrough_domain", "")
         self.connection_details = self.config.get("connection_details", {})
+        self.http_session = utils.generate_http_session(self.connection_details)
 
     @abstractmethod
     def translate_status(self, status: str) -> Job.Status:
@@ -34,6 +35,18 @@ class AbstractResource(ABC):
         # Should get the resource's job information
         pass
 
+    def get_resource_jobs(self, jobs: list) -> dict:
+        # Should get the resource's job information for many jobs at once, keyed by job id.
+        # Resources that support bulk queries should override this.
+        resource_jobs = {}
+        for job in jobs:
+            try:
+                resource_jobs[job.id] = self.get_resource_job(job)
+            except Exception as e:
+                logger.error(f"Could not get resource job for job {job.id}: {repr(e)}")
+
+        return resource_jobs
+
     @abstractmethod
     def get_job_core_hours(self, job: Job) -> int:
         # Should return time in hours
@@ -44,6 +57,35 @@ class AbstractResource(ABC):
         # Should stop the job on the resource
         pass
 
+    def get_status_poll_delay(self, job: Job):
+        # Seconds until the job's status should be checked again, None once it has finished.
+        if job.status in [Job.Status.COMPLETE, Job.Status.FAILED]:
+            return None
+
+        min_interval = float(self.config.get("job_status_poll_interval", 5))
+        max_interval = float(self.config.get("job_status_poll_max_interval", 300))
+        backoff = float(self.config.get("job_status_poll_backoff", 2))
+        init_window = float(self.config.get("job_status_poll_init_window", 600))
+
+        if job.status == Job.Status.STOPPING:
+            return min_interval
+
+        running = job.status == Job.Status.RUNNING and job.datetime_start is not None
+        state_start = job.datetime_start if running else job.datetime_created
+        time_in_state = (datetime.now(state_start.tzinfo) - state_start).total_seconds()
+
+        # Connection details are still being discovered, keep polling quickly.
+        if (
+            running
+            and "connection_details" not in job.job_details["current_job_details"]
+            and time_in_state < init_window
+        ):
+            return min_interval
+
+        # Waiting a fixed fraction of the time already spent in this state is the same as
+        # multiplying the interval by the backoff factor on every poll.
+        return min(max_interval, max(min_interval, time_in_state * (backoff - 1)))
+
     def validate_options(self, resource_options: dict) -> bool:
         validator = ParamValidator()
         validator.validate(resource_options)
@@ -66,7 +108,7 @@ class AbstractResource(ABC):
     def health_check(self):
         connected = True
         try:
-            response = http_r.get(self.connection_details.get("health_check_url"))
+            response = self.http_session.get(self.connection_details.get("health_check_url"))
             if response.status_code != 200:
                 connected = False
                 message = f"Invalid status code: {response.status_code}"
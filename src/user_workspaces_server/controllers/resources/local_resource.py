@@ -1,5 +1,6 @@
 import logging
 import os
+import platform
 import signal
 import subprocess
 import time
@@ -64,13 +65,35 @@ class LocalResource(AbstractResource):
     def get_resource_job(self, job):
         resource_job_id = job.resource_job_id
         try:
-            resource_job = psutil.Process(resource_job_id).as_dict()
+            process = psutil.Process(resource_job_id)
+            resource_job = process.as_dict()
             resource_job["status"] = self.translate_status(resource_job["status"])
+            resource_job["metrics"] = self.get_process_metrics(process)
             return resource_job
         except Exception as e:
             logger.exception(repr(e))
             return {"status": Job.Status.COMPLETE}
 
+    def get_process_metrics(self, process):
+        # Usage of the job's whole process tree.
+        cpu_time = 0.0
+        memory = 0
+        for tree_process in [process] + process.children(recursive=True):
+            try:
+                cpu_times = tree_process.cpu_times()
+                cpu_time += cpu_times.user + cpu_times.system
+                memory += tree_process.memory_info().rss
+            except psutil.Error:
+                # Processes can exit while the tree is walked.
+                continue
+
+        return {
+            "cpu_time": cpu_time,
+            "cpus": psutil.cpu_count(),
+            "memory": memory,
+            "node": platform.node(),
+        }
+
     def get_job_core_hours(self, job):
         datetime_running = job.datetime_end - job.datetime_start
         return (
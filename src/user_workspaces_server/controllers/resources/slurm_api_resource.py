@@ -1,10 +1,12 @@
 # THIS RESOURCE IS MEANT TO SUPPORT v0.0.40 OF THE SLURM RESPONSE SCHEMAS
 import logging
+import math
 import os
+import threading
 import time
 
 import jwt
-import requests as http_r
+from django.db import connections
 from rest_framework.exceptions import APIException
 
 from user_workspaces_server.controllers.resources.abstract_resource import (
@@ -16,6 +18,18 @@ logger = logging.getLogger(__name__)
 
 
 class SlurmAPIResource(AbstractResource):
+    def __init__(self, config, resource_storage, resource_user_authentication):
+        super().__init__(config, resource_storage, resource_user_authentication)
+        # In-process cache of Slurm tokens and the external users they belong to, keyed by internal
+        # user id. Entries live until the token expires and are refreshed in the background
+        # shortly before that.
+        self.user_tokens = {}
+        self.user_tokens_refreshing = set()
+        self.user_tokens_lock = threading.Lock()
+        self.token_refresh_margin = float(self.connection_details.get("token_refresh_margin", 300))
+        # Tokens that live shorter than the margin would be refreshed on every use.
+        if token_lifespan := self.connection_details.get("token_lifespan"):
+            self.token_refresh_margin = min(self.token_refresh_margin, float(token_lifespan) / 2)
 
     def translate_status(self, status):
         status_list = {
@@ -82,7 +96,7 @@ class SlurmAPIResource(AbstractResource):
 
         body["job"]["environment"].update(body_job_environment_copy)
 
-        slurm_response = http_r.post(
+        slurm_response = self.http_session.post(
             f'{self.config.get("connection_details", {}).get("root_url")}/jobControl/',
             json=body,
             headers=headers,
@@ -110,10 +124,7 @@ class SlurmAPIResource(AbstractResource):
         return slurm_response["job_id"]
 
     def get_resource_job(self, job):
-        workspace = job.workspace_id
-        user_info = self.resource_user_authentication.has_permission(workspace.user_id)
-
-        token = self.get_user_token(user_info)
+        user_info, token = self.get_user_credentials(job.workspace_id.user_id)
 
         headers = {
             "Authorization": f'Token {self.connection_details.get("api_token")}',
@@ -121,38 +132,101 @@ class SlurmAPIResource(AbstractResource):
             "Slurm-User": user_info.external_username,
         }
         try:
-            resource_job = http_r.get(
+            resource_job = self.http_session.get(
                 f'{self.config.get("connection_details", {}).get("root_url")}/jobControl/{job.resource_job_id}',
                 headers=headers,
             ).json()
             if len(resource_job["errors"]):
                 raise APIException(resource_job["errors"])
-            resource_job = resource_job["jobs"][0]
-
-            resource_job_state = resource_job.get("job_state", [])[0]
-            if resource_job_state == "TIMEOUT":
-                logger.error(
-                    f"Workspaces Job {job.id}/Slurm job {job.resource_job_id} has timed out."
-                )
-
-            resource_job["status"] = self.translate_status(resource_job_state)
-            end_time = resource_job.get("end_time", {}).get("number")
-            if end_time is not None:
-                time_left = max(0, end_time - time.time())
-            else:
-                time_left = None  # or some other value that indicates unknown
 
-            resource_job["current_job_details"] = {"time_left": time_left}
-            return resource_job
+            return self.parse_resource_job(job, resource_job["jobs"][0])
         except Exception as e:
             logger.error(repr(e))
             return {"status": Job.Status.COMPLETE}
 
-    def get_job_core_hours(self, job):
-        workspace = job.workspace_id
-        user_info = self.resource_user_authentication.has_permission(workspace.user_id)
+    def get_resource_jobs(self, jobs):
+        # Query Slurm once per user (tokens are per user) rather than once per job.
+        jobs_by_user = {}
+        for job in jobs:
+            if job.workspace_id is None:
+                logger.error(f"Job {job.id} has no workspace, cannot query Slurm.")
+                continue
+            jobs_by_user.setdefault(job.workspace_id.user_id, []).append(job)
+
+        resource_jobs = {}
+        for user, user_jobs in jobs_by_user.items():
+            try:
+                user_info, token = self.get_user_credentials(user)
+
+                headers = {
+                    "Authorization": f'Token {self.connection_details.get("api_token")}',
+                    "Slurm-Token": token,
+                    "Slurm-User": user_info.external_username,
+                }
+                job_ids = ",".join(str(job.resource_job_id) for job in user_jobs)
+                response = self.http_session.get(
+                    f'{self.config.get("connection_details", {}).get("root_url")}/jobControl/{job_ids}',
+                    headers=headers,
+                ).json()
+                if len(response["errors"]):
+                    raise APIException(response["errors"])
+
+                slurm_jobs = {
+                    slurm_job.get("job_id"): slurm_job for slurm_job in response.get("jobs", [])
+                }
+                for job in user_jobs:
+                    if (slurm_job := slurm_jobs.get(job.resource_job_id)) is not None:
+                        resource_jobs[job.id] = self.parse_resource_job(job, slurm_job)
+            except Exception as e:
+                logger.error(f"Bulk job query failed for {user}: {repr(e)}")
+
+            # Anything missing from the bulk response is queried individually.
+            resource_jobs.update(
+                super().get_resource_jobs(
+                    [job for job in user_jobs if job.id not in resource_jobs]
+                )
+            )
 
-        token = self.get_user_token(user_info)
+        return resource_jobs
+
+    def parse_resource_job(self, job, resource_job):
+        resource_job_state = resource_job.get("job_state", [])[0]
+        if resource_job_state == "TIMEOUT":
+            logger.error(f"Workspaces Job {job.id}/Slurm job {job.resource_job_id} has timed out.")
+
+        resource_job["status"] = self.translate_status(resource_job_state)
+        end_time = resource_job.get("end_time", {}).get("number")
+        if end_time is not None:
+            time_left = max(0, end_time - time.time())
+        else:
+            time_left = None  # or some other value that indicates unknown
+
+        # Every change to current_job_details is broadcast to clients, so it is only updated once
+        # a minute rather than on every poll. Metrics keep the exact value.
+        resource_job["current_job_details"] = {
+            "time_left": None if time_left is None else math.ceil(time_left / 60) * 60
+        }
+        resource_job["metrics"] = self.parse_resource_job_metrics(resource_job, time_left)
+        return resource_job
+
+    def parse_resource_job_metrics(self, resource_job, time_left):
+        # Slurm only reports allocations here, not usage.
+        def get_number(value):
+            # Newer slurmrestd versions wrap numbers as {"set": ..., "number": ...}
+            return value.get("number") if isinstance(value, dict) else value
+
+        cpus = get_number(resource_job.get("cpus"))
+        memory_per_node = get_number(resource_job.get("memory_per_node"))
+        return {
+            "cpus": cpus,
+            # Slurm reports memory in megabytes.
+            "memory": memory_per_node * 1024 * 1024 if memory_per_node else None,
+            "time_left": time_left,
+            "node": resource_job.get("nodes") or "",
+        }
+
+    def get_job_core_hours(self, job):
+        user_info, token = self.get_user_credentials(job.workspace_id.user_id)
 
         headers = {
             "Authorization": f'Token {self.connection_details.get("api_token")}',
@@ -161,7 +235,7 @@ class SlurmAPIResource(AbstractResource):
         }
 
         try:
-            resource_job = http_r.get(
+            resource_job = self.http_session.get(
                 f'{self.config.get("connection_details", {}).get("root_url")}/jobControl/{job.resource_job_id}',
                 headers=headers,
             ).json()
@@ -182,9 +256,7 @@ class SlurmAPIResource(AbstractResource):
             return 0
 
     def stop_job(self, job):
-        user_info = self.resource_user_authentication.has_permission(job.workspace_id.user_id)
-
-        token = self.get_user_token(user_info)
+        user_info, token = self.get_user_credentials(job.workspace_id.user_id)
 
         # For pure testing, lets just set a var in the connection details.
         headers = {
@@ -194,7 +266,7 @@ class SlurmAPIResource(AbstractResource):
         }
 
         try:
-            resource_job = http_r.delete(
+            resource_job = self.http_session.delete(
                 f'{self.config.get("connection_details", {}).get("root_url")}/jobControl/{job.resource_job_id}',
                 headers=headers,
             ).json()
@@ -212,7 +284,7 @@ class SlurmAPIResource(AbstractResource):
             "Slurm-User": external_user.external_username,
             "Slurm-Lifespan": self.connection_details.get("token_lifespan"),
         }
-        response = http_r.get(
+        response = self.http_session.get(
             f'{self.connection_details.get("root_url")}/getSlurmToken/', headers=headers
         )
 
@@ -221,7 +293,68 @@ class SlurmAPIResource(AbstractResource):
 
         return response.json()["slurm_token"]
 
+    def get_user_credentials(self, user):
+        # Permission is checked on every call, so revoking it takes effect right away rather than
+        # once the cached token expires. The token of a user who lost it is dropped.
+        external_user = self.resource_user_authentication.has_permission(user)
+        if not external_user:
+            with self.user_tokens_lock:
+                self.user_tokens.pop(user.pk, None)
+            raise APIException(f"User {user} does not have permission to use this resource.")
+
+        return external_user, self.get_user_token(external_user)
+
     def get_user_token(self, external_user):
+        user_id = external_user.user_id_id
+
+        with self.user_tokens_lock:
+            cached_token = self.user_tokens.get(user_id)
+            if cached_token is not None and time.time() >= cached_token["exp"]:
+                self.user_tokens.pop(user_id)
+                cached_token = None
+
+        if cached_token is None:
+            token = self.load_user_token(external_user)
+            cached_token = self.cache_user_token(external_user, token)
+
+        if time.time() >= cached_token["exp"] - self.token_refresh_margin:
+            self.refresh_user_token_async(external_user)
+
+        return cached_token["token"]
+
+    def cache_user_token(self, external_user, token):
+        decoded_token = jwt.decode(token, options={"verify_signature": False})
+        cached_token = {"token": token, "exp": decoded_token["exp"]}
+
+        with self.user_tokens_lock:
+            self.user_tokens[external_user.user_id_id] = cached_token
+
+        return cached_token
+
+    def refresh_user_token_async(self, external_user):
+        user_id = external_user.user_id_id
+
+        with self.user_tokens_lock:
+            if user_id in self.user_tokens_refreshing:
+                return
+            self.user_tokens_refreshing.add(user_id)
+
+        def refresh():
+            try:
+                self.cache_user_token(
+                    external_user, self.load_user_token(external_user, refresh=True)
+                )
+            except Exception as e:
+                logger.error(f"Slurm token refresh failed for {external_user}: {repr(e)}")
+            finally:
+                with self.user_tokens_lock:
+                    self.user_tokens_refreshing.discard(user_id)
+                # This thread opened its own database connection, don't leak it.
+                connections.close_all()
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def load_user_token(self, external_user, refresh=False):
         external_user_mapping = self.resource_user_authentication.get_external_user_mapping(
             {
                 "user_id": external_user.user_id,
@@ -245,7 +378,8 @@ class SlurmAPIResource(AbstractResource):
                 external_user_mapping.external_user_details["token"],
                 options={"verify_signature": False},
             )
-            if time.time() > decoded_token["exp"]:
+            # Another worker may already have stored a fresh token, only go to Slurm if not.
+            if time.time() >= decoded_token["exp"] - (self.token_refresh_margin if refresh else 0):
                 # Update token
                 external_user_mapping.external_user_details["token"] = (
                     self.get_user_token_from_slurm(external_user)
@@ -1,14 +1,22 @@
+import os
+import shutil
 from abc import ABC, abstractmethod
 
 from django.core.files.base import ContentFile
 from rest_framework.exceptions import ParseError
 
+from user_workspaces_server import utils
+
 
 class AbstractStorage(ABC):
     def __init__(self, config, storage_user_authentication):
         self.config = config
         self.storage_user_authentication = storage_user_authentication
         self.root_dir = config["root_dir"]
+        # Recursive ownership changes on workspaces can run as a background task instead of
+        # holding up the request.
+        self.async_set_ownership = config.get("async_set_ownership", False)
+        self.http_session = utils.generate_http_session(config.get("connection_details", {}))
 
     def create_symlinks(self, workspace, workspace_details):
         symlinks = workspace_details.get("symlinks", [])
@@ -43,6 +51,47 @@ class AbstractStorage(ABC):
 
             self.create_file(workspace.file_path, content_file)
 
+    def scan_dir(self, path, full_rescan=False):
+        # Lists the files and symlinks of a workspace and sums its size. Dot files and directories
+        # are not listed, but still count towards the size.
+        current_details = {"files": [], "symlinks": []}
+
+        for dirpath, dirnames, filenames, dirfd in self.get_dir_tree(path):
+            dirnames[:] = [dirname for dirname in dirnames if not dirname[0] == "."]
+            filenames = [f for f in filenames if not f[0] == "."]
+
+            for symlink in dirnames:
+                symlink_path = os.path.join(dirpath, symlink)
+                if os.path.islink(symlink_path):
+                    relative_path = symlink_path.replace(os.path.join(self.root_dir, path), "")
+                    current_details["symlinks"].append({"name": relative_path})
+
+            for filename in filenames:
+                file_path = os.path.join(dirpath, filename)
+                relative_path = file_path.replace(os.path.join(self.root_dir, path), "")
+                current_details["symlinks" if os.path.islink(file_path) else "files"].append(
+                    {"name": relative_path}
+                )
+
+        current_details["size"] = self.get_dir_size(path)
+        return current_details
+
+    def clone_dir(self, source_path, dest_path, owner_mapping, progress_callback=None):
+        # Copies a workspace without its dot files and directories and hands it to owner_mapping.
+        shutil.copytree(
+            os.path.join(self.root_dir, source_path),
+            os.path.join(self.root_dir, dest_path),
+            ignore=shutil.ignore_patterns(".*"),
+            symlinks=True,
+        )
+        self.set_ownership(dest_path, owner_mapping, recursive=True)
+
+    def clone_dir_many(self, source_path, destinations, progress_callback=None):
+        # Clones a workspace to each (dest_path, owner_mapping) in destinations, IE when it is
+        # shared with several users at once.
+        for dest_path, owner_mapping in destinations:
+            self.clone_dir(source_path, dest_path, owner_mapping, progress_callback)
+
     @abstractmethod
     def is_valid_path(self, path):
         pass
@@ -79,6 +128,38 @@ class AbstractStorage(ABC):
     def create_file(self, path, file):
         pass
 
+    @abstractmethod
+    def create_upload_file(self, path, file_name, upload_id):
+        pass
+
+    @abstractmethod
+    def write_upload_chunk(self, path, file_name, upload_id, offset, stream):
+        pass
+
+    @abstractmethod
+    def complete_upload_file(self, path, file_name, upload_id, owner_mapping):
+        pass
+
+    @abstractmethod
+    def delete_upload_file(self, path, file_name, upload_id):
+        pass
+
+    @abstractmethod
+    def get_download_path(self, path, file_name):
+        pass
+
+    @abstractmethod
+    def get_download_redirect(self, download_path):
+        pass
+
+    @abstractmethod
+    def stream_file(self, download_path, start=0, end=None):
+        pass
+
+    @abstractmethod
+    def stream_archive(self, download_path, archive_format="tar"):
+        pass
+
     @abstractmethod
     def health_check(self):
         pass
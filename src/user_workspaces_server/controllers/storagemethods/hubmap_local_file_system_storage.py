@@ -1,4 +1,3 @@
-import requests as http_r
 from rest_framework.exceptions import APIException, ParseError
 
 from user_workspaces_server.controllers.storagemethods.local_file_system_storage import (
@@ -53,7 +52,7 @@ class HubmapLocalFileSystemStorage(LocalFileSystemStorage):
 
         if dataset_uuids:
             # If there are dataset_uuids passed, grab all the abs-paths
-            abs_path_response = http_r.post(
+            abs_path_response = self.http_session.post(
                 f"{self.root_url}/datasets/file-system-abs-path",
                 headers={"Authorization": f"Bearer {globus_groups_token}"},
                 json=list(dataset_uuids.keys()),
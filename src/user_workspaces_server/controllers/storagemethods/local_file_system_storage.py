@@ -1,12 +1,23 @@
+import errno
+import fcntl
 import grp
+import json
 import logging
 import os
 import pwd
 import shutil
+import stat
+import tarfile
+import threading
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib import parse
 
 from django.forms import model_to_dict
-from rest_framework.exceptions import APIException
+from rest_framework.exceptions import APIException, NotFound
 
+from user_workspaces_server import metrics, tracing
 from user_workspaces_server.controllers.storagemethods.abstract_storage import (
     AbstractStorage,
 )
@@ -14,8 +25,57 @@ from user_workspaces_server.exceptions import WorkspaceClientException
 
 logger = logging.getLogger(__name__)
 
+# ioctl request for cloning a whole file on copy-on-write filesystems (btrfs, XFS)
+FICLONE = 0x40049409
+# Errors meaning the filesystem can't do this kind of copy at all
+UNSUPPORTED_COPY_ERRNOS = (errno.EOPNOTSUPP, errno.EXDEV, errno.EINVAL, errno.ENOTTY, errno.ENOSYS)
+
+
+class ArchiveBuffer:
+    # Write-only file object that archives are written into while being streamed out.
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
 
 class LocalFileSystemStorage(AbstractStorage):
+    def __init__(self, config, storage_user_authentication):
+        super().__init__(config, storage_user_authentication)
+        # Scan manifests live outside the workspaces, writing them would otherwise change the
+        # mtime of the directory being tracked.
+        self.scan_manifest_dir = config.get(
+            "scan_manifest_dir", os.path.join(self.root_dir, ".scan_manifests")
+        )
+        # Directory mtimes do not change when a file is rewritten in place, so the incremental
+        # scan is periodically replaced by a full one to pick up changed file sizes.
+        self.scan_full_rescan_interval = config.get("scan_full_rescan_interval", 86400)
+        # Recursive chowns fan out over subdirectories, most of the time is spent waiting on
+        # filesystem round trips so threads help even with the GIL.
+        self.ownership_workers = config.get("ownership_workers", 8)
+        # How workspaces are duplicated when shared: "copy" or "reflink". Files are never hardlinked,
+        # the share's recursive chown would take the original's files as well.
+        self.clone_strategy = config.get("clone_strategy", "copy")
+        self.clone_workers = config.get("clone_workers", 8)
+        self.clone_chunk_size = config.get("clone_chunk_size", 64 * 1024 * 1024)
+        # Internal nginx location mapped to root_dir, downloads are handed off to nginx when set.
+        self.x_accel_redirect_prefix = config.get("x_accel_redirect_prefix")
+
     def is_valid_path(self, path):
         # The correct way to do this is to make sure that path_to_delete is a child of self.root_dir
         # IE, path_to_delete should not be a parent of root_dir (as is the case for if path is /)
@@ -36,38 +96,272 @@ class LocalFileSystemStorage(AbstractStorage):
     def create_dir(self, path):
         os.makedirs(os.path.join(self.root_dir, path), exist_ok=True)
 
+    @metrics.STORAGE_OPERATION_DURATION.labels("delete_dir").time()
+    @tracing.span("storage.delete_dir")
     def delete_dir(self, path, owner_mapping):
         if not self.is_valid_path(path):
             raise Exception("Cannot delete this workspace")
         else:
             if self.check_is_owner(path, owner_mapping):
                 shutil.rmtree(os.path.join(self.root_dir, path), ignore_errors=True)
+                try:
+                    os.remove(self.get_scan_manifest_path(path))
+                except OSError:
+                    pass
             else:
                 raise Exception(f"User {owner_mapping} does not own {path}")
 
-    def get_dir_size(self, path):
-        total = 0
+    def walk_dir(self, path, ownership=None):
+        # Single traversal engine for size, listing and chown. It walks top-down without
+        # recursion, opens every directory relative to its parent's fd and reuses the stat
+        # results from scandir, so each entry costs one syscall per requested operation.
+        # Yields (dirpath, dir_entries, dir_fd); removing names from dir_entries["subdirs"]
+        # prunes the walk, like os.fwalk. Only the fds of the current branch are kept open.
         full_path = os.path.join(self.root_dir, path)
         try:
-            for entry in os.scandir(full_path):
-                if entry.is_symlink():
-                    pass
-                elif entry.is_file():
-                    # if it's a file, use stat() function
-                    total += entry.stat().st_size
-                elif entry.is_dir():
-                    # if it's a directory, recursively call this function
-                    total += self.get_dir_size(entry.path)
-        except NotADirectoryError:
+            root_fd = os.open(full_path, os.O_RDONLY | os.O_DIRECTORY)
+        except (NotADirectoryError, PermissionError, FileNotFoundError):
+            return
+
+        if ownership is not None:
+            self.set_fd_ownership(root_fd, ownership)
+
+        stack = []
+        dir_fd, dirpath, chown_dir = root_fd, full_path, ownership is not None
+        try:
+            while True:
+                if dir_fd is not None:
+                    # Ignore the venv environments when setting ownership
+                    chown_dir = chown_dir and "venv" not in os.path.basename(dirpath)
+                    stack.append([dir_fd, dirpath, chown_dir, None])
+                    dir_entries = self.read_dir_entries(dir_fd, ownership if chown_dir else None)
+                    if dir_entries is not None:
+                        yield dirpath, dir_entries, dir_fd
+                        stack[-1][3] = iter(dir_entries["subdirs"])
+
+                parent_fd, parent_path, chown_dir, subdirs = stack[-1]
+                name = next(subdirs, None) if subdirs is not None else None
+                if name is None:
+                    os.close(stack.pop()[0])
+                    if not stack:
+                        break
+                    dir_fd = None
+                    continue
+
+                dirpath = os.path.join(parent_path, name)
+                try:
+                    dir_fd = os.open(
+                        name, os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW, dir_fd=parent_fd
+                    )
+                except OSError:
+                    dir_fd = None
+        finally:
+            for frame in stack:
+                os.close(frame[0])
+
+    def read_dir_entries(self, dir_fd, ownership=None):
+        # Classifies the direct children of a directory, chowning them on the way if requested.
+        # Entries that already have the right owner are left alone.
+        dir_entries = {"files": {}, "symlinks": [], "subdirs": []}
+        try:
+            with os.scandir(dir_fd) as entries:
+                for entry in entries:
+                    try:
+                        entry_stat = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    if stat.S_ISLNK(entry_stat.st_mode):
+                        dir_entries["symlinks"].append(entry.name)
+                    elif stat.S_ISDIR(entry_stat.st_mode):
+                        dir_entries["subdirs"].append(entry.name)
+                        # Ignore the venv environments when setting ownership
+                        if "venv" in entry.name:
+                            continue
+                    else:
+                        dir_entries["files"][entry.name] = entry_stat.st_size
+                    if ownership is not None and ownership != (
+                        entry_stat.st_uid,
+                        entry_stat.st_gid,
+                    ):
+                        # One entry that vanished or cannot be chowned must not stop the rest
+                        try:
+                            os.chown(entry.name, *ownership, dir_fd=dir_fd, follow_symlinks=False)
+                        except OSError as e:
+                            logger.warning(f"Could not set ownership of {entry.name}: {e}")
+        except (PermissionError, FileNotFoundError):
+            return None
+        return dir_entries
+
+    def set_fd_ownership(self, fd, ownership):
+        fd_stat = os.fstat(fd)
+        if ownership != (fd_stat.st_uid, fd_stat.st_gid):
+            os.fchown(fd, *ownership)
+
+    def set_tree_ownership(self, path, ownership):
+        # Parallel recursive chown. Each task handles one directory and hands its subdirectories
+        # back so they can be spread over the pool. Like walk_dir, subdirectories are opened
+        # relative to their parent's fd, which stays open until all of them have been opened.
+        open_fds = {}
+        lock = threading.Lock()
+
+        def release(dir_fd):
+            with lock:
+                open_fds[dir_fd] -= 1
+                if open_fds[dir_fd] == 0:
+                    del open_fds[dir_fd]
+                    os.close(dir_fd)
+
+        def read_subdirs(dir_fd, dirpath):
+            try:
+                dir_entries = self.read_dir_entries(dir_fd, ownership)
+            except BaseException:
+                os.close(dir_fd)
+                raise
+            if dir_entries is None:
+                logger.warning(f"Could not list {dirpath} to set ownership")
+                dir_entries = {"subdirs": []}
+            subdirs = [subdir for subdir in dir_entries["subdirs"] if "venv" not in subdir]
+            if not subdirs:
+                os.close(dir_fd)
+                return []
+            with lock:
+                open_fds[dir_fd] = len(subdirs)
+            return [(dir_fd, subdir, os.path.join(dirpath, subdir)) for subdir in subdirs]
+
+        def set_dir_ownership(parent_fd, name, dirpath):
+            try:
+                dir_fd = os.open(
+                    name, os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW, dir_fd=parent_fd
+                )
+            except OSError:
+                logger.warning(f"Could not open {dirpath} to set ownership")
+                return []
+            finally:
+                release(parent_fd)
+            return read_subdirs(dir_fd, dirpath)
+
+        full_path = os.path.join(self.root_dir, path)
+        root_fd = os.open(full_path, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            self.set_fd_ownership(root_fd, ownership)
+        except BaseException:
+            os.close(root_fd)
+            raise
+
+        with ThreadPoolExecutor(max_workers=self.ownership_workers) as executor:
+            pending = {executor.submit(read_subdirs, root_fd, full_path)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for subdir in future.result():
+                        pending.add(executor.submit(set_dir_ownership, *subdir))
+
+    @metrics.STORAGE_OPERATION_DURATION.labels("get_dir_size").time()
+    @tracing.span("storage.get_dir_size")
+    def get_dir_size(self, path):
+        full_path = os.path.join(self.root_dir, path)
+        if os.path.isfile(full_path):
             # if `directory` isn't a directory, get the file size then
             return os.path.getsize(full_path)
-        except PermissionError:
-            # if for whatever reason we can't open the folder, return 0
-            return 0
-        return total
+
+        return sum(sum(dir_entries["files"].values()) for _, dir_entries, _ in self.walk_dir(path))
+
+    @metrics.STORAGE_OPERATION_DURATION.labels("scan_dir").time()
+    @tracing.span("storage.scan_dir")
+    def scan_dir(self, path, full_rescan=False):
+        # Incremental scan: a manifest of every directory's mtime and direct contents is kept per
+        # workspace, and only directories whose mtime changed since the last scan are listed.
+        # Files can change size without touching their directory's mtime, so in unchanged
+        # directories only the known files are stat'ed again.
+        workspace_path = os.path.join(self.root_dir, path)
+        manifest_path = self.get_scan_manifest_path(path)
+
+        manifest = {}
+        if not full_rescan:
+            try:
+                with open(manifest_path) as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                pass
+            if time.time() - manifest.get("full_scan_time", 0) > self.scan_full_rescan_interval:
+                manifest = {}
+
+        old_dirs = manifest.get("dirs", {})
+        new_dirs = {}
+        current_details = {"files": [], "symlinks": [], "size": 0}
+
+        # Relative directory paths use a leading slash to match the names reported to clients.
+        stack = [("", False)]
+        while stack:
+            relative_dir, hidden = stack.pop()
+            dir_path = workspace_path + relative_dir
+            try:
+                dir_fd = os.open(dir_path, os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW)
+            except OSError:
+                continue
+            try:
+                dir_mtime = os.fstat(dir_fd).st_mtime_ns
+                dir_entry = old_dirs.get(relative_dir)
+                if dir_entry is None or dir_entry["mtime"] != dir_mtime:
+                    dir_entry = self.read_dir_entries(dir_fd)
+                    if dir_entry is None:
+                        continue
+                    dir_entry["mtime"] = dir_mtime
+                else:
+                    for name in dir_entry["files"]:
+                        try:
+                            dir_entry["files"][name] = os.stat(
+                                name, dir_fd=dir_fd, follow_symlinks=False
+                            ).st_size
+                        except OSError:
+                            pass
+            finally:
+                os.close(dir_fd)
+            new_dirs[relative_dir] = dir_entry
+
+            current_details["size"] += sum(dir_entry["files"].values())
+            for name in dir_entry["subdirs"]:
+                stack.append((f"{relative_dir}/{name}", hidden or name[0] == "."))
+
+            if hidden:
+                continue
+            for name in dir_entry["files"]:
+                if not name[0] == ".":
+                    current_details["files"].append({"name": f"{relative_dir}/{name}"})
+            for name in dir_entry["symlinks"]:
+                if not name[0] == ".":
+                    current_details["symlinks"].append({"name": f"{relative_dir}/{name}"})
+
+        try:
+            os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+            tmp_manifest_path = f"{manifest_path}.tmp"
+            with open(tmp_manifest_path, "w") as f:
+                json.dump(
+                    {
+                        "full_scan_time": manifest.get("full_scan_time", time.time()),
+                        "dirs": new_dirs,
+                    },
+                    f,
+                )
+            os.replace(tmp_manifest_path, manifest_path)
+        except OSError:
+            logger.warning(f"Could not write scan manifest for {path}")
+
+        return current_details
+
+    def get_scan_manifest_path(self, path):
+        return os.path.join(self.scan_manifest_dir, f"{os.path.normpath(path)}.json")
 
     def get_dir_tree(self, path):
-        return os.fwalk(os.path.join(self.root_dir, path))
+        # Same shape as os.fwalk, symlinks (including those to directories) are reported in
+        # filenames and never followed.
+        for dirpath, dir_entries, dir_fd in self.walk_dir(path):
+            yield (
+                dirpath,
+                dir_entries["subdirs"],
+                list(dir_entries["files"]) + dir_entries["symlinks"],
+                dir_fd,
+            )
 
     def check_is_owner(self, path, owner_mapping):
         external_user = self.storage_user_authentication.get_external_user(
@@ -81,7 +375,7 @@ class LocalFileSystemStorage(AbstractStorage):
         owner_uid = os.stat(os.path.join(self.root_dir, path)).st_uid
         return uid == owner_uid
 
-    def set_ownership(self, path, owner_mapping, recursive=False):
+    def get_ownership(self, owner_mapping):
         external_user = self.storage_user_authentication.get_external_user(
             model_to_dict(owner_mapping)
         )
@@ -96,18 +390,166 @@ class LocalFileSystemStorage(AbstractStorage):
             if isinstance(external_user["external_user_gid"], str)
             else external_user["external_user_gid"]
         )
+        return uid, gid
 
-        os.chown(os.path.join(self.root_dir, path), uid, gid)
+    @metrics.STORAGE_OPERATION_DURATION.labels("set_ownership").time()
+    @tracing.span("storage.set_ownership")
+    def set_ownership(self, path, owner_mapping, recursive=False):
+        uid, gid = self.get_ownership(owner_mapping)
 
-        if recursive:
-            for dirpath, dirnames, filenames, dirfd in self.get_dir_tree(path):
-                # Ignore the venv environments
-                if "venv" in dirpath:
-                    continue
+        if recursive and os.path.isdir(os.path.join(self.root_dir, path)):
+            if self.ownership_workers > 1:
+                self.set_tree_ownership(path, (uid, gid))
+            else:
+                for _ in self.walk_dir(path, ownership=(uid, gid)):
+                    pass
+        else:
+            os.chown(os.path.join(self.root_dir, path), uid, gid)
+
+    def clone_dir(self, source_path, dest_path, owner_mapping, progress_callback=None):
+        self.clone_dir_many(source_path, [(dest_path, owner_mapping)], progress_callback)
+
+    @metrics.STORAGE_OPERATION_DURATION.labels("clone_dir").time()
+    @tracing.span("storage.clone_dir")
+    def clone_dir_many(self, source_path, destinations, progress_callback=None):
+        # Duplicates a workspace without its dot files and directories to each (dest_path,
+        # owner_mapping) in destinations, giving everything created to owner_mapping on the way so
+        # no separate recursive chown is needed. The source tree is only walked once however many
+        # destinations there are. File contents are reflinked or copied in parallel chunks
+        # depending on clone_strategy.
+        source_root = os.path.join(self.root_dir, source_path)
+        destinations = [
+            (os.path.join(self.root_dir, dest_path), self.get_ownership(owner_mapping))
+            for dest_path, owner_mapping in destinations
+        ]
+
+        files = []
+        dirs = []
+        for dirpath, dir_entries, dir_fd in self.walk_dir(source_path):
+            dir_entries["subdirs"][:] = [d for d in dir_entries["subdirs"] if not d[0] == "."]
+            symlinks = [
+                (name, os.readlink(name, dir_fd=dir_fd))
+                for name in dir_entries["symlinks"]
+                if not name[0] == "."
+            ]
+
+            for dest_root, ownership in destinations:
+                dest_dir = os.path.normpath(
+                    os.path.join(dest_root, os.path.relpath(dirpath, source_root))
+                )
+                os.makedirs(dest_dir, exist_ok=True)
+                os.chown(dest_dir, *ownership)
+                dirs.append((dirpath, dest_dir))
+
+                for name, target in symlinks:
+                    dest_link = os.path.join(dest_dir, name)
+                    os.symlink(target, dest_link)
+                    os.chown(dest_link, *ownership, follow_symlinks=False)
+
+                for name, size in dir_entries["files"].items():
+                    if name[0] == ".":
+                        continue
+                    files.append(
+                        (
+                            os.path.join(dirpath, name),
+                            os.path.join(dest_dir, name),
+                            size,
+                            ownership,
+                        )
+                    )
+
+        total_size = sum(size for _, _, size, _ in files)
+        progress = {"copied": 0, "reflink": self.clone_strategy == "reflink"}
+        progress_lock = threading.Lock()
+
+        def report(copied):
+            with progress_lock:
+                progress["copied"] += copied
+                copied = progress["copied"]
+            if progress_callback:
+                progress_callback(copied, total_size)
+
+        file_stats = []
+        with ThreadPoolExecutor(max_workers=self.clone_workers) as executor:
+            clone_futures = {
+                executor.submit(self.clone_file, *file, progress, report) for file in files
+            }
+            pending = set(clone_futures)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future not in clone_futures:
+                        # Chunk copies only need checking for errors
+                        future.result()
+                        continue
+                    dest, source_stat, chunks = future.result()
+                    file_stats.append((dest, source_stat))
+                    for chunk in chunks:
+                        pending.add(executor.submit(self.copy_file_chunk, *chunk, report))
 
-                os.chown(dirpath, uid, gid)
-                for filename in filenames:
-                    os.chown(os.path.join(dirpath, filename), uid, gid)
+        # Like shutil.copytree, timestamps are copied once all the contents are in place.
+        for dest, source_stat in file_stats:
+            os.utime(dest, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns))
+        for source_dir, dest_dir in reversed(dirs):
+            shutil.copystat(source_dir, dest_dir)
+
+    def clone_file(self, source, dest, size, ownership, progress, report):
+        # Returns the chunks of the file that still need to be copied.
+        source_stat = os.stat(source, follow_symlinks=False)
+
+        with open(source, "rb") as source_file, open(dest, "wb") as dest_file:
+            os.fchmod(dest_file.fileno(), stat.S_IMODE(source_stat.st_mode))
+            os.fchown(dest_file.fileno(), *ownership)
+
+            if progress["reflink"]:
+                try:
+                    fcntl.ioctl(dest_file.fileno(), FICLONE, source_file.fileno())
+                    report(size)
+                    return dest, source_stat, []
+                except OSError as e:
+                    if e.errno not in UNSUPPORTED_COPY_ERRNOS:
+                        raise
+                    # Don't keep trying on a filesystem without reflinks
+                    logger.info(f"Reflinks not supported for {dest}, falling back to copying.")
+                    progress["reflink"] = False
+
+            os.ftruncate(dest_file.fileno(), size)
+
+        return (
+            dest,
+            source_stat,
+            [
+                (source, dest, offset, min(self.clone_chunk_size, size - offset))
+                for offset in range(0, size, self.clone_chunk_size)
+            ],
+        )
+
+    def copy_file_chunk(self, source, dest, offset, length, report):
+        source_fd = os.open(source, os.O_RDONLY)
+        dest_fd = os.open(dest, os.O_WRONLY)
+        try:
+            end = offset + length
+            # In-kernel copy, which network filesystems can also do server side
+            copy_file_range = getattr(os, "copy_file_range", None)
+            while offset < end:
+                if copy_file_range is not None:
+                    try:
+                        copied = copy_file_range(source_fd, dest_fd, end - offset, offset, offset)
+                    except OSError as e:
+                        if e.errno not in UNSUPPORTED_COPY_ERRNOS:
+                            raise
+                        copy_file_range = None
+                        continue
+                else:
+                    data = os.pread(source_fd, min(end - offset, 1024 * 1024), offset)
+                    copied = os.pwrite(dest_fd, data, offset)
+                if not copied:
+                    break
+                offset += copied
+                report(copied)
+        finally:
+            os.close(dest_fd)
+            os.close(source_fd)
 
     def create_symlink(self, path, symlink):
         symlink_name = symlink.get("name", "")
@@ -155,6 +597,164 @@ class LocalFileSystemStorage(AbstractStorage):
             for chunk in file.chunks():
                 new_file.write(chunk)
 
+    def get_upload_destination(self, path, file_name):
+        # Symlinks in the existing part of the path are resolved before validating, so links
+        # pointing out of the workspace can't be used to write other files.
+        workspace_path = os.path.realpath(os.path.join(self.root_dir, path))
+        file_path = os.path.realpath(os.path.join(workspace_path, file_name.lstrip("/")))
+
+        if file_path == workspace_path or not os.path.commonpath(
+            [workspace_path]
+        ) == os.path.commonpath([workspace_path, file_path]):
+            logger.error(f"Upload path {file_path} is not in workspace {workspace_path}")
+            raise WorkspaceClientException(f"Invalid file path specified {file_name}")
+
+        return workspace_path, file_path
+
+    def get_upload_file_path(self, path, file_name, upload_id):
+        # Chunks are written to a hidden file next to the destination, so scans skip it and
+        # completing the upload is a rename.
+        _, file_path = self.get_upload_destination(path, file_name)
+        file_dir, file_name = os.path.split(file_path)
+        return os.path.join(file_dir, f".{file_name}.{upload_id}.upload")
+
+    def create_upload_file(self, path, file_name, upload_id):
+        upload_file_path = self.get_upload_file_path(path, file_name, upload_id)
+        os.makedirs(os.path.dirname(upload_file_path), exist_ok=True)
+        open(upload_file_path, "wb").close()
+
+    def write_upload_chunk(self, path, file_name, upload_id, offset, stream):
+        # Streams the request body into the upload file at offset, returns the end offset.
+        fd = os.open(self.get_upload_file_path(path, file_name, upload_id), os.O_WRONLY)
+        try:
+            while chunk := stream.read(1024 * 1024):
+                offset += os.pwrite(fd, chunk, offset)
+        finally:
+            os.close(fd)
+        return offset
+
+    def complete_upload_file(self, path, file_name, upload_id, owner_mapping):
+        # Validated again, the directories leading to the file may have changed since it was
+        # created.
+        workspace_path, file_path = self.get_upload_destination(path, file_name)
+        os.replace(self.get_upload_file_path(path, file_name, upload_id), file_path)
+
+        # Only the new file and the directories leading to it need their ownership set.
+        ownership = self.get_ownership(owner_mapping)
+        while file_path != workspace_path:
+            os.chown(file_path, *ownership, follow_symlinks=False)
+            file_path = os.path.dirname(file_path)
+
+    def delete_upload_file(self, path, file_name, upload_id):
+        try:
+            os.remove(self.get_upload_file_path(path, file_name, upload_id))
+        except (FileNotFoundError, WorkspaceClientException):
+            pass
+
+    def get_download_path(self, path, file_name):
+        # Symlinks are resolved before validating, so links pointing out of the workspace can't be
+        # used to read other files.
+        workspace_path = os.path.realpath(os.path.join(self.root_dir, path))
+        download_path = os.path.realpath(os.path.join(workspace_path, file_name.lstrip("/")))
+
+        if not os.path.commonpath([workspace_path]) == os.path.commonpath(
+            [workspace_path, download_path]
+        ):
+            logger.error(f"Download path {download_path} is not in workspace {workspace_path}")
+            raise WorkspaceClientException(f"Invalid file path specified {file_name}")
+
+        if not os.path.exists(download_path):
+            raise NotFound(f"File {file_name} not found in workspace.")
+
+        return download_path
+
+    def get_download_redirect(self, download_path):
+        if not self.x_accel_redirect_prefix:
+            return None
+        relative_path = os.path.relpath(download_path, os.path.realpath(self.root_dir))
+        return f"{self.x_accel_redirect_prefix.rstrip('/')}/{parse.quote(relative_path)}"
+
+    def stream_file(self, download_path, start=0, end=None):
+        # Yields the bytes of download_path from start up to and including end.
+        with open(download_path, "rb") as f:
+            f.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                chunk = f.read(1024 * 1024 if remaining is None else min(remaining, 1024 * 1024))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    def iter_archive_entries(self, download_path):
+        # Dot files and directories are left out, like in the workspace listing.
+        base_name = os.path.basename(download_path)
+        for dirpath, dir_entries, dir_fd in self.walk_dir(download_path):
+            dir_entries["subdirs"][:] = [d for d in dir_entries["subdirs"] if not d[0] == "."]
+            arc_dir = os.path.normpath(
+                os.path.join(base_name, os.path.relpath(dirpath, download_path))
+            )
+            yield arc_dir, dirpath, "dir"
+            for name in dir_entries["symlinks"]:
+                if not name[0] == ".":
+                    yield os.path.join(arc_dir, name), os.path.join(dirpath, name), "symlink"
+            for name in dir_entries["files"]:
+                if not name[0] == ".":
+                    yield os.path.join(arc_dir, name), os.path.join(dirpath, name), "file"
+
+    def stream_archive(self, download_path, archive_format="tar"):
+        # Builds the archive while it is sent, memory use doesn't depend on the archive size.
+        if archive_format == "zip":
+            yield from self.stream_zip(download_path)
+        else:
+            yield from self.stream_tar(download_path)
+
+    def stream_tar(self, download_path):
+        for arc_name, entry_path, entry_type in self.iter_archive_entries(download_path):
+            entry_stat = os.lstat(entry_path)
+            tarinfo = tarfile.TarInfo(arc_name)
+            tarinfo.mtime = entry_stat.st_mtime
+            tarinfo.mode = stat.S_IMODE(entry_stat.st_mode)
+            if entry_type == "dir":
+                tarinfo.type = tarfile.DIRTYPE
+            elif entry_type == "symlink":
+                tarinfo.type = tarfile.SYMTYPE
+                tarinfo.linkname = os.readlink(entry_path)
+            else:
+                tarinfo.size = entry_stat.st_size
+            yield tarinfo.tobuf(format=tarfile.PAX_FORMAT)
+
+            if entry_type == "file":
+                # Exactly the size in the header has to follow, even if the file changed since.
+                sent = 0
+                for chunk in self.stream_file(entry_path, 0, tarinfo.size - 1):
+                    sent += len(chunk)
+                    yield chunk
+                yield b"\0" * (tarinfo.size - sent)
+                yield b"\0" * (-tarinfo.size % tarfile.BLOCKSIZE)
+
+        yield b"\0" * (2 * tarfile.BLOCKSIZE)
+
+    def stream_zip(self, download_path):
+        buffer = ArchiveBuffer()
+        with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as zip_file:
+            for arc_name, entry_path, entry_type in self.iter_archive_entries(download_path):
+                if entry_type == "dir":
+                    zip_file.writestr(f"{arc_name}/", b"")
+                elif entry_type == "symlink":
+                    zip_info = zipfile.ZipInfo(arc_name)
+                    zip_info.external_attr = (stat.S_IFLNK | 0o777) << 16
+                    zip_file.writestr(zip_info, os.readlink(entry_path))
+                else:
+                    zip_info = zipfile.ZipInfo.from_file(entry_path, arc_name)
+                    with zip_file.open(zip_info, "w", force_zip64=True) as zip_entry:
+                        for chunk in self.stream_file(entry_path):
+                            zip_entry.write(chunk)
+                            yield buffer.pop()
+                yield buffer.pop()
+        yield buffer.pop()
+
     def health_check(self):
         connected = True
         try:
@@ -1,10 +1,9 @@
 import logging
 from abc import ABC, abstractmethod
 
-import requests as http_r
 from django.contrib.auth.models import User
 
-from user_workspaces_server import models
+from user_workspaces_server import models, utils
 
 logger = logging.getLogger(__name__)
 
@@ -12,6 +11,7 @@ logger = logging.getLogger(__name__)
 class AbstractUserAuthentication(ABC):
     def __init__(self, config):
         self.connection_details = config.get("connection_details", {})
+        self.http_session = utils.generate_http_session(self.connection_details)
 
     @abstractmethod
     def has_permission(self, internal_user):
@@ -71,7 +71,7 @@ class AbstractUserAuthentication(ABC):
     def health_check(self):
         connected = True
         try:
-            response = http_r.get(self.connection_details.get("health_check_url"))
+            response = self.http_session.get(self.connection_details.get("health_check_url"))
             if response.status_code != 200:
                 connected = False
                 message = f"Invalid status code: {response.status_code}"
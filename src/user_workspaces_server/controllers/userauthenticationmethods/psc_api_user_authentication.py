@@ -3,7 +3,6 @@ import logging
 import time
 
 import ldap
-import requests as http_r
 from django.forms.models import model_to_dict
 from rest_framework.authtoken.models import Token
 from rest_framework.exceptions import ParseError, PermissionDenied
@@ -179,7 +178,7 @@ class PSCAPIUserAuthentication(AbstractUserAuthentication):
             },
         }
 
-        response = http_r.post(
+        response = self.http_session.post(
             self.root_url, json=body, headers={"Authorization": f"JWT {self.jwt_token}"}
         )
         external_user = response.json()
@@ -259,7 +258,7 @@ class PSCAPIUserAuthentication(AbstractUserAuthentication):
         }
 
         start_time = time.time()
-        response = http_r.post(
+        response = self.http_session.post(
             self.root_url, json=body, headers={"Authorization": f"JWT {self.jwt_token}"}
         )
 
@@ -339,7 +338,7 @@ class PSCAPIUserAuthentication(AbstractUserAuthentication):
             },
         }
 
-        response = http_r.post(
+        response = self.http_session.post(
             self.root_url, json=body, headers={"Authorization": f"JWT {self.jwt_token}"}
         )
         allocation = response.json().get("data", {}).get("allocation", None)
@@ -386,7 +385,7 @@ class PSCAPIUserAuthentication(AbstractUserAuthentication):
             },
         }
 
-        response = http_r.post(
+        response = self.http_session.post(
             self.root_url, json=body, headers={"Authorization": f"JWT {self.jwt_token}"}
         )
         external_user = response.json().get("data", {}).get("user", {})
@@ -24,3 +24,9 @@ class ValidationException(APIException):
     status_code = 422
     default_detail = "Error with validation of request body."
     default_code = "validation_error"
+
+
+class LengthRequiredException(APIException):
+    status_code = 411
+    default_detail = "Content-Length header is required."
+    default_code = "length_required"
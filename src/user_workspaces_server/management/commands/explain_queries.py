@@ -0,0 +1,237 @@
+import re
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from user_workspaces_server import models
+from user_workspaces_server.tasks import ACTIVE_JOB_STATUSES
+
+# Plan lines that read a whole table. SQLite's "SCAN <table> USING INDEX" walks an index in order
+# (IE for ORDER BY ... LIMIT) and is not reported. SQLite only keeps the average selectivity of an
+# index, so unlike PostgreSQL it will not use the status indexes for the poller's query.
+SEQUENTIAL_SCAN_PATTERNS = {
+    "postgresql": re.compile(r"Seq Scan on (\w+)"),
+    "sqlite": re.compile(r"\bSCAN (\w+)\b(?! USING)"),
+}
+
+
+def get_canonical_queries(user, workspace, job):
+    # The filters run on every request or poll cycle, see the code each one is taken from.
+    external_user_mapping = models.ExternalUserMapping.objects.filter(user_id=user).first()
+    user_authentication_name = (
+        external_user_mapping.user_authentication_name if external_user_mapping else ""
+    )
+
+    return {
+        # tasks.update_job_statuses
+        "active jobs due a status update": models.Job.objects.filter(
+            status__in=ACTIVE_JOB_STATUSES
+        ).filter(
+            Q(datetime_next_status_update__isnull=True)
+            | Q(datetime_next_status_update__lte=timezone.now())
+        ),
+        # tasks.finish_job and WorkspaceView.delete
+        "active jobs of a workspace": models.Job.objects.filter(
+            workspace_id=workspace,
+            status__in=[models.Job.Status.PENDING, models.Job.Status.RUNNING],
+        ),
+        # ws_consumers.UserStatusConsumer.connect
+        "active jobs of a user": models.Job.objects.filter(
+            user_id=user, status__in=ACTIVE_JOB_STATUSES
+        ),
+        # JobView.get
+        "jobs of a user": models.Job.objects.filter(workspace_id__user_id=user).order_by(
+            "datetime_created", "id"
+        )[:100],
+        # WorkspaceView.get
+        "workspaces of a user": models.Workspace.objects.filter(user_id=user).order_by(
+            "datetime_created", "id"
+        )[:100],
+        # WorkspaceView.files
+        "files of a workspace": models.WorkspaceFile.objects.filter(
+            workspace_id=workspace
+        ).order_by("name", "id")[:100],
+        # JobView.metrics
+        "metrics of a job": models.JobMetric.objects.filter(job_id=job).order_by(
+            "datetime_created"
+        ),
+        # AbstractUserAuthentication.get_external_user_mapping
+        "external user mapping by user": models.ExternalUserMapping.objects.filter(
+            user_id=user, user_authentication_name=user_authentication_name
+        ),
+        "external user mapping by username": models.ExternalUserMapping.objects.filter(
+            external_username=user.username, user_authentication_name=user_authentication_name
+        ),
+        "external user mapping by external id": models.ExternalUserMapping.objects.filter(
+            external_user_id=str(user.pk), user_authentication_name=user_authentication_name
+        ),
+        # WorkspaceView.delete and SharedWorkspaceView.delete
+        "pending shares of a workspace": models.SharedWorkspaceMapping.objects.filter(
+            original_workspace_id=workspace, is_accepted=False
+        ),
+        # WorkspaceView.put and WorkspaceView.download
+        "unaccepted shared workspace": models.SharedWorkspaceMapping.objects.filter(
+            shared_workspace_id=workspace, is_accepted=False
+        ),
+    }
+
+
+def seed(users_count):
+    # A realistic mix: a handful of workspaces per user, mostly finished jobs, few shares.
+    now = timezone.now()
+    User.objects.bulk_create(
+        [User(username=f"explain_{i}", email=f"explain_{i}@test.com") for i in range(users_count)],
+        batch_size=1000,
+    )
+    users = list(User.objects.filter(username__startswith="explain_"))
+
+    models.ExternalUserMapping.objects.bulk_create(
+        [
+            models.ExternalUserMapping(
+                user_id=user,
+                external_user_id=str(user.pk),
+                external_username=user.username,
+                user_authentication_name="LocalUserAuthentication",
+            )
+            for user in users
+        ],
+        batch_size=1000,
+    )
+
+    models.Workspace.objects.bulk_create(
+        [
+            models.Workspace(
+                user_id=user,
+                name=f"Workspace {i}",
+                file_path=f"{user.username}/{i}",
+                datetime_created=now - timedelta(days=i),
+                workspace_details={"request_workspace_details": {"files": [], "symlinks": []}},
+            )
+            for user in users
+            for i in range(5)
+        ],
+        batch_size=1000,
+    )
+    workspaces = list(models.Workspace.objects.filter(user_id__in=users))
+
+    models.WorkspaceFile.objects.bulk_create(
+        [
+            models.WorkspaceFile(workspace_id=workspace, name=f"/file_{i}.txt")
+            for workspace in workspaces
+            for i in range(20)
+        ],
+        batch_size=1000,
+    )
+
+    models.Job.objects.bulk_create(
+        [
+            models.Job(
+                user_id_id=workspace.user_id_id,
+                workspace_id=workspace,
+                resource_job_id=workspace.pk * 10 + i,
+                job_type="JupyterLabJob",
+                resource_name="LocalResource",
+                # One in fifty jobs is still active.
+                status=(
+                    models.Job.Status.RUNNING
+                    if (workspace.pk + i) % 50 == 0
+                    else models.Job.Status.COMPLETE
+                ),
+                datetime_created=now - timedelta(hours=i),
+                core_hours=0,
+                job_details={},
+                resource_options={},
+            )
+            for workspace in workspaces
+            for i in range(4)
+        ],
+        batch_size=1000,
+    )
+    jobs = list(models.Job.objects.filter(workspace_id__in=workspaces)[:100])
+
+    models.JobMetric.objects.bulk_create(
+        [
+            models.JobMetric(job_id=job, datetime_created=now - timedelta(minutes=i))
+            for job in jobs
+            for i in range(50)
+        ],
+        batch_size=1000,
+    )
+
+    models.SharedWorkspaceMapping.objects.bulk_create(
+        [
+            models.SharedWorkspaceMapping(
+                original_workspace_id=original_workspace,
+                shared_workspace_id=shared_workspace,
+                is_accepted=True,
+            )
+            for original_workspace, shared_workspace in zip(workspaces[::20], workspaces[1::20])
+        ],
+        batch_size=1000,
+    )
+
+    # Refresh planner statistics, so plans reflect the seeded table sizes.
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+    return users[0]
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs EXPLAIN on the queries behind the hot request and task paths and reports those "
+        "that read a whole table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed-users",
+            type=int,
+            default=0,
+            help="Seed this many users with workspaces, jobs and shares first. The seeded data "
+            "is rolled back afterwards.",
+        )
+        parser.add_argument(
+            "--verbose-plans", action="store_true", help="Print the full plan of every query."
+        )
+        parser.add_argument(
+            "--fail-on-sequential-scan",
+            action="store_true",
+            help="Exit with an error if any query reads a whole table, IE in CI.",
+        )
+
+    def handle(self, *args, **options):
+        pattern = SEQUENTIAL_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(f"Query plans of {connection.vendor} databases are not supported.")
+
+        with transaction.atomic():
+            if options["seed_users"]:
+                user = seed(options["seed_users"])
+            else:
+                user = User.objects.filter(workspace__isnull=False).first()
+                if user is None:
+                    raise CommandError("No workspaces to query, use --seed-users.")
+
+            workspace = models.Workspace.objects.filter(user_id=user).first()
+            job = models.Job.objects.filter(workspace_id=workspace).first()
+
+            sequential_scans = {}
+            for name, queryset in get_canonical_queries(user, workspace, job).items():
+                plan = queryset.explain()
+                if tables := pattern.findall(plan):
+                    sequential_scans[name] = tables
+                    self.stdout.write(self.style.WARNING(f"{name}: sequential scan on {tables}"))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f"{name}: indexed"))
+                if options["verbose_plans"]:
+                    self.stdout.write(plan)
+
+            transaction.set_rollback(True)
+
+        if sequential_scans and options["fail_on_sequential_scan"]:
+            raise CommandError(f"{len(sequential_scans)} queries read whole tables.")
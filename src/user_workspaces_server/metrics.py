@@ -0,0 +1,166 @@
+import hmac
+import os
+import time
+from urllib import parse
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db.models import Count
+from django.http import HttpResponse, JsonResponse
+from django.utils.decorators import sync_and_async_middleware
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+# With PROMETHEUS_MULTIPROC_DIR set, every process (web workers and each django-q cluster) writes
+# its samples to that shared directory, and /metrics aggregates them.
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+REQUEST_DURATION = Histogram(
+    "uws_http_request_duration_seconds",
+    "Time spent handling API requests, until the response (headers) is ready",
+    ["view", "method", "put_type", "status"],
+)
+TASK_DURATION = Histogram(
+    "uws_task_duration_seconds",
+    "Time spent running django-q tasks",
+    ["task", "success"],
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 1800, 3600, float("inf")),
+)
+HTTP_CLIENT_REQUEST_DURATION = Histogram(
+    "uws_http_client_request_duration_seconds",
+    "Time spent on requests to external APIs, IE the Slurm API",
+    ["host", "method"],
+)
+HTTP_CLIENT_ERRORS = Counter(
+    "uws_http_client_errors_total",
+    "Failed requests (connection errors and 5xx responses) to external APIs",
+    ["host", "method"],
+)
+STORAGE_OPERATION_DURATION = Histogram(
+    "uws_storage_operation_duration_seconds",
+    "Time spent on storage traversals",
+    ["operation"],
+    buckets=(0.01, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600, float("inf")),
+)
+
+
+class ModelStatusCollector:
+    # Counted from the database when scraped, so the numbers agree whichever process serves them.
+    def describe(self):
+        # Registering would otherwise call collect, before the database can be used.
+        for name, model_name in [("uws_jobs", "Job"), ("uws_workspaces", "Workspace")]:
+            yield GaugeMetricFamily(name, f"{model_name}s by status", labels=["status"])
+
+    def collect(self):
+        # Imported here, this module is loaded before the app registry is ready.
+        from . import models
+
+        for model, name in [(models.Job, "uws_jobs"), (models.Workspace, "uws_workspaces")]:
+            gauge = GaugeMetricFamily(name, f"{model.__name__}s by status", labels=["status"])
+            counts = dict.fromkeys(model.Status.values, 0)
+            for status, count in (
+                model.objects.order_by().values_list("status").annotate(count=Count("id"))
+            ):
+                counts[status] = count
+            for status, count in counts.items():
+                gauge.add_metric([status], count)
+            yield gauge
+
+
+if not MULTIPROCESS:
+    REGISTRY.register(ModelStatusCollector())
+
+
+def get_registry():
+    if not MULTIPROCESS:
+        return REGISTRY
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(ModelStatusCollector())
+    return registry
+
+
+def is_metrics_request_allowed(request):
+    # Scraping runs database aggregates, so it is limited to configured scrapers.
+    config = getattr(settings, "METRICS", {})
+    if request.META.get("REMOTE_ADDR") in config.get("allowed_ips", []):
+        return True
+
+    token = config.get("token")
+    scheme, _, credentials = request.headers.get("Authorization", "").partition(" ")
+    return bool(token) and scheme == "Bearer" and hmac.compare_digest(credentials, token)
+
+
+def metrics_view(request):
+    if not is_metrics_request_allowed(request):
+        return JsonResponse(
+            {"success": False, "message": "Metrics are only available to configured scrapers."},
+            status=403,
+        )
+    return HttpResponse(generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST)
+
+
+# The put_type URL segment is free text, anything the views don't handle is recorded as "other" so
+# clients can't create unbounded label values.
+PUT_TYPES = {"accept", "complete", "download", "files", "metrics", "start", "stop", "upload"}
+
+
+def observe_request(request, response, duration):
+    match = request.resolver_match
+    if match is None:
+        view = "unmatched"
+    else:
+        view = getattr(match.func, "view_class", match.func).__name__
+    put_type = ((match.kwargs.get("put_type") or "") if match else "").lower()
+    if put_type and put_type not in PUT_TYPES:
+        put_type = "other"
+    REQUEST_DURATION.labels(view, request.method, put_type, response.status_code).observe(duration)
+
+
+@sync_and_async_middleware
+def request_metrics_middleware(get_response):
+    # Works both ways so that async views (IE the passthrough) are not forced onto a thread.
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            start = time.perf_counter()
+            response = await get_response(request)
+            observe_request(request, response, time.perf_counter() - start)
+            return response
+
+    else:
+
+        def middleware(request):
+            start = time.perf_counter()
+            response = get_response(request)
+            observe_request(request, response, time.perf_counter() - start)
+            return response
+
+    return middleware
+
+
+def observe_task(sender, task, **kwargs):
+    # post_execute is sent by each cluster's monitor process once a task has finished.
+    func = task.get("func")
+    name = func if isinstance(func, str) else f"{func.__module__}.{func.__name__}"
+    TASK_DURATION.labels(name, task.get("success", False)).observe(
+        (task["stopped"] - task["started"]).total_seconds()
+    )
+
+
+def observe_http_client_request(method, url, duration, status=None):
+    # status is None when no response was received at all. url can be missing, IE for an
+    # unconfigured health check.
+    host = parse.urlparse(url or "").netloc
+    HTTP_CLIENT_REQUEST_DURATION.labels(host, method).observe(duration)
+    if status is None or status >= 500:
+        HTTP_CLIENT_ERRORS.labels(host, method).inc()
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-17 17:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user_workspaces_server", "0019_alter_workspace_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="job",
+            name="datetime_next_status_update",
+            field=models.DateTimeField(null=True),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.1.3 on 2026-10-17 17:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user_workspaces_server", "0020_job_datetime_next_status_update"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WorkspaceUpload",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("file_name", models.CharField(max_length=1024)),
+                ("file_size", models.BigIntegerField(null=True)),
+                ("bytes_received", models.BigIntegerField(default=0)),
+                ("datetime_created", models.DateTimeField()),
+                ("datetime_last_modified", models.DateTimeField(null=True)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("in_progress", "In Progress"),
+                            ("complete", "Complete"),
+                        ],
+                        default="in_progress",
+                        max_length=64,
+                    ),
+                ),
+                (
+                    "user_id",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "workspace_id",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="user_workspaces_server.workspace",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.1.3 on 2026-10-17 17:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user_workspaces_server", "0021_workspaceupload"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="JobMetric",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("datetime_created", models.DateTimeField()),
+                ("cpu_time", models.FloatField(null=True)),
+                ("cpus", models.IntegerField(null=True)),
+                ("memory", models.BigIntegerField(null=True)),
+                ("time_left", models.FloatField(null=True)),
+                ("node", models.CharField(default="", max_length=256)),
+                (
+                    "job_id",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="user_workspaces_server.job",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["job_id", "datetime_created"],
+                        name="user_worksp_job_id__f63d4c_idx",
+                    )
+                ],
+            },
+        ),
+    ]
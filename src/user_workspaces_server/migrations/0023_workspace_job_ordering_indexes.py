@@ -0,0 +1,28 @@
+# Generated by Django 5.1.3 on 2026-10-17 18:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user_workspaces_server", "0022_jobmetric"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="job",
+            index=models.Index(
+                fields=["datetime_created", "id"], name="user_worksp_datetim_63264d_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="workspace",
+            index=models.Index(
+                fields=["user_id", "datetime_created", "id"],
+                name="user_worksp_user_id_5e9cdf_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.3 on 2026-10-17 18:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user_workspaces_server", "0023_workspace_job_ordering_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WorkspaceFile",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=4096)),
+                (
+                    "file_type",
+                    models.CharField(
+                        choices=[("file", "File"), ("symlink", "Symlink")],
+                        default="file",
+                        max_length=64,
+                    ),
+                ),
+                (
+                    "workspace_id",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="user_workspaces_server.workspace",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("workspace_id", "name"), name="unique_workspace_file"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+from django.db import migrations
+
+
+def move_to_workspace_files(apps, schema_editor):
+    Workspace = apps.get_model("user_workspaces_server", "Workspace")
+    WorkspaceFile = apps.get_model("user_workspaces_server", "WorkspaceFile")
+
+    for workspace in Workspace.objects.iterator(chunk_size=100):
+        if not isinstance(workspace.workspace_details, dict):
+            continue
+        current_details = workspace.workspace_details.pop("current_workspace_details", None)
+        if current_details is None:
+            continue
+
+        WorkspaceFile.objects.bulk_create(
+            [
+                WorkspaceFile(workspace_id=workspace, name=entry["name"], file_type=file_type)
+                for file_type, key in [("file", "files"), ("symlink", "symlinks")]
+                for entry in current_details.get(key, [])
+            ],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+        workspace.save(update_fields=["workspace_details"])
+
+
+def move_to_workspace_details(apps, schema_editor):
+    Workspace = apps.get_model("user_workspaces_server", "Workspace")
+    WorkspaceFile = apps.get_model("user_workspaces_server", "WorkspaceFile")
+
+    for workspace in Workspace.objects.iterator(chunk_size=100):
+        current_details = {"files": [], "symlinks": []}
+        for name, file_type in (
+            WorkspaceFile.objects.filter(workspace_id=workspace)
+            .order_by("id")
+            .values_list("name", "file_type")
+        ):
+            current_details["files" if file_type == "file" else "symlinks"].append({"name": name})
+        workspace.workspace_details["current_workspace_details"] = current_details
+        workspace.save(update_fields=["workspace_details"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user_workspaces_server", "0024_workspacefile"),
+    ]
+
+    operations = [
+        migrations.RunPython(move_to_workspace_files, move_to_workspace_details),
+    ]
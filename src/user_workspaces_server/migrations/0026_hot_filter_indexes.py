@@ -0,0 +1,70 @@
+# Generated by Django 5.1.3 on 2026-10-17 18:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user_workspaces_server", "0025_move_current_workspace_details"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="externalusermapping",
+            index=models.Index(
+                fields=["user_authentication_name", "user_id"],
+                name="user_worksp_user_au_15d909_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="externalusermapping",
+            index=models.Index(
+                fields=["user_authentication_name", "external_username"],
+                name="user_worksp_user_au_70f495_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="externalusermapping",
+            index=models.Index(
+                fields=["user_authentication_name", "external_user_id"],
+                name="user_worksp_user_au_de6ed5_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="job",
+            index=models.Index(
+                fields=["workspace_id", "status"], name="user_worksp_workspa_18d19f_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="job",
+            index=models.Index(
+                fields=["user_id", "status"], name="user_worksp_user_id_97b061_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="job",
+            index=models.Index(
+                condition=models.Q(("status__in", ["pending", "running", "stopping"])),
+                fields=["datetime_next_status_update"],
+                name="job_active_status_update_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="sharedworkspacemapping",
+            index=models.Index(
+                fields=["original_workspace_id", "is_accepted"],
+                name="user_worksp_origina_43c018_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="sharedworkspacemapping",
+            index=models.Index(
+                fields=["shared_workspace_id", "is_accepted"],
+                name="user_worksp_shared__6f9b04_idx",
+            ),
+        ),
+    ]
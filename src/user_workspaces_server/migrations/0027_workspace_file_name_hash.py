@@ -0,0 +1,26 @@
+# Generated by Django 5.1.3 on 2026-10-17 18:34
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user_workspaces_server", "0026_hot_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="workspacefile",
+            name="unique_workspace_file",
+        ),
+        migrations.AddConstraint(
+            model_name="workspacefile",
+            constraint=models.UniqueConstraint(
+                models.F("workspace_id"),
+                django.db.models.functions.text.MD5("name"),
+                name="unique_workspace_file",
+            ),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.contrib.auth.models import User
 from django.db import models
+from django.db.models.functions import MD5
 
 
 class Workspace(models.Model):
@@ -25,10 +26,17 @@ class Workspace(models.Model):
     def __str__(self):
         return f"{self.id}: {self.user_id.username} - {self.status}"
 
+    class Meta:
+        indexes = [models.Index(fields=["user_id", "datetime_created", "id"])]
+
     @staticmethod
     def get_query_param_fields():
         return ["name", "description", "status"]
 
+    @staticmethod
+    def get_ordering_fields():
+        return ["id", "datetime_created"]
+
     @staticmethod
     def get_dict_fields():
         return [
@@ -45,6 +53,42 @@ class Workspace(models.Model):
         ]
 
 
+class WorkspaceFile(models.Model):
+    # Files and symlinks found by the last scan of a workspace. Kept out of workspace_details so
+    # saving a workspace does not rewrite its whole file list.
+    class FileType(models.TextChoices):
+        FILE = "file"
+        SYMLINK = "symlink"
+
+    workspace_id = models.ForeignKey(Workspace, on_delete=models.CASCADE)
+    # Relative to the workspace, with a leading slash.
+    name = models.CharField(max_length=4096)
+    file_type = models.CharField(max_length=64, default=FileType.FILE, choices=FileType.choices)
+
+    def __str__(self):
+        return f"{self.id}: Workspace {self.workspace_id_id} - {self.name}"
+
+    class Meta:
+        # Paths can be longer than a btree index row allows, so the index holds their hash.
+        constraints = [
+            models.UniqueConstraint(
+                models.F("workspace_id"), MD5("name"), name="unique_workspace_file"
+            )
+        ]
+
+    @staticmethod
+    def get_query_param_fields():
+        return ["file_type"]
+
+    @staticmethod
+    def get_ordering_fields():
+        return ["id", "name"]
+
+    @staticmethod
+    def get_dict_fields():
+        return ["id", "name", "file_type"]
+
+
 class Job(models.Model):
     class Status(models.TextChoices):
         PENDING = "pending"
@@ -62,6 +106,7 @@ class Job(models.Model):
     datetime_created = models.DateTimeField()
     datetime_start = models.DateTimeField(null=True)
     datetime_end = models.DateTimeField(null=True)
+    datetime_next_status_update = models.DateTimeField(null=True)
     core_hours = models.DecimalField(max_digits=10, decimal_places=5)
     job_details = models.JSONField()
     resource_options = models.JSONField()
@@ -72,10 +117,27 @@ class Job(models.Model):
             f"Workspace {self.workspace_id.id if self.workspace_id else 'Deleted'} - {self.status}"
         )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["datetime_created", "id"]),
+            models.Index(fields=["workspace_id", "status"]),
+            models.Index(fields=["user_id", "status"]),
+            # The status poller only ever looks at active jobs, which are a small share of all.
+            models.Index(
+                fields=["datetime_next_status_update"],
+                condition=models.Q(status__in=["pending", "running", "stopping"]),
+                name="job_active_status_update_idx",
+            ),
+        ]
+
     @staticmethod
     def get_query_param_fields():
         return ["workspace_id", "resource_job_id", "job_type", "status"]
 
+    @staticmethod
+    def get_ordering_fields():
+        return ["id", "datetime_created"]
+
     @staticmethod
     def get_dict_fields():
         return [
@@ -92,6 +154,26 @@ class Job(models.Model):
         ]
 
 
+class JobMetric(models.Model):
+    # Append-only resource utilization samples, one per job per status poll.
+    job_id = models.ForeignKey(Job, on_delete=models.CASCADE)
+    datetime_created = models.DateTimeField()
+    # Cumulative CPU seconds used by the job.
+    cpu_time = models.FloatField(null=True)
+    cpus = models.IntegerField(null=True)
+    # Bytes in use, or allocated when the resource does not report usage.
+    memory = models.BigIntegerField(null=True)
+    time_left = models.FloatField(null=True)
+    node = models.CharField(max_length=256, default="")
+
+    class Meta:
+        indexes = [models.Index(fields=["job_id", "datetime_created"])]
+
+    @staticmethod
+    def get_sample_fields():
+        return ["cpu_time", "cpus", "memory", "time_left", "node"]
+
+
 class UserQuota(models.Model):
     user_id = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     max_disk_space = models.IntegerField()
@@ -100,6 +182,36 @@ class UserQuota(models.Model):
     used_core_hours = models.DecimalField(max_digits=15, decimal_places=5)
 
 
+class WorkspaceUpload(models.Model):
+    class Status(models.TextChoices):
+        IN_PROGRESS = "in_progress"
+        COMPLETE = "complete"
+
+    user_id = models.ForeignKey(User, on_delete=models.CASCADE)
+    workspace_id = models.ForeignKey(Workspace, on_delete=models.CASCADE)
+    file_name = models.CharField(max_length=1024)
+    file_size = models.BigIntegerField(null=True)
+    bytes_received = models.BigIntegerField(default=0)
+    datetime_created = models.DateTimeField()
+    datetime_last_modified = models.DateTimeField(null=True)
+    status = models.CharField(max_length=64, default=Status.IN_PROGRESS, choices=Status.choices)
+
+    def __str__(self):
+        return f"{self.id}: {self.file_name} - {self.status}"
+
+    @staticmethod
+    def get_dict_fields():
+        return [
+            "id",
+            "file_name",
+            "file_size",
+            "bytes_received",
+            "datetime_created",
+            "datetime_last_modified",
+            "status",
+        ]
+
+
 class ExternalUserMapping(models.Model):
     user_id = models.ForeignKey(User, on_delete=models.CASCADE, null=True)
     external_user_id = models.CharField(max_length=128)
@@ -107,6 +219,13 @@ class ExternalUserMapping(models.Model):
     user_authentication_name = models.CharField(max_length=64)
     external_user_details = models.JSONField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user_authentication_name", "user_id"]),
+            models.Index(fields=["user_authentication_name", "external_username"]),
+            models.Index(fields=["user_authentication_name", "external_user_id"]),
+        ]
+
     def __str__(self):
         return (
             f"{self.id}: {self.user_id.username if self.user_id else 'User Missing'} -"
@@ -129,6 +248,12 @@ class SharedWorkspaceMapping(models.Model):
     is_accepted = models.BooleanField(default=False)
     datetime_share_created = models.DateTimeField(null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["original_workspace_id", "is_accepted"]),
+            models.Index(fields=["shared_workspace_id", "is_accepted"]),
+        ]
+
     @staticmethod
     def get_query_param_fields():
         return ["is_accepted"]
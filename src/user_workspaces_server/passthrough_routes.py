@@ -0,0 +1,166 @@
+import json
+import logging
+import threading
+import time
+from collections import namedtuple
+
+import redis
+from django.conf import settings
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+Route = namedtuple("Route", ["hostname", "port", "user_id"])
+
+ROUTES_KEY = "uws:passthrough_routes"
+ROUTES_CHANNEL = "uws:passthrough_routes:updates"
+
+# Routes looked up from the database are only kept for a short while, since without Redis no
+# invalidation will reach this process. Routes pushed through Redis are kept until removed.
+LOCAL_ROUTE_TTL = 30
+# Unknown and finished jobs are remembered for less long, so a job that just got its route is not
+# unreachable for long when there is no Redis to push it.
+MISSING_ROUTE_TTL = 5
+# Expired entries are dropped once the table grows past this, IE when probed for many job ids.
+MAX_LOCAL_ROUTES = 10000
+
+# job_id -> (Route or None, expiry), expiry is None for pushed routes.
+routes = {}
+redis_clients = {}
+listener_thread = None
+listener_lock = threading.Lock()
+
+
+def get_redis_url():
+    # The route table shares the Redis instance behind the channel layer, if there is one.
+    channel_layer = settings.CHANNEL_LAYERS.get("default", {})
+    if channel_layer.get("BACKEND") != "channels_redis.core.RedisChannelLayer":
+        return None
+
+    host = channel_layer.get("CONFIG", {}).get("hosts", [("localhost", 6379)])[0]
+    if isinstance(host, dict):
+        host = host["address"]
+    if isinstance(host, (list, tuple)):
+        return f"redis://{host[0]}:{host[1]}"
+    return host
+
+
+def get_redis_client():
+    redis_url = get_redis_url()
+    if redis_url is None:
+        return None
+    if redis_url not in redis_clients:
+        redis_clients[redis_url] = redis.Redis.from_url(redis_url)
+    return redis_clients[redis_url]
+
+
+def get_job_route(job):
+    proxy_details = job.job_details["current_job_details"].get("proxy_details")
+    if not proxy_details:
+        return None
+    return Route(proxy_details["hostname"], proxy_details["port"], job.user_id_id)
+
+
+def apply_route_update(job_id, route):
+    if route is None:
+        routes.pop(job_id, None)
+    else:
+        routes[job_id] = (Route(*route), None)
+
+
+def publish_route(job_id, route):
+    client = get_redis_client()
+    if client is None:
+        return
+
+    try:
+        with client.pipeline() as pipeline:
+            if route is None:
+                pipeline.hdel(ROUTES_KEY, job_id)
+            else:
+                pipeline.hset(ROUTES_KEY, job_id, json.dumps(route))
+            pipeline.publish(ROUTES_CHANNEL, json.dumps({"job_id": job_id, "route": route}))
+            pipeline.execute()
+    except redis.RedisError:
+        logger.exception(f"Failed to publish passthrough route for job {job_id}")
+
+
+def set_route(job_id, route):
+    apply_route_update(job_id, route)
+    publish_route(job_id, route)
+
+
+def remove_route(job_id):
+    apply_route_update(job_id, None)
+    publish_route(job_id, None)
+
+
+def evict_route(job_id):
+    # Only forgets the route in this process, IE after the upstream could not be reached.
+    routes.pop(job_id, None)
+
+
+def listen_for_routes():
+    client = get_redis_client()
+    while True:
+        try:
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(ROUTES_CHANNEL)
+
+            # Subscribe before loading the table so that no update can fall in between.
+            for job_id, route in client.hgetall(ROUTES_KEY).items():
+                apply_route_update(int(job_id), json.loads(route))
+
+            for message in pubsub.listen():
+                update = json.loads(message["data"])
+                apply_route_update(update["job_id"], update["route"])
+        except redis.RedisError:
+            logger.exception("Lost connection to the passthrough route updates")
+            # Updates may have been missed, so drop the pushed routes until the reload.
+            for job_id, (_, expiry) in list(routes.items()):
+                if expiry is None:
+                    routes.pop(job_id, None)
+            time.sleep(5)
+
+
+def start_listener():
+    global listener_thread
+    if listener_thread is not None or get_redis_client() is None:
+        return
+
+    with listener_lock:
+        if listener_thread is None:
+            listener_thread = threading.Thread(target=listen_for_routes, daemon=True)
+            listener_thread.start()
+
+
+def cache_local_route(job_id, route):
+    now = time.monotonic()
+    if len(routes) >= MAX_LOCAL_ROUTES:
+        for cached_job_id, (_, expiry) in list(routes.items()):
+            if expiry is not None and expiry <= now:
+                routes.pop(cached_job_id, None)
+
+    routes[job_id] = (route, now + (LOCAL_ROUTE_TTL if route else MISSING_ROUTE_TTL))
+
+
+async def get_route(job_id):
+    start_listener()
+
+    if (cached_route := routes.get(job_id)) and (
+        cached_route[1] is None or cached_route[1] > time.monotonic()
+    ):
+        return cached_route[0]
+
+    # Not pushed (yet), fall back to the database.
+    try:
+        job = await models.Job.objects.exclude(
+            status__in=[models.Job.Status.COMPLETE, models.Job.Status.FAILED]
+        ).aget(pk=job_id)
+        route = get_job_route(job)
+    except models.Job.DoesNotExist:
+        route = None
+
+    cache_local_route(job_id, route)
+    return route
@@ -1,33 +1,216 @@
+import copy
 import datetime
+import json
 import logging
 import os
-import shutil
+import threading
+import time
 
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 from django.apps import apps
 from django.conf import settings
-from django.db.models import Sum
+from django.db import close_old_connections, connections, transaction
+from django.db.models import Q, Sum
 from django.forms.models import model_to_dict
 from django.template.loader import render_to_string
+from django.utils import timezone
 from django_q.brokers import get_broker
 from django_q.tasks import async_task
 
-from . import models, utils
+from . import models, passthrough_routes, tracing, utils
 
 logger = logging.getLogger(__name__)
 
 
+ACTIVE_JOB_STATUSES = [
+    models.Job.Status.PENDING,
+    models.Job.Status.RUNNING,
+    models.Job.Status.STOPPING,
+]
+
+
+def update_job_statuses():
+    # Single poller for every active job, so that the broker and resource load scale with the
+    # number of poll cycles rather than with the number of jobs.
+    logger.info(f"Updating active job statuses on {get_broker().list_key}")
+
+    # Only poll the jobs whose scheduled check has come due.
+    jobs = list(
+        models.Job.objects.filter(status__in=ACTIVE_JOB_STATUSES)
+        .filter(
+            Q(datetime_next_status_update__isnull=True)
+            | Q(datetime_next_status_update__lte=timezone.now())
+        )
+        .select_related("user_id", "workspace_id")
+    )
+
+    if jobs:
+        update_jobs(jobs)
+
+
+def poll_job_statuses(stop_event):
+    # Dedicated poller loop, run in a thread of the main cluster's process. Cycles start
+    # job_status_poll_interval apart without holding a worker while waiting, and without depending
+    # on the django-q scheduler, which only runs about every 30 seconds. Individual jobs back off
+    # further through their datetime_next_status_update.
+    resource = apps.get_app_config("user_workspaces_server").main_resource
+    poll_interval = float(resource.config.get("job_status_poll_interval", 5))
+
+    try:
+        while not stop_event.is_set():
+            cycle_start = time.monotonic()
+            close_old_connections()
+            try:
+                with tracing.span("update_job_statuses"):
+                    update_job_statuses()
+            except Exception:
+                logger.exception("Job status update cycle failed")
+            stop_event.wait(max(0.0, poll_interval - (time.monotonic() - cycle_start)))
+    finally:
+        connections.close_all()
+
+
+def start_job_status_poller():
+    stop_event = threading.Event()
+    threading.Thread(
+        target=poll_job_statuses, args=(stop_event,), name="job_status_poller", daemon=True
+    ).start()
+    return stop_event
+
+
 def update_job_status(job_id):
     logger.info(f"Updating job {job_id} status on {get_broker().list_key}")
     try:
-        job = models.Job.objects.get(pk=job_id)
+        job = models.Job.objects.select_related("user_id", "workspace_id").get(pk=job_id)
     except models.Job.DoesNotExist:
         logger.exception(f"Job {job_id} does not exist.")
         raise
 
+    update_jobs([job])
+
+
+def update_jobs(jobs):
     resource = apps.get_app_config("user_workspaces_server").main_resource
-    resource_job_info = resource.get_resource_job(job)
+    resource_jobs = resource.get_resource_jobs(jobs)
+
+    # Pick up status changes (IE stop requests) made while the resource was being queried.
+    current_statuses = dict(
+        models.Job.objects.filter(pk__in=[job.pk for job in jobs]).values_list("pk", "status")
+    )
+
+    # Shortest time between two status broadcasts for one job.
+    broadcast_interval = float(resource.config.get("job_status_broadcast_interval", 5))
+
+    updated_jobs = []
+    job_status_patches = {}
+    job_metrics = []
+    for job in jobs:
+        if job.pk not in current_statuses or job.pk not in resource_jobs:
+            continue
+
+        job.status = current_statuses[job.pk]
+        # Whoever moved the job into a terminal state is responsible for finishing it.
+        if job.status not in ACTIVE_JOB_STATUSES:
+            continue
+
+        job_status = get_job_status_document(job)
+        proxy_details = job.job_details["current_job_details"].get("proxy_details")
+        with tracing.span("apply_resource_job", {"job.id": job.pk, "job.status": job.status}):
+            apply_resource_job(job, resource_jobs[job.pk], resource)
+        job_status_patches[job.pk] = utils.get_merge_patch(
+            job_status, get_job_status_document(job)
+        )
+
+        if metrics := resource_jobs[job.pk].get("metrics"):
+            job_metrics.append(
+                models.JobMetric(
+                    job_id=job,
+                    datetime_created=timezone.now(),
+                    **{
+                        field: metrics[field]
+                        for field in models.JobMetric.get_sample_fields()
+                        if metrics.get(field) is not None
+                    },
+                )
+            )
+
+        # Let the web workers know as soon as the job's web server can be reached.
+        if job.job_details["current_job_details"].get("proxy_details") != proxy_details:
+            passthrough_routes.set_route(job.pk, passthrough_routes.get_job_route(job))
+
+        poll_delay = resource.get_status_poll_delay(job)
+        # Each poll broadcasts at most one patch, so spacing the polls limits the broadcasts.
+        if poll_delay is not None and job_status_patches[job.pk]:
+            poll_delay = max(poll_delay, broadcast_interval)
+        job.datetime_next_status_update = (
+            None if poll_delay is None else timezone.now() + datetime.timedelta(seconds=poll_delay)
+        )
+        updated_jobs.append(job)
+
+    models.Job.objects.bulk_update(
+        updated_jobs,
+        [
+            "status",
+            "datetime_start",
+            "datetime_end",
+            "datetime_next_status_update",
+            "job_details",
+        ],
+    )
+    models.JobMetric.objects.bulk_create(job_metrics)
+
+    for job in updated_jobs:
+        if job_status_patches[job.pk]:
+            broadcast_job_status(job, job_status_patches[job.pk])
+
+        if job.status in [models.Job.Status.COMPLETE, models.Job.Status.FAILED]:
+            finish_job(job)
+
+
+def get_job_status_document(job):
+    return copy.deepcopy(
+        {"status": job.status, "current_job_details": job.job_details["current_job_details"]}
+    )
+
+
+def broadcast_job_status(job, patch):
+    # Only changes are sent, as a JSON merge patch (RFC 7396) against the previous status.
+    # Serialized once here rather than by every consumer in the group.
+    async_to_sync(get_channel_layer().group_send)(
+        f"job_status_{job.pk}",
+        {
+            "type": "job_status_update",
+            "text": json.dumps({"type": "job_status_patch", "job_id": job.pk, "data": patch}),
+        },
+    )
+
+
+def broadcast_workspace_status(workspace_id, message_type, data):
+    # Status changes ("workspace_status_patch") and progress of long running tasks
+    # ("workspace_progress") for the workspace's status streams.
+    async_to_sync(get_channel_layer().group_send)(
+        f"workspace_status_{workspace_id}",
+        {
+            "type": "workspace_status_update",
+            "text": json.dumps({"type": message_type, "workspace_id": workspace_id, "data": data}),
+        },
+    )
+
+
+def subscribe_user_status(user_id, subscription_type, object_id):
+    # Adds a new job or workspace to the user's open status streams.
+    async_to_sync(get_channel_layer().group_send)(
+        f"user_status_{user_id}",
+        {
+            "type": "user_status_subscribe",
+            "subscription_type": subscription_type,
+            "object_id": object_id,
+        },
+    )
+
+
+def apply_resource_job(job, resource_job_info, resource):
     current_job_status = resource_job_info["status"]
 
     # Check the existing job status
@@ -35,8 +218,6 @@ def update_job_status(job_id):
     # Status should only ever be one of the following:
     # pending, running, complete, failed, stopping
 
-    job.refresh_from_db()
-
     if current_job_status == models.Job.Status.RUNNING and job.datetime_start is None:
         job.datetime_start = datetime.datetime.now(job.datetime_created.tzinfo)
         time_pending = (job.datetime_start - job.datetime_created).total_seconds()
@@ -47,14 +228,14 @@ def update_job_status(job_id):
         current_time_pending = (
             datetime.datetime.now(job.datetime_created.tzinfo) - job.datetime_created
         ).total_seconds()
-        time_pending_catch = resource.config.get("time_pending_catch")
+        time_pending_catch = resource.config.get("time_pending_catch", 0)
         if int(time_pending_catch) and current_time_pending > time_pending_catch:
             logger.error(
-                f"Job {job_id} for user {job.user_id.username} has been pending more than {time_pending_catch}"
+                f"Job {job.pk} for user {job.user_id.username} has been pending more than {time_pending_catch}"
             )
 
     if current_job_status == models.Job.Status.FAILED:
-        logger.error(f"Job {job_id} for user {job.user_id.username} has failed.")
+        logger.error(f"Job {job.pk} for user {job.user_id.username} has failed.")
 
     job.status = (
         job.status
@@ -81,10 +262,12 @@ def update_job_status(job_id):
             },
         )
     except Exception:
-        raise Exception("Invalid job type specified")
+        logger.exception(f"Invalid job type specified for job {job.pk}")
+        return
 
     # TODO: Make sure that we're using the resource to do this type of status check
-    job_status = job_type.status_check(job)
+    with tracing.span("status_check", {"job.id": job.pk, "job.type": job.job_type}):
+        job_status = job_type.status_check(job)
 
     job.job_details["current_job_details"].update(job_status.get("current_job_details", {}))
     job.job_details["metrics"].update(job_status.get("metrics", {}))
@@ -99,58 +282,30 @@ def update_job_status(job_id):
                 "url_domain"
             ] = resource.passthrough_domain
 
-    job.save()
 
-    channel_layer = get_channel_layer()
+def finish_job(job):
+    passthrough_routes.remove_route(job.pk)
 
-    async_to_sync(channel_layer.group_send)(
-        f"job_status_{job_id}",
-        {
-            "type": "job_status_update",
-            "message": {
-                "status": job.status,
-                "current_job_details": job.job_details["current_job_details"],
-            },
-        },
-    )
-
-
-def queue_job_update(task):
-    job_id = list(task.args)[0]
-
-    try:
-        job = models.Job.objects.get(pk=job_id)
-    except models.Job.DoesNotExist:
-        logger.exception(f"Job {job_id} does not exist.")
-        raise
-
-    if job.status in [
-        models.Job.Status.PENDING,
-        models.Job.Status.RUNNING,
-        models.Job.Status.STOPPING,
-    ]:
+    workspace = job.workspace_id
+    if (
+        workspace
+        and not models.Job.objects.filter(
+            workspace_id=workspace,
+            status__in=[models.Job.Status.PENDING, models.Job.Status.RUNNING],
+        ).exists()
+        and workspace.status != models.Workspace.Status.DELETING
+    ):
+        workspace.status = models.Workspace.Status.IDLE
+        workspace.save()
+        broadcast_workspace_status(
+            workspace.pk, "workspace_status_patch", {"status": workspace.status}
+        )
+        async_update_workspace(workspace.pk)
         async_task(
-            "user_workspaces_server.tasks.update_job_status",
-            job_id,
-            hook="user_workspaces_server.tasks.queue_job_update",
+            "user_workspaces_server.tasks.update_job_core_hours",
+            job.pk,
+            cluster="myproject",
         )
-    elif job.status in [models.Job.Status.COMPLETE, models.Job.Status.FAILED]:
-        workspace = job.workspace_id
-        if (
-            not models.Job.objects.filter(
-                workspace_id=job.workspace_id,
-                status__in=[models.Job.Status.PENDING, models.Job.Status.RUNNING],
-            ).exists()
-            and workspace.status != models.Workspace.Status.DELETING
-        ):
-            workspace.status = models.Workspace.Status.IDLE
-            workspace.save()
-            async_update_workspace(workspace.pk)
-            async_task(
-                "user_workspaces_server.tasks.update_job_core_hours",
-                job_id,
-                cluster="myproject",
-            )
 
 
 def update_job_core_hours(job_id):
@@ -183,6 +338,7 @@ def stop_job(job_id):
     if not resource.stop_job(job):
         job.status = models.Job.Status.FAILED
         job.save()
+        finish_job(job)
 
 
 def delete_workspace(workspace_id):
@@ -198,15 +354,28 @@ def delete_workspace(workspace_id):
         workspace.user_id
     )
 
+    broadcast_workspace_status(
+        workspace_id, "workspace_progress", {"task": "delete", "state": "started"}
+    )
+
     try:
         main_storage.delete_dir(workspace.file_path, external_user_mapping)
     except Exception:
         workspace.status = models.Workspace.Status.ERROR
         workspace.save()
+        broadcast_workspace_status(
+            workspace_id, "workspace_progress", {"task": "delete", "state": "failed"}
+        )
+        broadcast_workspace_status(
+            workspace_id, "workspace_status_patch", {"status": workspace.status}
+        )
         logger.exception(f"Could not delete workspace {workspace_id}")
         raise
 
     workspace.delete()
+    broadcast_workspace_status(
+        workspace_id, "workspace_progress", {"task": "delete", "state": "complete"}
+    )
 
     user_quota = models.UserQuota.objects.filter(user_id=workspace.user_id).first()
     # If this user has a quota spawn a routine to update the disk space.
@@ -219,7 +388,49 @@ def async_update_workspace(workspace_id: int):
     async_task("user_workspaces_server.tasks.update_workspace", workspace_id, cluster="long")
 
 
-def update_workspace(workspace_id: int):
+def set_workspace_ownership(workspace_id: int):
+    logger.info(f"Setting ownership of workspace {workspace_id} on {get_broker().list_key}")
+    try:
+        workspace = models.Workspace.objects.get(pk=workspace_id)
+    except models.Workspace.DoesNotExist:
+        logger.exception(f"Workspace {workspace_id} does not exist.")
+        raise
+
+    main_storage = apps.get_app_config("user_workspaces_server").main_storage
+    external_user_mapping = main_storage.storage_user_authentication.has_permission(
+        workspace.user_id
+    )
+
+    try:
+        main_storage.set_ownership(workspace.file_path, external_user_mapping, recursive=True)
+    except Exception:
+        workspace.status = models.Workspace.Status.ERROR
+        workspace.save()
+        broadcast_workspace_status(
+            workspace_id, "workspace_status_patch", {"status": workspace.status}
+        )
+        logger.exception(f"Could not set ownership of workspace {workspace_id}")
+        raise
+
+    # Newly created workspaces are only usable once their ownership is in place.
+    if workspace.status == models.Workspace.Status.INITIALIZING:
+        workspace.status = models.Workspace.Status.IDLE
+        workspace.save()
+        broadcast_workspace_status(
+            workspace_id, "workspace_status_patch", {"status": workspace.status}
+        )
+
+    update_workspace(workspace_id)
+
+
+def async_set_workspace_ownership(workspace_id: int):
+    # Helper that makes sure ownership changes go to the "long" cluster
+    async_task(
+        "user_workspaces_server.tasks.set_workspace_ownership", workspace_id, cluster="long"
+    )
+
+
+def update_workspace(workspace_id: int, full_rescan: bool = False):
     logger.info(f"Updating workspace {workspace_id} on {get_broker().list_key}")
     try:
         workspace = models.Workspace.objects.get(pk=workspace_id)
@@ -228,35 +439,31 @@ def update_workspace(workspace_id: int):
         raise
 
     main_storage = apps.get_app_config("user_workspaces_server").main_storage
-    current_details = {"files": [], "symlinks": []}
-
-    # This will IGNORE dot directories and files
-    for dirpath, dirnames, filenames, dirfd in main_storage.get_dir_tree(workspace.file_path):
-        dirnames[:] = [dirname for dirname in dirnames if not dirname[0] == "."]
-        filenames = [f for f in filenames if not f[0] == "."]
-
-        for symlink in dirnames:
-            symlink_path = os.path.join(dirpath, symlink)
-            if os.path.islink(symlink_path):
-                relative_path = symlink_path.replace(
-                    os.path.join(main_storage.root_dir, workspace.file_path), ""
-                )
-                current_details["symlinks"].append({"name": relative_path})
+    broadcast_workspace_status(
+        workspace_id, "workspace_progress", {"task": "scan", "state": "started"}
+    )
 
-        for filename in filenames:
-            file_path = os.path.join(dirpath, filename)
-            relative_path = file_path.replace(
-                os.path.join(main_storage.root_dir, workspace.file_path), ""
-            )
-            current_details["symlinks" if os.path.islink(file_path) else "files"].append(
-                {"name": relative_path}
-            )
+    # This will IGNORE dot directories and files, but they still count towards the size.
+    current_details = main_storage.scan_dir(workspace.file_path, full_rescan=full_rescan)
 
-    workspace.workspace_details["current_workspace_details"] = current_details
+    disk_space = workspace.disk_space
+    workspace.disk_space = current_details.pop("size")
+    update_workspace_files(workspace, current_details)
+    workspace.save(update_fields=["disk_space"])
 
-    dir_size = main_storage.get_dir_size(workspace.file_path)
-    workspace.disk_space = dir_size
-    workspace.save()
+    broadcast_workspace_status(
+        workspace_id,
+        "workspace_progress",
+        {
+            "task": "scan",
+            "state": "complete",
+            "files_scanned": len(current_details["files"]) + len(current_details["symlinks"]),
+        },
+    )
+    if workspace.disk_space != disk_space:
+        broadcast_workspace_status(
+            workspace_id, "workspace_status_patch", {"disk_space": workspace.disk_space}
+        )
 
     user_quota = models.UserQuota.objects.filter(user_id=workspace.user_id).first()
     # If this user has a quota spawn a routine to update the disk space.
@@ -264,6 +471,63 @@ def update_workspace(workspace_id: int):
         async_task("user_workspaces_server.tasks.update_user_quota_disk_space", user_quota.id)
 
 
+def update_workspace_files(workspace, current_details):
+    # Only the files and symlinks that appeared, went away or changed type since the last scan are
+    # written. Rows are unique per name, so a changed type is updated in place.
+    scanned = {
+        entry["name"]: file_type
+        for file_type, key in [
+            (models.WorkspaceFile.FileType.FILE, "files"),
+            (models.WorkspaceFile.FileType.SYMLINK, "symlinks"),
+        ]
+        for entry in current_details[key]
+    }
+    existing = {
+        name: (pk, file_type)
+        for pk, name, file_type in models.WorkspaceFile.objects.filter(
+            workspace_id=workspace
+        ).values_list("pk", "name", "file_type")
+    }
+
+    removed = [pk for name, (pk, _) in existing.items() if name not in scanned]
+    retyped = {}
+    for name, (pk, file_type) in existing.items():
+        if name in scanned and scanned[name] != file_type:
+            retyped.setdefault(scanned[name], []).append(pk)
+    added = [
+        models.WorkspaceFile(workspace_id=workspace, name=name, file_type=file_type)
+        for name, file_type in scanned.items()
+        if name not in existing
+    ]
+
+    with transaction.atomic():
+        models.WorkspaceFile.objects.filter(pk__in=removed).delete()
+        for file_type, pks in retyped.items():
+            models.WorkspaceFile.objects.filter(pk__in=pks).update(file_type=file_type)
+        # Overlapping scans of the same workspace can both find a new file.
+        models.WorkspaceFile.objects.bulk_create(added, batch_size=1000, ignore_conflicts=True)
+
+
+def cleanup_uploads():
+    # Abandoned uploads leave their partial file behind, drop those not written to for a while.
+    main_storage = apps.get_app_config("user_workspaces_server").main_storage
+    expiry = datetime.timedelta(seconds=main_storage.config.get("upload_expiry", 86400))
+    cutoff = timezone.now() - expiry
+
+    uploads = (
+        models.WorkspaceUpload.objects.filter(status=models.WorkspaceUpload.Status.IN_PROGRESS)
+        .filter(
+            Q(datetime_last_modified__lte=cutoff)
+            | Q(datetime_last_modified__isnull=True, datetime_created__lte=cutoff)
+        )
+        .select_related("workspace_id")
+    )
+    for upload in uploads:
+        logger.info(f"Removing expired upload {upload.pk} of workspace {upload.workspace_id_id}")
+        main_storage.delete_upload_file(upload.workspace_id.file_path, upload.file_name, upload.pk)
+        upload.delete()
+
+
 def update_user_quota_disk_space(user_quota_id):
     logger.info(f"Updating user quota {user_quota_id} disk space on {get_broker().list_key}")
     try:
@@ -293,58 +557,104 @@ def update_user_quota_core_hours(user_quota_id):
 
 
 def initialize_shared_workspace(shared_workspace_mapping_id: int):
-    shared_workspace_mapping = models.SharedWorkspaceMapping.objects.get(
-        pk=shared_workspace_mapping_id
+    initialize_shared_workspaces([shared_workspace_mapping_id])
+
+
+def initialize_shared_workspaces(shared_workspace_mapping_ids: list):
+    # Shares of one workspace with any number of users, the original is only walked once and
+    # cloned to every shared workspace.
+    shared_workspace_mappings = list(
+        models.SharedWorkspaceMapping.objects.filter(
+            pk__in=shared_workspace_mapping_ids
+        ).select_related("original_workspace_id__user_id", "shared_workspace_id__user_id")
     )
-    original_workspace = shared_workspace_mapping.original_workspace_id
-    shared_workspace = shared_workspace_mapping.shared_workspace_id
+    if not shared_workspace_mappings:
+        logger.error(f"Shared workspace mappings {shared_workspace_mapping_ids} do not exist.")
+        raise models.SharedWorkspaceMapping.DoesNotExist(
+            f"Shared workspace mappings {shared_workspace_mapping_ids} do not exist."
+        )
+    original_workspace = shared_workspace_mappings[0].original_workspace_id
+    shared_workspaces = [mapping.shared_workspace_id for mapping in shared_workspace_mappings]
 
     main_storage = apps.get_app_config("user_workspaces_server").main_storage
-    external_user_mapping = main_storage.storage_user_authentication.has_permission(
-        shared_workspace.user_id
-    )
+    destinations = []
+    for shared_workspace in shared_workspaces:
+        external_user_mapping = main_storage.storage_user_authentication.has_permission(
+            shared_workspace.user_id
+        )
 
-    # Set the shared_workspace file path
-    shared_workspace.file_path = os.path.join(
-        external_user_mapping.external_username, str(shared_workspace.pk)
-    )
+        # Set the shared_workspace file path
+        shared_workspace.file_path = os.path.join(
+            external_user_mapping.external_username, str(shared_workspace.pk)
+        )
+        destinations.append((shared_workspace.file_path, external_user_mapping))
+
+    progress = {"logged": 0, "sent": 0}
+
+    def log_progress(copied, total):
+        # Log roughly every 10% so large copies can be followed.
+        if total and copied * 10 // total > progress["logged"]:
+            progress["logged"] = copied * 10 // total
+            logger.info(
+                f"Copied {copied}/{total} bytes for shared workspaces "
+                f"{[shared_workspace.pk for shared_workspace in shared_workspaces]}"
+            )
+        # Clients get an event for every percent copied.
+        if total and copied * 100 // total > progress["sent"]:
+            progress["sent"] = copied * 100 // total
+            for shared_workspace in shared_workspaces:
+                broadcast_workspace_status(
+                    shared_workspace.pk,
+                    "workspace_progress",
+                    {
+                        "task": "clone",
+                        "state": "running",
+                        "bytes_copied": copied,
+                        "bytes_total": total,
+                    },
+                )
 
     try:
         # Copy non . directories
-        shutil.copytree(
-            os.path.join(main_storage.root_dir, original_workspace.file_path),
-            os.path.join(main_storage.root_dir, shared_workspace.file_path),
-            ignore=shutil.ignore_patterns(".*"),
-            symlinks=True,
-        )
-        main_storage.set_ownership(
-            shared_workspace.file_path, external_user_mapping, recursive=True
+        main_storage.clone_dir_many(
+            original_workspace.file_path, destinations, progress_callback=log_progress
         )
+        clone_state = "complete"
     except Exception as e:
-        logger.exception(f"Copying files for {shared_workspace_mapping} failed: {e}")
+        logger.exception(f"Copying files for {shared_workspace_mappings} failed: {e}")
+        clone_state = "failed"
 
-    async_update_workspace(shared_workspace.pk)
+    for shared_workspace_mapping in shared_workspace_mappings:
+        shared_workspace = shared_workspace_mapping.shared_workspace_id
+        broadcast_workspace_status(
+            shared_workspace.pk, "workspace_progress", {"task": "clone", "state": clone_state}
+        )
 
-    message = render_to_string(
-        "email_templates/share_email.txt",
-        context={
-            "sharer": original_workspace.user_id,
-            "receiver": shared_workspace.user_id,
-            "mapping_details": shared_workspace_mapping,
-            "original_workspace": original_workspace,
-        },
-    )
-    async_task(
-        "django.core.mail.send_mail",
-        "Invitation to Share a Workspace",
-        message,
-        None,
-        [shared_workspace.user_id.email],
-    )
+        async_update_workspace(shared_workspace.pk)
+
+        message = render_to_string(
+            "email_templates/share_email.txt",
+            context={
+                "sharer": original_workspace.user_id,
+                "receiver": shared_workspace.user_id,
+                "mapping_details": shared_workspace_mapping,
+                "original_workspace": original_workspace,
+            },
+        )
+        async_task(
+            "django.core.mail.send_mail",
+            "Invitation to Share a Workspace",
+            message,
+            None,
+            [shared_workspace.user_id.email],
+        )
 
-    # TODO: Set shared_workspace status to idle
-    shared_workspace.status = "idle"
-    shared_workspace.save()
+        # TODO: Set shared_workspace status to idle
+        shared_workspace.status = "idle"
+        shared_workspace.save()
+        broadcast_workspace_status(
+            shared_workspace.pk, "workspace_status_patch", {"status": shared_workspace.status}
+        )
 
 
 def check_main_storage_user(user):
@@ -0,0 +1,301 @@
+import contextlib
+import contextvars
+import json
+import logging
+import queue
+import re
+import secrets
+import threading
+import time
+
+import requests as http_r
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+OTLP_STATUS_CODES = {"ok": 1, "error": 2}
+
+# (trace_id, span_id) of the span currently running in this context, if any.
+current_span_context = contextvars.ContextVar("current_span_context", default=None)
+
+exporter = None
+exporter_lock = threading.Lock()
+# Tokens to restore the enqueuing span's context once a synchronous task is done.
+task_context_tokens = {}
+
+
+class Span:
+    def __init__(self, name, attributes=None, trace_id=None, parent_id=None):
+        self.name = name
+        self.attributes = attributes or {}
+        self.trace_id = trace_id or secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start_time = time.time_ns()
+        self.end_time = None
+        self.status = "ok"
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "start_time_unix_nano": self.start_time,
+            "end_time_unix_nano": self.end_time,
+            "attributes": self.attributes,
+            "status": self.status,
+        }
+
+    def to_otlp(self):
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_time),
+            "endTimeUnixNano": str(self.end_time),
+            "attributes": [
+                {"key": key, "value": get_otlp_value(value)}
+                for key, value in self.attributes.items()
+            ],
+            "status": {"code": OTLP_STATUS_CODES[self.status]},
+        }
+
+
+def get_otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class SpanExporter:
+    # Spans are queued and written in batches from a background thread, so exporting never
+    # blocks the request or task being traced.
+    max_batch_size = 512
+
+    def __init__(self, config):
+        self.exporter_type = config["exporter"]
+        self.file_path = config.get("file_path", "traces.jsonl")
+        self.otlp_endpoint = config.get("otlp_endpoint", "http://localhost:4318").rstrip("/")
+        self.service_name = config.get("service_name", "user_workspaces_server")
+        self.spans = queue.SimpleQueue()
+        self.write_lock = threading.Lock()
+        self.http_session = http_r.Session()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def export(self, span):
+        self.spans.put(span)
+
+    def get_batch(self, block=False):
+        batch = [self.spans.get()] if block else []
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self.spans.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        while True:
+            self.write(self.get_batch(block=True))
+
+    def flush(self):
+        while batch := self.get_batch():
+            self.write(batch)
+
+    def write(self, batch):
+        with self.write_lock:
+            try:
+                if self.exporter_type == "otlp":
+                    self.write_otlp(batch)
+                else:
+                    self.write_file(batch)
+            except Exception:
+                logger.exception(f"Failed to export {len(batch)} spans")
+
+    def write_file(self, batch):
+        with open(self.file_path, "a") as f:
+            f.writelines(
+                json.dumps({**span.to_dict(), "service": self.service_name}) + "\n"
+                for span in batch
+            )
+
+    def write_otlp(self, batch):
+        self.http_session.post(
+            f"{self.otlp_endpoint}/v1/traces",
+            json={
+                "resourceSpans": [
+                    {
+                        "resource": {
+                            "attributes": [
+                                {
+                                    "key": "service.name",
+                                    "value": {"stringValue": self.service_name},
+                                }
+                            ]
+                        },
+                        "scopeSpans": [
+                            {
+                                "scope": {"name": "user_workspaces_server"},
+                                "spans": [span.to_otlp() for span in batch],
+                            }
+                        ],
+                    }
+                ]
+            },
+            timeout=10,
+        ).raise_for_status()
+
+
+def get_exporter():
+    # Tracing is off unless an exporter is configured.
+    global exporter
+    config = getattr(settings, "TRACING", {})
+    if not config.get("exporter"):
+        return None
+
+    if exporter is None:
+        with exporter_lock:
+            if exporter is None:
+                exporter = SpanExporter(config)
+    return exporter
+
+
+def parse_traceparent(traceparent):
+    match = TRACEPARENT_PATTERN.match(traceparent or "")
+    return (match.group(1), match.group(2)) if match else None
+
+
+def get_traceparent():
+    context = current_span_context.get()
+    return f"00-{context[0]}-{context[1]}-01" if context else None
+
+
+@contextlib.contextmanager
+def span(name, attributes=None, parent=None):
+    # Spans nest under the current one unless given a (trace_id, span_id) parent, IE one
+    # received from another service. Can also be used as a decorator.
+    span_exporter = get_exporter()
+    parent = parent or current_span_context.get()
+    new_span = Span(name, attributes, *(parent or (None, None)))
+    if span_exporter is None:
+        yield new_span
+        return
+
+    token = current_span_context.set((new_span.trace_id, new_span.span_id))
+    try:
+        yield new_span
+    except Exception:
+        new_span.status = "error"
+        raise
+    finally:
+        current_span_context.reset(token)
+        new_span.end_time = time.time_ns()
+        span_exporter.export(new_span)
+
+
+def trace_query(execute, sql, params, many, context):
+    # Queries outside of a traced request or task (IE the broker polling) are not recorded.
+    if current_span_context.get() is None or get_exporter() is None:
+        return execute(sql, params, many, context)
+
+    with span("db.query", {"db.system": context["connection"].vendor, "db.statement": sql}):
+        return execute(sql, params, many, context)
+
+
+def install_query_tracing(sender, connection, **kwargs):
+    # Sent for every new database connection, in web workers and django-q workers alike.
+    if trace_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(trace_query)
+
+
+def get_request_span_name(request, response):
+    match = request.resolver_match
+    if match is None:
+        return f"{request.method} unmatched"
+    view = getattr(match.func, "view_class", match.func).__name__
+    return f"{request.method} {view}"
+
+
+@sync_and_async_middleware
+def tracing_middleware(get_response):
+    # Continues the trace of a W3C traceparent header if one was sent.
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            parent = parse_traceparent(request.headers.get("traceparent"))
+            with span(request.method, {"http.target": request.path}, parent) as request_span:
+                response = await get_response(request)
+                request_span.name = get_request_span_name(request, response)
+                request_span.attributes["http.status_code"] = response.status_code
+            return response
+
+    else:
+
+        def middleware(request):
+            parent = parse_traceparent(request.headers.get("traceparent"))
+            with span(request.method, {"http.target": request.path}, parent) as request_span:
+                response = get_response(request)
+                request_span.name = get_request_span_name(request, response)
+                request_span.attributes["http.status_code"] = response.status_code
+            return response
+
+    return middleware
+
+
+def inject_task_context(sender, task, **kwargs):
+    # pre_enqueue: the traceparent travels with the task package, not the task's arguments.
+    if traceparent := get_traceparent():
+        task["traceparent"] = traceparent
+
+
+def start_task_span(sender, func, task, **kwargs):
+    # pre_execute: sent by the worker process right before running the task, so its context
+    # becomes the parent of everything the task does. The span itself is exported by the
+    # monitor process once the task has finished, see finish_task_span.
+    if get_exporter() is None:
+        return
+
+    parent = parse_traceparent(task.get("traceparent")) or (secrets.token_hex(16), None)
+    task["trace_span"] = (parent[0], secrets.token_hex(8), parent[1], time.time_ns())
+
+    task_context_tokens.clear()
+    task_context_tokens[task["id"]] = current_span_context.set(task["trace_span"][:2])
+
+
+def finish_task_span(sender, task, **kwargs):
+    # post_execute
+    if (token := task_context_tokens.pop(task["id"], None)) is not None:
+        try:
+            current_span_context.reset(token)
+        except ValueError:
+            # Set in another context, IE in a worker before the task was handed to the monitor.
+            pass
+
+    span_exporter = get_exporter()
+    if span_exporter is None or "trace_span" not in task:
+        return
+
+    func = task.get("func")
+    trace_id, span_id, parent_id, start_time = task["trace_span"]
+    task_span = Span(
+        f"task {func if isinstance(func, str) else f'{func.__module__}.{func.__name__}'}",
+        {"task.id": task["id"], "task.name": task.get("name", "")},
+        trace_id,
+        parent_id,
+    )
+    task_span.span_id = span_id
+    task_span.start_time = start_time
+    task_span.end_time = int(task["stopped"].timestamp() * 1e9)
+    task_span.status = "ok" if task.get("success") else "error"
+    span_exporter.export(task_span)
@@ -16,15 +16,17 @@ Including another URLconf
 
 from django.urls import include, path
 
-from . import ws_consumers
-from .views import (  # passthrough_view,
+from . import metrics, ws_consumers
+from .views import (
     job_type_view,
     job_view,
     parameter_view,
+    passthrough_view,
     shared_workspace_view,
     status_view,
     user_view,
     user_workspaces_server_token_view,
+    workspace_upload_view,
     workspace_view,
 )
 
@@ -43,6 +45,21 @@ workspace_view_patterns = [
         workspace_view.WorkspaceView.as_view(),
         name="workspaces_with_id",
     ),
+    path(
+        "<int:workspace_id>/uploads/",
+        workspace_upload_view.WorkspaceUploadView.as_view(),
+        name="workspace_uploads",
+    ),
+    path(
+        "<int:workspace_id>/uploads/<int:upload_id>/",
+        workspace_upload_view.WorkspaceUploadView.as_view(),
+        name="workspace_uploads_with_id",
+    ),
+    path(
+        "<int:workspace_id>/uploads/<int:upload_id>/<str:put_type>/",
+        workspace_upload_view.WorkspaceUploadView.as_view(),
+        name="workspace_uploads_put_type",
+    ),
     path(
         "<int:workspace_id>/<str:put_type>/",
         workspace_view.WorkspaceView.as_view(),
@@ -64,18 +81,18 @@ parameter_view_patterns = [
     path("", parameter_view.ParameterView.as_view(), name="parameters"),
 ]
 
-# passthrough_view_patterns = [
-#     path(
-#         "<str:hostname>/<int:job_id>/",
-#         passthrough_view.PassthroughView.as_view(),
-#         name="passthrough",
-#     ),
-#     path(
-#         "<str:hostname>/<int:job_id>/<path:remainder>",
-#         passthrough_view.PassthroughView.as_view(),
-#         name="passthrough_remainder",
-#     ),
-# ]
+passthrough_view_patterns = [
+    path(
+        "<str:hostname>/<int:job_id>/",
+        passthrough_view.PassthroughView.as_view(),
+        name="passthrough",
+    ),
+    path(
+        "<str:hostname>/<int:job_id>/<path:remainder>",
+        passthrough_view.PassthroughView.as_view(),
+        name="passthrough_remainder",
+    ),
+]
 
 user_view_patterns = [
     path(
@@ -104,11 +121,12 @@ shared_workspace_view_patterns = [
 ]
 
 urlpatterns = [
+    path("metrics", metrics.metrics_view, name="metrics"),
     path("tokens/", include(token_view_patterns)),
     path("workspaces/", include(workspace_view_patterns)),
     path("jobs/", include(job_view_patterns)),
     path("job_types/", include(job_type_view_patterns)),
-    # path("passthrough/", include(passthrough_view_patterns)),
+    path("passthrough/", include(passthrough_view_patterns)),
     path("parameters/", include(parameter_view_patterns)),
     path("users/", include(user_view_patterns)),
     path("shared_workspaces/", include(shared_workspace_view_patterns)),
@@ -121,6 +139,11 @@ ws_urlpatterns = [
         ws_consumers.PassthroughConsumer.as_asgi(),
         name="ws_passthrough",
     ),
-    path("jobs/", ws_consumers.JobStatusConsumer.as_asgi(), name="ws_jobs"),
+    path("jobs/", ws_consumers.UserStatusConsumer.as_asgi(), name="ws_jobs"),
     path("jobs/<int:job_id>/", ws_consumers.JobStatusConsumer.as_asgi(), name="ws_job"),
+    path(
+        "workspaces/<int:workspace_id>/",
+        ws_consumers.WorkspaceStatusConsumer.as_asgi(),
+        name="ws_workspace",
+    ),
 ]
@@ -1,3 +1,19 @@
+import base64
+import contextvars
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests as http_r
+from django.db import connection, connections
+from django.db.models import Q
+from requests.adapters import HTTPAdapter
+from rest_framework.exceptions import ParseError
+from urllib3.util.retry import Retry
+
+from . import metrics, tracing
+
+
 def translate_class_to_module(class_name):
     translation = {
         "SlurmAPIResource": "slurm_api_resource",
@@ -31,3 +47,193 @@ def generate_controller_object(class_name, module_type, params):
         return o
     except Exception as e:
         raise e
+
+
+def parse_range_header(range_header, size):
+    # Parses a single "bytes=start-end" range. Returns (start, end), an empty tuple when the header
+    # should be ignored (e.g. multiple ranges) and None when the range can't be satisfied.
+    unit, _, ranges = range_header.partition("=")
+    if unit.strip() != "bytes" or "," in ranges:
+        return ()
+
+    start, _, end = ranges.strip().partition("-")
+    try:
+        if not start:
+            # Suffix range, the last n bytes
+            length = int(end)
+            if length <= 0:
+                return None
+            return max(size - length, 0), size - 1
+        start = int(start)
+        end = int(end) if end else size - 1
+    except ValueError:
+        return ()
+
+    if start >= size or end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def get_merge_patch(old, new):
+    # JSON merge patch (RFC 7396) turning old into new, removed keys are set to None.
+    patch = {key: None for key in old.keys() - new.keys()}
+    for key, value in new.items():
+        if key not in old:
+            patch[key] = value
+        elif old[key] != value:
+            patch[key] = (
+                get_merge_patch(old[key], value)
+                if isinstance(old[key], dict) and isinstance(value, dict)
+                else value
+            )
+    return patch
+
+
+def get_projection_fields(params, dict_fields):
+    # fields=a,b limits the returned columns, IE to leave out the large JSON details.
+    if "fields" not in params:
+        return dict_fields
+
+    fields = [field for field in params["fields"].split(",") if field]
+    if invalid_fields := set(fields) - set(dict_fields):
+        raise ParseError(f"Invalid fields: {', '.join(sorted(invalid_fields))}.")
+    return ["id"] + [field for field in fields if field != "id"]
+
+
+def encode_cursor(values):
+    # Datetimes keep their microseconds, the cursor has to match the last row exactly.
+    return base64.urlsafe_b64encode(
+        json.dumps(values, default=lambda value: value.isoformat()).encode()
+    ).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ParseError("Invalid cursor.")
+
+
+def paginate_queryset(queryset, params, fields, ordering_fields, max_limit=500):
+    # Keyset pagination over (ordering field, id): each page starts right after the last row of
+    # the previous one, so the cost of a page does not grow with how far in it is.
+    # Returns the page of rows and the cursor for the next page, None on the last page.
+    ordering = params.get("ordering", "id")
+    ordering_field = ordering.lstrip("-")
+    if ordering_field not in ordering_fields:
+        raise ParseError(f"Invalid ordering, must be one of {', '.join(ordering_fields)}.")
+    lookup = "lt" if ordering.startswith("-") else "gt"
+
+    try:
+        limit = int(params.get("limit", 100))
+    except ValueError:
+        raise ParseError("Limit must be an integer.")
+    if not 0 < limit <= max_limit:
+        raise ParseError(f"Limit must be between 1 and {max_limit}.")
+
+    queryset = queryset.order_by(ordering, f"{ordering[:-len(ordering_field)]}id")
+
+    if cursor := params.get("cursor"):
+        cursor_values = decode_cursor(cursor)
+        if not isinstance(cursor_values, list) or len(cursor_values) != 3:
+            raise ParseError("Invalid cursor.")
+        cursor_ordering, value, last_id = cursor_values
+        if cursor_ordering != ordering:
+            raise ParseError("Cursor was created with a different ordering.")
+
+        if ordering_field == "id":
+            queryset = queryset.filter(**{f"id__{lookup}": last_id})
+        else:
+            queryset = queryset.filter(
+                Q(**{f"{ordering_field}__{lookup}": value})
+                | Q(**{ordering_field: value, f"id__{lookup}": last_id})
+            )
+
+    rows = list(
+        queryset.values(*fields, *([ordering_field] if ordering_field not in fields else []))[
+            : limit + 1
+        ]
+    )
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([ordering, rows[-1][ordering_field], rows[-1]["id"]])
+
+    if ordering_field not in fields:
+        for row in rows:
+            row.pop(ordering_field)
+
+    return rows, next_cursor
+
+
+def map_concurrently(func, items, max_workers=8):
+    # For calls that mostly wait on other services, IE user lookups. Returns the results in the
+    # order of items. Threads use their own database connections, which cannot see the rows of a
+    # transaction open in this one, so inside one the calls run here one by one instead.
+    if connection.in_atomic_block or len(items) < 2:
+        return [func(item) for item in items]
+
+    def call(item):
+        try:
+            return func(item)
+        finally:
+            # This thread opened its own database connection, don't leak it.
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Each call keeps the caller's context, so its spans nest under the current one.
+        futures = [executor.submit(contextvars.copy_context().run, call, item) for item in items]
+        return [future.result() for future in futures]
+
+
+class TimeoutSession(http_r.Session):
+    def __init__(self, timeout=None):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        start = time.perf_counter()
+        status = None
+        with tracing.span(
+            f"HTTP {method.upper()}", {"http.method": method.upper(), "http.url": str(url)}
+        ) as request_span:
+            if traceparent := tracing.get_traceparent():
+                kwargs["headers"] = {**(kwargs.get("headers") or {}), "traceparent": traceparent}
+            try:
+                response = super().request(method, url, **kwargs)
+                status = response.status_code
+                request_span.attributes["http.status_code"] = status
+                return response
+            finally:
+                metrics.observe_http_client_request(
+                    method.upper(), url, time.perf_counter() - start, status
+                )
+
+
+def generate_http_session(connection_details):
+    # Each controller gets its own pooled, keep-alive session so repeated calls to the same
+    # host reuse connections. Only idempotent methods are retried.
+    session_config = connection_details.get("http_session", {})
+    session = TimeoutSession(
+        timeout=(
+            session_config.get("connect_timeout", 5),
+            session_config.get("read_timeout", 60),
+        )
+    )
+    retries = Retry(
+        total=session_config.get("retries", 3),
+        backoff_factor=session_config.get("backoff_factor", 0.5),
+        status_forcelist=session_config.get("retry_statuses", [502, 503, 504]),
+        allowed_methods=["HEAD", "GET", "PUT", "DELETE", "OPTIONS"],
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=session_config.get("pool_connections", 10),
+        pool_maxsize=session_config.get("pool_maxsize", 20),
+        max_retries=retries,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
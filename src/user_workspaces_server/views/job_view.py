@@ -1,21 +1,32 @@
 import logging
 
+from django.db.models import Avg, Count, Max, Min
+from django.db.models.functions import Trunc
 from django.http import JsonResponse
+from django.utils.dateparse import parse_datetime
 from django_q.tasks import async_task
-from rest_framework.exceptions import NotFound
+from rest_framework.exceptions import NotFound, ParseError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
 
-from user_workspaces_server import models
+from user_workspaces_server import models, utils
 from user_workspaces_server.exceptions import WorkspaceClientException
 
 logger = logging.getLogger(__name__)
 
+# Job metrics are downsampled into buckets of one of these lengths.
+METRIC_INTERVALS = ["minute", "hour", "day"]
+
 
 class JobView(APIView):
     permission_classes = [IsAuthenticated]
 
-    def get(self, request, job_id=None):
+    def get(self, request, job_id=None, put_type=None):
+        if put_type:
+            if put_type.lower() == "metrics":
+                return self.metrics(request, job_id)
+            raise WorkspaceClientException("Invalid GET type passed.")
+
         job = models.Job.objects.filter(workspace_id__user_id=request.user)
 
         if job_id:
@@ -24,10 +35,18 @@ class JobView(APIView):
             for key in set(params.keys()).intersection(set(models.Job.get_query_param_fields())):
                 job = job.filter(**{key: params[key]})
 
-        jobs = list(job.all().values(*models.Job.get_dict_fields()))
+        fields = utils.get_projection_fields(request.GET, models.Job.get_dict_fields())
 
         response = {"message": "Successful.", "success": True, "data": {"jobs": []}}
 
+        # Paging is opt-in, without limit or cursor every matching job is returned.
+        if "limit" in request.GET or "cursor" in request.GET:
+            jobs, response["data"]["next_cursor"] = utils.paginate_queryset(
+                job, request.GET, fields, models.Job.get_ordering_fields()
+            )
+        else:
+            jobs = list(job.values(*fields))
+
         if jobs:
             response["data"]["jobs"] = jobs
         else:
@@ -35,6 +54,45 @@ class JobView(APIView):
 
         return JsonResponse(response)
 
+    def metrics(self, request, job_id):
+        try:
+            job = models.Job.objects.get(workspace_id__user_id=request.user, id=job_id)
+        except models.Job.DoesNotExist:
+            raise NotFound(f"Job {job_id} not found for user.")
+
+        interval = request.GET.get("interval", "minute").lower()
+        if interval not in METRIC_INTERVALS:
+            raise ParseError(f"Invalid interval, must be one of {', '.join(METRIC_INTERVALS)}.")
+
+        job_metrics = models.JobMetric.objects.filter(job_id=job)
+        for param, lookup in [("start", "datetime_created__gte"), ("end", "datetime_created__lt")]:
+            if value := request.GET.get(param):
+                if (param_datetime := parse_datetime(value)) is None:
+                    raise ParseError(f"Invalid {param}, must be an ISO 8601 datetime.")
+                job_metrics = job_metrics.filter(**{lookup: param_datetime})
+
+        job_metrics = (
+            job_metrics.annotate(datetime=Trunc("datetime_created", interval))
+            .values("datetime")
+            .annotate(
+                samples=Count("id"),
+                cpu_time_max=Max("cpu_time"),
+                cpus_max=Max("cpus"),
+                memory_mean=Avg("memory"),
+                memory_max=Max("memory"),
+                time_left_min=Min("time_left"),
+            )
+            .order_by("datetime")
+        )
+
+        return JsonResponse(
+            {
+                "message": "Successful.",
+                "success": True,
+                "data": {"interval": interval, "metrics": list(job_metrics)},
+            }
+        )
+
     def put(self, request, job_id, put_type):
         try:
             job = models.Job.objects.get(workspace_id__user_id=request.user, id=job_id)
@@ -55,6 +113,8 @@ class JobView(APIView):
                 raise WorkspaceClientException("This job is not running or pending.")
 
             job.status = models.Job.Status.STOPPING
+            # Make sure the poller checks on the stop right away rather than after its backoff.
+            job.datetime_next_status_update = None
             job.save()
             async_task("user_workspaces_server.tasks.stop_job", job.pk)
             return JsonResponse({"message": "Job queued to stop.", "success": True})
@@ -1,82 +1,113 @@
 import logging
 
-import requests as http_r
-from django.http import HttpResponse
-from rest_framework.exceptions import APIException
-from rest_framework.views import APIView
+import httpx
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 
-from user_workspaces_server import models
+from user_workspaces_server import passthrough_routes
+from user_workspaces_server.auth import aget_request_user
 
 logger = logging.getLogger(__name__)
 
+# Headers that only apply to a single connection and must not be forwarded.
+HOP_BY_HOP_HEADERS = {
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailer",
+    "transfer-encoding",
+    "upgrade",
+}
 
-class PassthroughView(APIView):
-    permission_classes = []
+http_client = None
 
-    def get(self, request, hostname, job_id, remainder=None):
-        try:
-            job_model = models.Job.objects.get(pk=job_id)
-            proxy_details = job_model.job_details["current_job_details"]["proxy_details"]
-            port = proxy_details["port"]
-            url = f'{request.scheme}://{hostname}:{port}{request.path}?{request.META.get("QUERY_STRING")}'
-            response = http_r.get(url, cookies=request.COOKIES, headers=request.headers)
-            return HttpResponse(response, headers=response.headers, status=response.status_code)
-        except Exception:
-            logger.exception("Passthrough GET failure")
-            raise APIException
-
-    def post(self, request, hostname, job_id, remainder=None):
-        try:
-            job_model = models.Job.objects.get(pk=job_id)
-            proxy_details = job_model.job_details["current_job_details"]["proxy_details"]
-            port = proxy_details["port"]
-            url = f'{request.scheme}://{hostname}:{port}{request.path}?{request.META.get("QUERY_STRING")}'
-            response = http_r.post(
-                url, data=request.body, cookies=request.COOKIES, headers=request.headers
-            )
-            return HttpResponse(response, headers=response.headers, status=response.status_code)
-        except Exception:
-            logger.exception("Passthrough POST failure")
-            raise APIException
 
-    def patch(self, request, hostname, job_id, remainder=None):
-        try:
-            job_model = models.Job.objects.get(pk=job_id)
-            proxy_details = job_model.job_details["current_job_details"]["proxy_details"]
-            port = proxy_details["port"]
-            url = f'{request.scheme}://{hostname}:{port}{request.path}?{request.META.get("QUERY_STRING")}'
-            response = http_r.patch(
-                url, data=request.body, cookies=request.COOKIES, headers=request.headers
+def get_http_client():
+    # One pooled client per process, created lazily so it belongs to the server's event loop.
+    global http_client
+    if http_client is None:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=1000, max_keepalive_connections=200),
+            timeout=httpx.Timeout(10, read=None, write=None),
+        )
+    return http_client
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class PassthroughView(View):
+    # Streams requests and responses between the client and a job's web server. Bodies are
+    # passed on in chunks as they are consumed, so nothing is buffered in full.
+    async def proxy(self, request, hostname, job_id, remainder=None):
+        user = await aget_request_user(request)
+        if not user.is_authenticated:
+            return JsonResponse(
+                {"success": False, "message": "Authentication credentials were not provided."},
+                status=403,
             )
-            return HttpResponse(response, headers=response.headers, status=response.status_code)
-        except Exception:
-            logger.exception("Passthrough PATCH failure")
-            raise APIException
 
-    def put(self, request, hostname, job_id, remainder=None):
-        try:
-            job_model = models.Job.objects.get(pk=job_id)
-            proxy_details = job_model.job_details["current_job_details"]["proxy_details"]
-            port = proxy_details["port"]
-            url = f'{request.scheme}://{hostname}:{port}{request.path}?{request.META.get("QUERY_STRING")}'
-            response = http_r.put(
-                url, data=request.body, cookies=request.COOKIES, headers=request.headers
+        route = await passthrough_routes.get_route(job_id)
+        # Only the job's own host can be reached through its passthrough.
+        if route is None or route.hostname != hostname:
+            return JsonResponse(
+                {"success": False, "message": f"No passthrough available for job {job_id}."},
+                status=404,
             )
-            return HttpResponse(response, headers=response.headers, status=response.status_code)
-        except Exception:
-            logger.exception("Passthrough PUT failure")
-            raise APIException
+        # And only by the job's owner.
+        if route.user_id != user.pk:
+            return JsonResponse(
+                {"success": False, "message": f"Job {job_id} belongs to another user."},
+                status=403,
+            )
+
+        url = f"{request.scheme}://{hostname}:{route.port}{request.path}"
+        headers = [
+            (name, value)
+            for name, value in request.headers.items()
+            if name.lower() not in HOP_BY_HOP_HEADERS | {"host", "content-length"}
+        ]
+
+        async def request_body():
+            # Django has already spooled the body, read it back in chunks.
+            while chunk := request.read(64 * 1024):
+                yield chunk
+
+        client = get_http_client()
+        upstream_request = client.build_request(
+            request.method,
+            url,
+            params=request.META.get("QUERY_STRING", ""),
+            headers=headers,
+            content=request_body() if request.method not in ["GET", "HEAD"] else None,
+        )
 
-    def delete(self, request, hostname, job_id, remainder=None):
         try:
-            job_model = models.Job.objects.get(pk=job_id)
-            proxy_details = job_model.job_details["current_job_details"]["proxy_details"]
-            port = proxy_details["port"]
-            url = f'{request.scheme}://{hostname}:{port}{request.path}?{request.META.get("QUERY_STRING")}'
-            response = http_r.delete(
-                url, data=request.body, cookies=request.COOKIES, headers=request.headers
+            upstream_response = await client.send(upstream_request, stream=True)
+        except httpx.HTTPError:
+            logger.exception(f"Passthrough {request.method} failure")
+            passthrough_routes.evict_route(job_id)
+            return JsonResponse(
+                {"success": False, "message": "Job web server could not be reached."},
+                status=502,
             )
-            return HttpResponse(response, headers=response.headers, status=response.status_code)
-        except Exception:
-            logger.exception("Passthrough DELETE failure")
-            raise APIException
+
+        async def response_body():
+            # Each chunk is only read from upstream once the client has taken the previous one.
+            try:
+                async for chunk in upstream_response.aiter_raw():
+                    yield chunk
+            finally:
+                await upstream_response.aclose()
+
+        response = StreamingHttpResponse(response_body(), status=upstream_response.status_code)
+        for name, value in upstream_response.headers.multi_items():
+            if name.lower() == "set-cookie":
+                response.cookies.load(value)
+            elif name.lower() not in HOP_BY_HOP_HEADERS:
+                response.headers[name] = value
+        return response
+
+    get = post = put = patch = delete = head = options = proxy
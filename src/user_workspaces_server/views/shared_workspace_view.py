@@ -4,6 +4,7 @@ from datetime import datetime
 
 from django.apps import apps
 from django.contrib.auth.models import User
+from django.db import transaction
 from django.http import JsonResponse
 from django_q.tasks import async_task
 from rest_framework.exceptions import (
@@ -15,7 +16,7 @@ from rest_framework.exceptions import (
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
 
-from user_workspaces_server import models, serializers
+from user_workspaces_server import models, serializers, utils
 from user_workspaces_server.exceptions import WorkspaceClientException
 
 logger = logging.getLogger(__name__)
@@ -31,13 +32,15 @@ class SharedWorkspaceView(APIView):
         # We need to filter based on whether they've been accepted or not
         # We need to allow for a single shared workspace to be returned
 
-        original_workspaces = models.SharedWorkspaceMapping.objects.filter(
-            original_workspace_id__user_id=request.user
+        # Both workspaces of a mapping and their users are serialized, joining them here keeps
+        # the listing to one query per direction however many shares there are.
+        mappings = models.SharedWorkspaceMapping.objects.select_related(
+            "original_workspace_id__user_id", "shared_workspace_id__user_id"
         )
 
-        shared_workspaces = models.SharedWorkspaceMapping.objects.filter(
-            shared_workspace_id__user_id=request.user
-        )
+        original_workspaces = mappings.filter(original_workspace_id__user_id=request.user)
+
+        shared_workspaces = mappings.filter(shared_workspace_id__user_id=request.user)
 
         if shared_workspace_id:
             shared_workspaces = shared_workspaces.filter(
@@ -103,10 +106,14 @@ class SharedWorkspaceView(APIView):
         ):
             raise ParseError("Invalid user id provided.")
 
-        for user in shared_users:
-            # Check whether user has permission
-            main_storage = apps.get_app_config("user_workspaces_server").main_storage
-            if not main_storage.storage_user_authentication.has_permission(user):
+        # Check whether users have permission, these can be slow lookups in other services
+        main_storage = apps.get_app_config("user_workspaces_server").main_storage
+        shared_users = list(shared_users)
+        permissions = utils.map_concurrently(
+            main_storage.storage_user_authentication.has_permission, shared_users
+        )
+        for user, permission in zip(shared_users, permissions):
+            if not permission:
                 raise WorkspaceClientException(
                     f"User {user.first_name} {user.last_name} does not have permission on the file system."
                 )
@@ -132,35 +139,34 @@ class SharedWorkspaceView(APIView):
 
         shared_workspace_data = {
             "original_workspace_id": workspace,
-            "shared_workspace_id": None,
             "last_resource_options": {} if latest_job is None else latest_job.resource_options,
             "last_job_type": "" if latest_job is None else latest_job.job_type,
             "is_accepted": False,
         }
 
-        shared_workspaces_created = []
-        for user in shared_users:
-            # Prepare workspace model creation
-            workspace_data_copy = workspace_data.copy()
-            workspace_data_copy["user_id"] = user
-            new_workspace = models.Workspace.objects.create(**workspace_data_copy)
-
-            # Create shared workspace mapping
-            shared_workspace_data_copy = shared_workspace_data.copy()
-            shared_workspace_data_copy["shared_workspace_id"] = new_workspace
-            shared_workspace_data_copy["datetime_share_created"] = datetime.now()
-            shared_workspace = models.SharedWorkspaceMapping.objects.create(
-                **shared_workspace_data_copy
+        with transaction.atomic():
+            new_workspaces = models.Workspace.objects.bulk_create(
+                [models.Workspace(user_id=user, **workspace_data) for user in shared_users]
+            )
+            shared_workspaces_created = models.SharedWorkspaceMapping.objects.bulk_create(
+                [
+                    models.SharedWorkspaceMapping(
+                        shared_workspace_id=new_workspace,
+                        datetime_share_created=datetime.now(),
+                        **shared_workspace_data,
+                    )
+                    for new_workspace in new_workspaces
+                ]
             )
-            shared_workspaces_created.append(shared_workspace)
 
-        for shared_workspace_created in shared_workspaces_created:
+        if shared_workspaces_created:
             logger.info(
-                f"Shared workspace created, sending to initialize: {shared_workspace_created}"
+                f"Shared workspaces created, sending to initialize: {shared_workspaces_created}"
             )
+            # A single task clones the original workspace to every user it is shared with.
             async_task(
-                "user_workspaces_server.tasks.initialize_shared_workspace",
-                shared_workspace_created.pk,
+                "user_workspaces_server.tasks.initialize_shared_workspaces",
+                [shared_workspace.pk for shared_workspace in shared_workspaces_created],
                 cluster="long",
             )
 
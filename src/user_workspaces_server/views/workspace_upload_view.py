@@ -0,0 +1,228 @@
+import json
+import logging
+from datetime import datetime
+
+from django.apps import apps
+from django.db import transaction
+from django.forms.models import model_to_dict
+from django.http import JsonResponse
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
+
+from user_workspaces_server import models
+from user_workspaces_server.exceptions import (
+    LengthRequiredException,
+    WorkspaceClientException,
+)
+from user_workspaces_server.tasks import async_update_workspace
+
+logger = logging.getLogger(__name__)
+
+
+class WorkspaceUploadView(APIView):
+    # Chunked, resumable uploads: POST to initiate, PUT the body at ?offset=, PUT complete.
+    permission_classes = [IsAuthenticated]
+
+    def get_workspace(self, request, workspace_id):
+        try:
+            workspace = models.Workspace.objects.get(id=workspace_id, user_id=request.user)
+        except models.Workspace.DoesNotExist:
+            raise NotFound(f"Workspace {workspace_id} not found for user.")
+
+        if models.SharedWorkspaceMapping.objects.filter(
+            shared_workspace_id=workspace, is_accepted=False
+        ).exists():
+            raise WorkspaceClientException(
+                f"Workspace {workspace_id} is a shared workspace and has not been accepted."
+            )
+
+        return workspace
+
+    def get_upload(self, workspace, upload_id, for_update=False):
+        uploads = models.WorkspaceUpload.objects.filter(workspace_id=workspace)
+        if for_update:
+            uploads = uploads.select_for_update()
+        try:
+            return uploads.get(id=upload_id)
+        except models.WorkspaceUpload.DoesNotExist:
+            raise NotFound(f"Upload {upload_id} not found for workspace {workspace.id}.")
+
+    def get(self, request, workspace_id, upload_id=None):
+        workspace = self.get_workspace(request, workspace_id)
+
+        uploads = models.WorkspaceUpload.objects.filter(workspace_id=workspace)
+        if upload_id:
+            uploads = uploads.filter(id=upload_id)
+
+        return JsonResponse(
+            {
+                "message": "Successful.",
+                "success": True,
+                "data": {
+                    "uploads": list(uploads.values(*models.WorkspaceUpload.get_dict_fields()))
+                },
+            }
+        )
+
+    def post(self, request, workspace_id):
+        workspace = self.get_workspace(request, workspace_id)
+        main_storage = apps.get_app_config("user_workspaces_server").main_storage
+
+        try:
+            body = json.loads(request.body)
+        except Exception as e:
+            raise ParseError(f"Invalid JSON: {str(e)}")
+
+        file_name = body.get("name", "").lstrip("/")
+        if not file_name:
+            raise ParseError("Missing name.")
+        if ".." in file_name:
+            raise ParseError("File name cannot contain double dots.")
+
+        file_size = body.get("size")
+        if file_size is not None and (not isinstance(file_size, int) or file_size < 0):
+            raise ParseError("Size must be a non-negative integer.")
+
+        upload = models.WorkspaceUpload(
+            user_id=request.user,
+            workspace_id=workspace,
+            file_name=file_name,
+            file_size=file_size,
+            datetime_created=datetime.now(),
+        )
+        upload.save()
+
+        try:
+            main_storage.create_upload_file(workspace.file_path, file_name, upload.pk)
+        except Exception:
+            upload.delete()
+            raise
+
+        return JsonResponse(
+            {
+                "message": "Successful.",
+                "success": True,
+                "data": {
+                    "upload": model_to_dict(upload, models.WorkspaceUpload.get_dict_fields())
+                },
+            }
+        )
+
+    def put(self, request, workspace_id, upload_id, put_type=None):
+        workspace = self.get_workspace(request, workspace_id)
+        main_storage = apps.get_app_config("user_workspaces_server").main_storage
+
+        if not put_type:
+            upload = self.get_upload(workspace, upload_id)
+            if upload.status != models.WorkspaceUpload.Status.IN_PROGRESS:
+                raise WorkspaceClientException(f"Upload {upload_id} is already complete.")
+
+            try:
+                offset = int(request.GET.get("offset", upload.bytes_received))
+            except ValueError:
+                raise ParseError("Offset must be an integer.")
+
+            # Chunks can be resent, but not leave a gap.
+            if offset < 0 or offset > upload.bytes_received:
+                raise WorkspaceClientException(
+                    f"Invalid offset {offset}, {upload.bytes_received} bytes received so far."
+                )
+
+            # Without a length the request stream reads as empty, and the chunk would be lost.
+            if not request.META.get("CONTENT_LENGTH"):
+                raise LengthRequiredException()
+            try:
+                content_length = int(request.META["CONTENT_LENGTH"])
+            except ValueError:
+                raise ParseError("Content-Length must be an integer.")
+            if content_length < 0:
+                raise ParseError("Content-Length must not be negative.")
+            if upload.file_size is not None and offset + content_length > upload.file_size:
+                raise WorkspaceClientException(
+                    f"Upload {upload_id} is larger than the declared size."
+                )
+
+            # The chunk is written without holding the upload's row lock, writes land at their
+            # own offset so chunks of the same upload can be written in parallel.
+            end_offset = offset
+            if request.stream is not None:
+                end_offset = main_storage.write_upload_chunk(
+                    workspace.file_path, upload.file_name, upload.pk, offset, request.stream
+                )
+
+            with transaction.atomic():
+                upload = self.get_upload(workspace, upload_id, for_update=True)
+                if upload.status != models.WorkspaceUpload.Status.IN_PROGRESS:
+                    raise WorkspaceClientException(f"Upload {upload_id} is already complete.")
+
+                upload.bytes_received = max(upload.bytes_received, end_offset)
+                upload.datetime_last_modified = datetime.now()
+                upload.save()
+
+            return JsonResponse(
+                {
+                    "message": "Successful chunk upload.",
+                    "success": True,
+                    "data": {
+                        "upload": model_to_dict(upload, models.WorkspaceUpload.get_dict_fields())
+                    },
+                }
+            )
+        elif put_type.lower() == "complete":
+            external_user_mapping = main_storage.storage_user_authentication.has_permission(
+                request.user
+            )
+
+            if not external_user_mapping:
+                raise WorkspaceClientException(
+                    "User could not be found/created on main storage system."
+                )
+
+            with transaction.atomic():
+                upload = self.get_upload(workspace, upload_id, for_update=True)
+                if upload.status != models.WorkspaceUpload.Status.IN_PROGRESS:
+                    raise WorkspaceClientException(f"Upload {upload_id} is already complete.")
+
+                if upload.file_size is not None and upload.bytes_received != upload.file_size:
+                    raise WorkspaceClientException(
+                        f"Upload {upload_id} is incomplete, {upload.bytes_received} of "
+                        f"{upload.file_size} bytes received."
+                    )
+
+                main_storage.complete_upload_file(
+                    workspace.file_path, upload.file_name, upload.pk, external_user_mapping
+                )
+
+                upload.status = models.WorkspaceUpload.Status.COMPLETE
+                upload.datetime_last_modified = datetime.now()
+                upload.save()
+
+            workspace.datetime_last_modified = datetime.now()
+            workspace.save()
+
+            # Only the directory holding the new file has changed, so the rescan is cheap.
+            async_update_workspace(workspace.pk)
+
+            return JsonResponse(
+                {
+                    "message": "Successful upload.",
+                    "success": True,
+                    "data": {
+                        "upload": model_to_dict(upload, models.WorkspaceUpload.get_dict_fields())
+                    },
+                }
+            )
+        else:
+            raise WorkspaceClientException("Invalid PUT type passed.")
+
+    def delete(self, request, workspace_id, upload_id):
+        workspace = self.get_workspace(request, workspace_id)
+        main_storage = apps.get_app_config("user_workspaces_server").main_storage
+
+        upload = self.get_upload(workspace, upload_id)
+        if upload.status == models.WorkspaceUpload.Status.IN_PROGRESS:
+            main_storage.delete_upload_file(workspace.file_path, upload.file_name, upload.pk)
+        upload.delete()
+
+        return JsonResponse({"message": "Successful deletion.", "success": True})
@@ -6,23 +6,54 @@ from datetime import datetime
 from django.apps import apps
 from django.conf import settings
 from django.forms.models import model_to_dict
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
 from django_q.tasks import async_task
 from rest_framework.exceptions import APIException, NotFound, ParseError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
 
-from user_workspaces_server import models, utils
+from user_workspaces_server import models, tracing, utils
 from user_workspaces_server.exceptions import WorkspaceClientException
-from user_workspaces_server.tasks import async_update_workspace
+from user_workspaces_server.tasks import (
+    async_set_workspace_ownership,
+    async_update_workspace,
+    subscribe_user_status,
+)
 
 logger = logging.getLogger(__name__)
 
 
+def add_current_workspace_details(workspaces):
+    # Scanned files and symlinks are stored as WorkspaceFile rows, they are put back into
+    # workspace_details for clients in a single query.
+    current_details = {workspace["id"]: {"files": [], "symlinks": []} for workspace in workspaces}
+    for workspace_id, name, file_type in (
+        models.WorkspaceFile.objects.filter(workspace_id__in=current_details)
+        .order_by("id")
+        .values_list("workspace_id", "name", "file_type")
+    ):
+        key = "files" if file_type == models.WorkspaceFile.FileType.FILE else "symlinks"
+        current_details[workspace_id][key].append({"name": name})
+
+    for workspace in workspaces:
+        if isinstance(workspace["workspace_details"], dict):
+            workspace["workspace_details"]["current_workspace_details"] = current_details[
+                workspace["id"]
+            ]
+
+
 class WorkspaceView(APIView):
     permission_classes = [IsAuthenticated]
 
-    def get(self, request, workspace_id=None):
+    def get(self, request, workspace_id=None, put_type=None):
+        if put_type:
+            if put_type.lower() == "download":
+                return self.download(request, workspace_id)
+            if put_type.lower() == "files":
+                return self.files(request, workspace_id)
+            raise WorkspaceClientException("Invalid GET type passed.")
+
         workspace = models.Workspace.objects.filter(user_id=request.user)
 
         if workspace_id:
@@ -33,11 +64,8 @@ class WorkspaceView(APIView):
             ):
                 workspace = workspace.filter(**{key: params[key]})
 
-        workspaces = list(
-            workspace.exclude(shared_workspace_set__is_accepted=False)
-            .all()
-            .values(*models.Workspace.get_dict_fields())
-        )
+        workspace = workspace.exclude(shared_workspace_set__is_accepted=False)
+        fields = utils.get_projection_fields(request.GET, models.Workspace.get_dict_fields())
 
         response = {
             "message": "Successful.",
@@ -45,6 +73,17 @@ class WorkspaceView(APIView):
             "data": {"workspaces": []},
         }
 
+        # Paging is opt-in, without limit or cursor every matching workspace is returned.
+        if "limit" in request.GET or "cursor" in request.GET:
+            workspaces, response["data"]["next_cursor"] = utils.paginate_queryset(
+                workspace, request.GET, fields, models.Workspace.get_ordering_fields()
+            )
+        else:
+            workspaces = list(workspace.values(*fields))
+
+        if "workspace_details" in fields:
+            add_current_workspace_details(workspaces)
+
         if workspaces:
             response["data"]["workspaces"] = workspaces
         else:
@@ -52,6 +91,102 @@ class WorkspaceView(APIView):
 
         return JsonResponse(response)
 
+    def files(self, request, workspace_id):
+        try:
+            workspace = models.Workspace.objects.get(id=workspace_id, user_id=request.user)
+        except models.Workspace.DoesNotExist:
+            raise NotFound(f"Workspace {workspace_id} not found for user.")
+
+        workspace_files = models.WorkspaceFile.objects.filter(workspace_id=workspace)
+        for key in set(request.GET.keys()).intersection(
+            set(models.WorkspaceFile.get_query_param_fields())
+        ):
+            workspace_files = workspace_files.filter(**{key: request.GET[key]})
+
+        # Workspaces can hold far too many files for a single response, so this is always paged.
+        files, next_cursor = utils.paginate_queryset(
+            workspace_files,
+            request.GET,
+            models.WorkspaceFile.get_dict_fields(),
+            models.WorkspaceFile.get_ordering_fields(),
+        )
+
+        return JsonResponse(
+            {
+                "message": "Successful.",
+                "success": True,
+                "data": {"files": files, "next_cursor": next_cursor},
+            }
+        )
+
+    def download(self, request, workspace_id):
+        main_storage = apps.get_app_config("user_workspaces_server").main_storage
+
+        try:
+            workspace = models.Workspace.objects.get(id=workspace_id, user_id=request.user)
+        except models.Workspace.DoesNotExist:
+            raise NotFound(f"Workspace {workspace_id} not found for user.")
+
+        if models.SharedWorkspaceMapping.objects.filter(
+            shared_workspace_id=workspace, is_accepted=False
+        ).exists():
+            raise WorkspaceClientException(
+                f"Workspace {workspace_id} is a shared workspace and has not been accepted."
+            )
+
+        download_path = main_storage.get_download_path(
+            workspace.file_path, request.GET.get("path", "")
+        )
+
+        # Directories are streamed as an archive built on the fly.
+        if os.path.isdir(download_path):
+            archive_format = request.GET.get("format", "tar")
+            if archive_format not in ["tar", "zip"]:
+                raise ParseError("Format must be one of tar or zip.")
+            archive_name = f"{os.path.basename(download_path)}.{archive_format}"
+            response = StreamingHttpResponse(
+                main_storage.stream_archive(download_path, archive_format),
+                content_type="application/zip" if archive_format == "zip" else "application/x-tar",
+            )
+            response["Content-Disposition"] = content_disposition_header(True, archive_name)
+            return response
+
+        file_name = os.path.basename(download_path)
+
+        # Let nginx serve the file (including ranges) when it is set up for it.
+        if redirect := main_storage.get_download_redirect(download_path):
+            response = HttpResponse()
+            response["X-Accel-Redirect"] = redirect
+            response["Content-Disposition"] = content_disposition_header(True, file_name)
+            response["Content-Type"] = ""
+            return response
+
+        file_size = os.path.getsize(download_path)
+        start, end = 0, file_size - 1
+        status = 200
+
+        if range_header := request.headers.get("Range"):
+            byte_range = utils.parse_range_header(range_header, file_size)
+            if byte_range is None:
+                response = HttpResponse(status=416)
+                response["Content-Range"] = f"bytes */{file_size}"
+                return response
+            if byte_range:
+                start, end = byte_range
+                status = 206
+
+        response = StreamingHttpResponse(
+            main_storage.stream_file(download_path, start, end),
+            status=status,
+            content_type="application/octet-stream",
+        )
+        response["Content-Length"] = str(end - start + 1)
+        response["Accept-Ranges"] = "bytes"
+        response["Content-Disposition"] = content_disposition_header(True, file_name)
+        if status == 206:
+            response["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+        return response
+
     def post(self, request):
         try:
             body = json.loads(request.body)
@@ -86,10 +221,7 @@ class WorkspaceView(APIView):
             "description": body["description"],
             "disk_space": 0,
             "datetime_created": datetime.now(),
-            "workspace_details": {
-                "request_workspace_details": request_workspace_details,
-                "current_workspace_details": {"files": [], "symlinks": []},
-            },
+            "workspace_details": {"request_workspace_details": request_workspace_details},
             "status": "initializing",
             "default_job_type": default_job_type,
         }
@@ -131,10 +263,13 @@ class WorkspaceView(APIView):
             main_storage.set_ownership(
                 external_user_mapping.external_username, external_user_mapping
             )
-            main_storage.set_ownership(workspace.file_path, external_user_mapping, recursive=True)
+            if not main_storage.async_set_ownership:
+                main_storage.set_ownership(
+                    workspace.file_path, external_user_mapping, recursive=True
+                )
 
-            # TODO: Set workspace status to idle
-            workspace.status = "idle"
+                # TODO: Set workspace status to idle
+                workspace.status = "idle"
             workspace.save()
         except Exception:
             # If there was a failure here, then we need to delete this workspace
@@ -142,15 +277,22 @@ class WorkspaceView(APIView):
             workspace.delete()
             raise
 
-        async_update_workspace(workspace.pk)
+        # The ownership task sets the workspace to idle once it is done.
+        if main_storage.async_set_ownership:
+            async_set_workspace_ownership(workspace.pk)
+        else:
+            async_update_workspace(workspace.pk)
+
+        subscribe_user_status(request.user.pk, "workspace", workspace.pk)
+
+        workspace_dict = model_to_dict(workspace, models.Workspace.get_dict_fields())
+        add_current_workspace_details([workspace_dict])
 
         return JsonResponse(
             {
                 "message": "Successful.",
                 "success": True,
-                "data": {
-                    "workspace": model_to_dict(workspace, models.Workspace.get_dict_fields())
-                },
+                "data": {"workspace": workspace_dict},
             }
         )
 
@@ -209,36 +351,38 @@ class WorkspaceView(APIView):
             try:
                 main_storage.create_symlinks(workspace, workspace_details)
                 main_storage.create_files(workspace, workspace_details)
-                main_storage.set_ownership(
-                    workspace.file_path, external_user_mapping, recursive=True
-                )
+                if not main_storage.async_set_ownership:
+                    main_storage.set_ownership(
+                        workspace.file_path, external_user_mapping, recursive=True
+                    )
             except Exception:
                 logger.exception("Failure when creating symlink/files or setting ownership.")
                 raise
 
-            workspace.workspace_details["current_workspace_details"]["files"] = [
-                {"name": file_name}
-                for file_name in {
-                    (file["name"] if file["name"][0] == "/" else f"/{file['name']}")
-                    for file in workspace_details.get("files", [])
-                    + workspace.workspace_details["current_workspace_details"]["files"]
-                }
-            ]
-
-            workspace.workspace_details["current_workspace_details"]["symlinks"] = [
-                {"name": symlink_name}
-                for symlink_name in {
-                    (symlink["name"] if symlink["name"][0] == "/" else f"/{symlink['name']}")
-                    for symlink in workspace_details.get("symlinks", [])
-                    + workspace.workspace_details["current_workspace_details"]["symlinks"]
-                }
-            ]
+            # Listed right away, the scan that follows fills in the rest.
+            models.WorkspaceFile.objects.bulk_create(
+                [
+                    models.WorkspaceFile(
+                        workspace_id=workspace,
+                        name=entry["name"] if entry["name"][0] == "/" else f"/{entry['name']}",
+                        file_type=file_type,
+                    )
+                    for file_type, key in [
+                        (models.WorkspaceFile.FileType.FILE, "files"),
+                        (models.WorkspaceFile.FileType.SYMLINK, "symlinks"),
+                    ]
+                    for entry in workspace_details.get(key, [])
+                ],
+                ignore_conflicts=True,
+            )
 
             workspace.datetime_last_modified = datetime.now()
             workspace.save()
 
-            logger.info(workspace.workspace_details)
-            async_update_workspace(workspace.pk)
+            if main_storage.async_set_ownership:
+                async_set_workspace_ownership(workspace.pk)
+            else:
+                async_update_workspace(workspace.pk)
 
             return JsonResponse({"message": "Update successful.", "success": True})
         if put_type.lower() == "start":
@@ -325,22 +469,19 @@ class WorkspaceView(APIView):
                     "Job Type improperly configured. Please contact a system administrator to resolve this."
                 )
 
-            resource_job_id = resource.launch_job(job_to_launch, workspace, resource_options)
+            with tracing.span("launch_job", {"job.id": job.pk, "job.type": job.job_type}):
+                resource_job_id = resource.launch_job(job_to_launch, workspace, resource_options)
 
+            # The job status poller picks the job up on its next cycle.
             job.resource_job_id = resource_job_id
             job.save()
 
-            # This function should also spin up a loop for the job to be updated.
-            async_task(
-                "user_workspaces_server.tasks.update_job_status",
-                job.pk,
-                hook="user_workspaces_server.tasks.queue_job_update",
-            )
-
             workspace.status = models.Workspace.Status.ACTIVE
             workspace.datetime_last_job_launch = datetime.now()
             workspace.save()
 
+            subscribe_user_status(workspace.user_id_id, "job", job.pk)
+
             return JsonResponse(
                 {
                     "message": "Successful start.",
@@ -355,9 +496,13 @@ class WorkspaceView(APIView):
             for file in request.FILES.values():
                 main_storage.create_file(workspace.file_path, file)
 
-            main_storage.set_ownership(workspace.file_path, external_user_mapping, recursive=True)
-
-            async_update_workspace(workspace.pk)
+            if main_storage.async_set_ownership:
+                async_set_workspace_ownership(workspace.pk)
+            else:
+                main_storage.set_ownership(
+                    workspace.file_path, external_user_mapping, recursive=True
+                )
+                async_update_workspace(workspace.pk)
 
             workspace.datetime_last_modified = datetime.now()
             workspace.save()
@@ -1,67 +1,303 @@
+import asyncio
 import json
-import threading
+import logging
 
-import websocket
-from asgiref.sync import async_to_sync
-from channels.generic.websocket import WebsocketConsumer
+import websockets
+from channels.generic.websocket import AsyncWebsocketConsumer
 
-from . import models
+from . import models, passthrough_routes
+from .tasks import ACTIVE_JOB_STATUSES
 
+logger = logging.getLogger(__name__)
 
-class PassthroughConsumer(WebsocketConsumer):
-    def connect(self):
+
+def get_close_code(code):
+    # 1005 and 1006 only describe how a connection ended, they cannot be sent in a close frame.
+    if code in (None, 1005):
+        return 1000
+    if code == 1006:
+        return 1011
+    return code
+
+
+class PassthroughConsumer(AsyncWebsocketConsumer):
+    upstream = None
+    upstream_task = None
+
+    async def connect(self):
         hostname = self.scope["url_route"]["kwargs"]["hostname"]
         job_id = self.scope["url_route"]["kwargs"]["job_id"]
-        job_model = models.Job.objects.get(pk=job_id)
-        connection_details = job_model.job_details["current_job_details"].get("proxy_details", {})
-        port = connection_details.get("port", "")
+
+        user = self.scope.get("user")
+        if user is None or not user.is_authenticated:
+            await self.close(code=4403)
+            return
+
+        route = await passthrough_routes.get_route(job_id)
+        # Only the job's own host can be reached through its passthrough, and only by its owner.
+        if route is None or route.hostname != hostname:
+            await self.close()
+            return
+        if route.user_id != user.pk:
+            await self.close(code=4403)
+            return
+
         headers = {}
-        for item in self.scope["headers"]:
-            headers[item[0].decode("UTF-8")] = item[1].decode("UTF-8")
-
-        # Define WebSocket callback functions
-        def ws_message(ws, message):
-            self.send(message)
-
-        # Start a new thread for the WebSocket interface
-        self.ws = websocket.WebSocketApp(
-            f'ws://{hostname}:{port}{self.scope["path"]}?{self.scope["query_string"].decode("UTF-8")}',
-            cookie=headers["cookie"],
-            on_message=ws_message,
-        )
-        self.response_ws_thread = threading.Thread(target=self.ws.run_forever)
-        self.response_ws_thread.start()
+        for name, value in self.scope["headers"]:
+            if name.decode("UTF-8").lower() == "cookie":
+                headers["Cookie"] = value.decode("UTF-8")
+
+        try:
+            self.upstream = await websockets.connect(
+                f'ws://{hostname}:{route.port}{self.scope["path"]}'
+                f'?{self.scope["query_string"].decode("UTF-8")}',
+                extra_headers=headers,
+                subprotocols=self.scope.get("subprotocols") or None,
+                max_size=None,
+            )
+        except (OSError, asyncio.TimeoutError, websockets.WebSocketException):
+            logger.exception(f"Passthrough websocket failure for job {job_id}")
+            await self.close()
+            return
 
-        self.accept()
+        await self.accept(self.upstream.subprotocol)
+        self.upstream_task = asyncio.create_task(self.relay_upstream())
 
-    def disconnect(self, close_code):
-        self.ws.close()
-        self.response_ws_thread.join(1)
+    async def relay_upstream(self):
+        # Frames are passed on as they arrive, text as text and binary as binary.
+        try:
+            async for message in self.upstream:
+                if isinstance(message, bytes):
+                    await self.send(bytes_data=message)
+                else:
+                    await self.send(text_data=message)
+        except websockets.ConnectionClosed:
+            pass
+
+        await self.close(code=get_close_code(self.upstream.close_code))
+
+    async def disconnect(self, close_code):
+        if self.upstream_task:
+            self.upstream_task.cancel()
+        if self.upstream:
+            await self.upstream.close(code=get_close_code(close_code))
 
     # Receive message from WebSocket
-    def receive(self, text_data=None, bytes_data=None):
-        self.ws.send(text_data)
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            await self.upstream.send(text_data if text_data is not None else bytes_data)
+        except websockets.ConnectionClosed:
+            # The relay task closes the client once the upstream close is seen.
+            pass
 
 
-class JobStatusConsumer(WebsocketConsumer):
-    def connect(self):
+class JobStatusConsumer(AsyncWebsocketConsumer):
+    # Status changes of one of the user's jobs.
+    async def connect(self):
+        user = self.scope.get("user")
         job_id = self.scope["url_route"]["kwargs"]["job_id"]
         self.room_group_name = f"job_status_{job_id}"
+        if user is None or not user.is_authenticated:
+            await self.close()
+            return
 
-        async_to_sync(self.channel_layer.group_add)(self.room_group_name, self.channel_name)
-        self.accept()
+        # Updates are only patches, so (re)connecting clients start from a full snapshot. Joining
+        # the group first means that no update can be missed in between.
+        await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+        snapshot = await get_status_snapshot(user, "job", job_id)
+        if snapshot is None:
+            await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+            await self.close()
+            return
 
-    def disconnect(self, close_code):
-        async_to_sync(self.channel_layer.group_discard)(self.room_group_name, self.channel_name)
+        await self.accept()
+        await self.send(
+            text_data=json.dumps(
+                {"type": "job_status_snapshot", "job_id": job_id, "data": snapshot}
+            )
+        )
 
-    # Receive message from WebSocket
-    def receive(self, text_data=None, bytes_data=None):
-        # TODO: What would a client want to get from this.
-        pass
+    async def disconnect(self, close_code):
+        await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
 
     # Receive message from room group
-    def job_status_update(self, event):
-        job_details = event["message"]
+    async def job_status_update(self, event):
+        await self.send(text_data=event["text"])
+
+
+async def get_status_snapshot(user, subscription_type, object_id):
+    # Only the user's own jobs and workspaces can be subscribed to.
+    if subscription_type == "job":
+        job = (
+            await models.Job.objects.filter(pk=object_id, user_id=user)
+            .values("status", "job_details")
+            .afirst()
+        )
+        if job is None:
+            return None
+        current_job_details = job["job_details"]["current_job_details"]
+        # The connection details of a finished job (IE its url_path and token) are of no use to
+        # anyone any more.
+        if job["status"] in [models.Job.Status.COMPLETE, models.Job.Status.FAILED]:
+            current_job_details = {
+                key: value
+                for key, value in current_job_details.items()
+                if key != "connection_details"
+            }
+        return {"status": job["status"], "current_job_details": current_job_details}
+    elif subscription_type == "workspace":
+        return (
+            await models.Workspace.objects.filter(pk=object_id, user_id=user)
+            .values("status", "disk_space")
+            .afirst()
+        )
+    return None
+
+
+class WorkspaceStatusConsumer(AsyncWebsocketConsumer):
+    # Status changes and scan, clone and delete progress of one of the user's workspaces.
+    async def connect(self):
+        user = self.scope.get("user")
+        workspace_id = self.scope["url_route"]["kwargs"]["workspace_id"]
+        self.room_group_name = f"workspace_status_{workspace_id}"
+        if user is None or not user.is_authenticated:
+            await self.close()
+            return
+
+        # Join before taking the snapshot so that no update can be missed in between.
+        await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+        snapshot = await get_status_snapshot(user, "workspace", workspace_id)
+        if snapshot is None:
+            await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+            await self.close()
+            return
+
+        await self.accept()
+        await self.send(
+            text_data=json.dumps(
+                {
+                    "type": "workspace_status_snapshot",
+                    "workspace_id": workspace_id,
+                    "data": snapshot,
+                }
+            )
+        )
+
+    async def disconnect(self, close_code):
+        await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+
+    # Receive message from room group
+    async def workspace_status_update(self, event):
+        await self.send(text_data=event["text"])
+
+
+class UserStatusConsumer(AsyncWebsocketConsumer):
+    # One stream per user covering all of their active jobs and workspaces. Messages arriving
+    # within batch_interval of each other are sent together as one batch.
+    batch_interval = 0.5
+
+    async def connect(self):
+        self.user = self.scope.get("user")
+        if self.user is None or not self.user.is_authenticated:
+            await self.close()
+            return
+
+        self.subscriptions = set()
+        self.pending_messages = []
+        self.flush_task = None
+
+        await self.channel_layer.group_add(f"user_status_{self.user.pk}", self.channel_name)
+        await self.accept()
+
+        jobs = models.Job.objects.filter(user_id=self.user, status__in=ACTIVE_JOB_STATUSES)
+        async for job_id in jobs.values_list("pk", flat=True):
+            await self.subscribe("job", job_id)
+
+        workspaces = models.Workspace.objects.filter(user_id=self.user).exclude(
+            status=models.Workspace.Status.DELETING
+        )
+        async for workspace_id in workspaces.values_list("pk", flat=True):
+            await self.subscribe("workspace", workspace_id)
+
+    async def disconnect(self, close_code):
+        if getattr(self, "subscriptions", None) is None:
+            return
+
+        if self.flush_task:
+            self.flush_task.cancel()
+        await self.channel_layer.group_discard(f"user_status_{self.user.pk}", self.channel_name)
+        for group_name in self.subscriptions:
+            await self.channel_layer.group_discard(group_name, self.channel_name)
+
+    async def subscribe(self, subscription_type, object_id):
+        group_name = f"{subscription_type}_status_{object_id}"
+        if group_name in self.subscriptions:
+            return
+
+        # Join before taking the snapshot so that no update can be missed in between.
+        await self.channel_layer.group_add(group_name, self.channel_name)
+        snapshot = await get_status_snapshot(self.user, subscription_type, object_id)
+        if snapshot is None:
+            await self.channel_layer.group_discard(group_name, self.channel_name)
+            await self.send_error(f"No {subscription_type} {object_id} found for user.")
+            return
+
+        self.subscriptions.add(group_name)
+        self.queue_message(
+            json.dumps(
+                {
+                    "type": f"{subscription_type}_status_snapshot",
+                    f"{subscription_type}_id": object_id,
+                    "data": snapshot,
+                }
+            )
+        )
+
+    async def unsubscribe(self, subscription_type, object_id):
+        group_name = f"{subscription_type}_status_{object_id}"
+        if group_name in self.subscriptions:
+            self.subscriptions.discard(group_name)
+            await self.channel_layer.group_discard(group_name, self.channel_name)
+
+    async def send_error(self, message):
+        await self.send(text_data=json.dumps({"type": "error", "message": message}))
+
+    # Receive message from WebSocket, IE {"action": "subscribe", "job_id": 1}
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            message = json.loads(text_data or bytes_data)
+            action = message["action"]
+            subscription_type = "job" if "job_id" in message else "workspace"
+            object_id = int(message[f"{subscription_type}_id"])
+        except (ValueError, TypeError, KeyError):
+            await self.send_error("Invalid message.")
+            return
+
+        if action == "subscribe":
+            await self.subscribe(subscription_type, object_id)
+        elif action == "unsubscribe":
+            await self.unsubscribe(subscription_type, object_id)
+        else:
+            await self.send_error(f"Invalid action {action}.")
+
+    def queue_message(self, text):
+        self.pending_messages.append(text)
+        if self.flush_task is None:
+            self.flush_task = asyncio.create_task(self.flush_messages())
+
+    async def flush_messages(self):
+        await asyncio.sleep(self.batch_interval)
+        messages, self.pending_messages, self.flush_task = self.pending_messages, [], None
+        # The messages are already serialized, so the batch is put together as text.
+        await self.send(text_data=f'{{"type": "batch", "messages": [{", ".join(messages)}]}}')
+
+    # Receive message from the user's group, IE when a job is started
+    async def user_status_subscribe(self, event):
+        await self.subscribe(event["subscription_type"], event["object_id"])
+
+    # Receive message from a job or workspace group
+    async def job_status_update(self, event):
+        self.queue_message(event["text"])
 
-        # Send message to WebSocket
-        self.send(text_data=json.dumps(job_details))
+    async def workspace_status_update(self, event):
+        self.queue_message(event["text"])
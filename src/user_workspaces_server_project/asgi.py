@@ -17,10 +17,13 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "user_workspaces_server_project.
 django_asgi_app = get_asgi_application()
 
 import user_workspaces_server.urls  # noqa: E402
+from user_workspaces_server.auth import TokenAuthMiddleware  # noqa: E402
 
 application = ProtocolTypeRouter(
     {
         "http": django_asgi_app,
-        "websocket": AuthMiddlewareStack(URLRouter(user_workspaces_server.urls.ws_urlpatterns)),
+        "websocket": AuthMiddlewareStack(
+            TokenAuthMiddleware(URLRouter(user_workspaces_server.urls.ws_urlpatterns))
+        ),
     }
 )
@@ -71,6 +71,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "user_workspaces_server.tracing.tracing_middleware",
+    "user_workspaces_server.metrics.request_metrics_middleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -159,6 +161,13 @@ ASGI_APPLICATION = "user_workspaces_server_project.asgi.application"
 
 CHANNEL_LAYERS = DJANGO_CONFIG["CHANNEL_LAYERS"]
 
+# Tracing is off unless an exporter ("file" or "otlp") is set.
+TRACING = DJANGO_CONFIG.get("TRACING", {})
+
+# /metrics is refused unless the scraper sends METRICS.token as a bearer token or connects from
+# one of METRICS.allowed_ips.
+METRICS = DJANGO_CONFIG.get("METRICS", {})
+
 CORS_ALLOW_ALL_ORIGINS = True
 
 CORS_ALLOW_HEADERS = list(default_headers) + [